@@ -0,0 +1,151 @@
+"""
+Nearest analogs: the known crudes closest to a blend or to a new assay, with
+their measured distillation profiles, to put next to a prediction as a
+sanity check.
+
+The features are standardized with the means and deviations of the dataset
+the index is built from, and the oils are kept in a KD-tree over that space.
+A missing feature of a query or of an oil counts as the dataset mean.
+Oils added later are searched by brute force next to the tree until they
+make up `rebuild_fraction` of the index, then the tree is rebuilt, so the
+index follows a growing dataset without being rebuilt on every update.
+
+ModelRegistry.save_dataset saves the index next to the dataset artifact,
+updating the previous one, and the model artifacts trained on the dataset
+carry it.
+"""
+
+import numpy as np
+
+
+
+class analogIndex():
+    """
+    Parameters:
+    ----------
+    x_data: DataFrame of the features, one row per oil.
+    Y_data: DataFrame of the measured profiles, indexed like x_data. Oils
+    without a profile get NaN.
+    rebuild_fraction: float, share of oils outside the tree that triggers a rebuild.
+    """
+
+    def __init__(self, x_data, Y_data, rebuild_fraction=0.1) -> None:
+        self.columns = list(x_data.columns)
+        self.percentages = list(Y_data.columns)
+        self.rebuild_fraction = rebuild_fraction
+        # the version of the dataset indexed, set by ModelRegistry.save_dataset
+        self.version = None
+        values = x_data.to_numpy(dtype=float)
+        self.mean = np.nanmean(values, axis=0)
+        self.mean = np.where(np.isnan(self.mean), 0.0, self.mean)
+        scale = np.nanstd(values, axis=0)
+        self.scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+
+        self.oils = []
+        self.position = {}
+        self.points = np.empty((0, len(self.columns)))
+        self.profiles = np.empty((0, len(self.percentages)))
+        self.tree = None
+        self.tree_size = 0
+        self.update(x_data, Y_data)
+
+
+    def __len__(self) -> int:
+        return len(self.oils)
+
+
+    def transform(self, X) -> np.ndarray:
+        """
+        Rows of features (array or DataFrame with the columns of the index)
+        in the standardized space, missing values at the dataset mean.
+        """
+        if hasattr(X, 'columns'):
+            X = X.reindex(columns=self.columns)
+        scaled = (np.asarray(X, dtype=float).reshape(-1, len(self.columns)) - self.mean) / self.scale
+        return np.where(np.isnan(scaled), 0.0, scaled)
+
+
+    def update(self, x_data, Y_data=None) -> int:
+        """
+        Add the oils of `x_data` missing from the index and replace the rows of
+        the known ones that changed. The scaling stays the one of the dataset
+        the index was built from. Returns the number of oils added or changed.
+        """
+        Y_data = Y_data.reindex(index=x_data.index, columns=self.percentages) if Y_data is not None else None
+        points = self.transform(x_data)
+        profiles = Y_data.to_numpy(dtype=float) if Y_data is not None else np.full((len(points), len(self.percentages)), np.nan)
+
+        new, changed, moved = [], 0, False
+        for i, oil in enumerate(x_data.index):
+            j = self.position.get(oil)
+            if j is None:
+                new.append(i)
+            elif not (np.array_equal(self.points[j], points[i])
+                      and np.array_equal(self.profiles[j], profiles[i], equal_nan=True)):
+                changed += 1
+                # the tree holds the old point, it has to be rebuilt
+                moved = moved or (j < self.tree_size and not np.array_equal(self.points[j], points[i]))
+                self.points[j], self.profiles[j] = points[i], profiles[i]
+
+        for i in new:
+            self.position[x_data.index[i]] = len(self.oils)
+            self.oils.append(x_data.index[i])
+        self.points = np.vstack([self.points, points[new]])
+        self.profiles = np.vstack([self.profiles, profiles[new]])
+
+        if moved or self.tree is None or len(self) - self.tree_size > self.rebuild_fraction * len(self):
+            self.rebuild()
+        return len(new) + changed
+
+
+    def rebuild(self) -> None:
+        from scipy.spatial import cKDTree
+
+        self.tree = cKDTree(self.points) if len(self.points) else None
+        self.tree_size = len(self.points)
+
+
+    def query(self, X, k=3):
+        """
+        The `k` oils closest to every row of `X` (features, see `transform`).
+
+        OUTPUT:
+        ------
+        (positions, distances): two (rows x k) arrays, the positions in
+        `self.oils` sorted by increasing distance.
+        """
+        points = self.transform(X)
+        k = min(k, len(self))
+        positions = np.empty((len(points), 0), dtype=np.intp)
+        distances = np.empty((len(points), 0))
+        if self.tree is not None:
+            found, where = self.tree.query(points, k=min(k, self.tree_size))
+            positions = np.reshape(where, (len(points), -1))
+            distances = np.reshape(found, (len(points), -1))
+
+        if len(self) > self.tree_size:
+            # the oils added since the last rebuild
+            pending = self.points[self.tree_size:]
+            extra = np.sqrt(((points[:, None, :] - pending[None, :, :]) ** 2).sum(axis=2))
+            positions = np.hstack([positions, np.broadcast_to(np.arange(self.tree_size, len(self)), extra.shape)])
+            distances = np.hstack([distances, extra])
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            positions = np.take_along_axis(positions, order, axis=1)
+            distances = np.take_along_axis(distances, order, axis=1)
+        return positions, distances
+
+
+    def analogs(self, X, k=3) -> list:
+        """
+        Same as `query`, as one list per row of {'oil', 'distance', 'profile'},
+        the profile a dict {percentage: temperature} with None where unknown.
+        """
+        positions, distances = self.query(X, k)
+        results = []
+        for row_positions, row_distances in zip(positions, distances):
+            results.append([{'oil': self.oils[j], 'distance': float(distance),
+                             'profile': {p: (None if np.isnan(t) else float(t))
+                                         for p, t in zip(self.percentages, self.profiles[j])}}
+                            for j, distance in zip(row_positions, row_distances)])
+        return results
+
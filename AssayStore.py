@@ -0,0 +1,303 @@
+"""
+An append-only, time indexed store of every assay value the crawlers see.
+
+The scraped .csv files hold the most recent, six month, one year and five
+year values of every property, and each crawl overwrites them; CleanData
+only keeps the five year value. The store keeps them all: each crawl appends
+one snapshot per oil, stamped with the crawl date, and nothing is ever
+rewritten.
+
+Layout of the store directory:
+
+* `<crawl date>.<n>.npz`: one segment per append, in columns: oil, profile,
+  row position, label, horizon (see HORIZONS) and value. Oils and labels
+  are stored as codes into the dictionaries of `index.json`.
+* `index.json`: the dictionaries and the list of segments with their dates.
+
+(oil, profile, row position, label, crawl date) is unique: rows already stored for that
+crawl date are dropped when appended again. Building a training set is a
+query over the segments of a date window, either the latest snapshot of
+every value or the average of the snapshots, without parsing any .csv file:
+
+    store = AssayStore()
+    store.append_crawl('.', oils=crawler.crawled_oils)
+    x_data, Y_data = store.x_y_data(start='2023-01-01', average=True)
+"""
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from DataCleaner import PROFILE_SPECS, assemble_x_y
+from ModelRegistry import ASSAY_DIR
+from PageParser import PROFILE_HEADERS, PROFILE_TABLES
+
+
+# the time horizons of the values, in the order of the basic, lightends and btex columns
+HORIZONS = ['most_recent', 'six_month', 'one_year', 'five_year']
+
+# csv column -> horizon, for each profile
+HORIZON_COLUMNS = {profile_name: dict(zip(PROFILE_HEADERS[profile_name][1:], HORIZONS))
+                   for profile_name in PROFILE_TABLES}
+HORIZON_COLUMNS['distillation'] = {'recent_C': 'most_recent', '5_year_C': 'five_year'}
+
+# csv column of PROFILE_SPECS -> horizon
+SPEC_HORIZONS = {'five_year': 'five_year', 'most_recent': 'most_recent',
+                 '5_year_C': 'five_year', 'recent_C': 'most_recent'}
+
+PROFILES = list(PROFILE_TABLES)
+KEY = ['oil', 'profile', 'position', 'label', 'horizon']
+
+
+
+def _crawl_date(date) -> str:
+    if date is None:
+        return datetime.date.today().isoformat()
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        return date.strftime('%Y-%m-%d')
+    return datetime.date.fromisoformat(str(date)).isoformat()
+
+
+
+def read_scraped(base_path, oils) -> pd.DataFrame:
+    """
+    Rows of the scraped .csv files of `oils` (file names without .csv) under
+    `base_path`, in the columns of a segment. Missing values are kept as NaN.
+    """
+    frames = []
+    for profile_name in PROFILES:
+        dir_path = os.path.join(base_path, '{}_data'.format(profile_name))
+        columns = HORIZON_COLUMNS[profile_name]
+        label_column = PROFILE_HEADERS[profile_name][0]
+        for oil_name in oils:
+            path = os.path.join(dir_path, '%s.csv' % oil_name)
+            if not os.path.exists(path):
+                continue
+            df = pd.read_csv(path, dtype={label_column: str}, na_values=['---', 'ND'])
+            df = df.rename(columns={label_column: 'label'})
+            df['position'] = np.arange(len(df))
+            df = df.melt(id_vars=['label', 'position'], value_vars=list(columns), var_name='horizon', value_name='value')
+            df['horizon'] = df['horizon'].map(columns)
+            df['oil'] = oil_name
+            df['profile'] = profile_name
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=KEY + ['value'])
+    df = pd.concat(frames, ignore_index=True)
+    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+    return df
+
+
+
+class AssayStore():
+    """
+    Parameters:
+    ----------
+    root: str, the store directory. It is created on the first append.
+    """
+
+    def __init__(self, root=ASSAY_DIR) -> None:
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.index = {'oils': [], 'labels': [], 'segments': []}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        self._codes = {name: {value: code for code, value in enumerate(self.index[name])}
+                       for name in ('oils', 'labels')}
+
+
+    def _code(self, name, value) -> int:
+        # the code of a dictionary entry, added when new
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(self.index[name])
+            self.index[name].append(value)
+        return codes[value]
+
+
+    def dates(self) -> list:
+        """
+        The crawl dates found in the store, oldest first.
+        """
+        return sorted({segment['date'] for segment in self.index['segments']})
+
+
+    def append_crawl(self, base_path='.', oils=None, crawl_date=None) -> int:
+        """
+        Append the current values of the scraped .csv files under `base_path`
+        as the snapshot of `crawl_date` (by default today). `oils` restricts
+        it to some oils, e.g. the ones crawled successfully, by default every
+        scraped oil. Append every oil crawled, changed or not: a date window
+        only sees the oils with a snapshot in it.
+
+        OUTPUT:
+        ------
+        the number of rows appended, rows already stored for that date are skipped.
+        """
+        if oils is None:
+            dir_paths = [os.path.join(base_path, '{}_data'.format(profile_name)) for profile_name in PROFILES]
+            oils = sorted({os.path.splitext(file)[0] for dir_path in dir_paths if os.path.exists(dir_path)
+                           for file in os.listdir(dir_path) if file.endswith('.csv')})
+        return self.append(read_scraped(base_path, oils), crawl_date)
+
+
+    def append(self, frame, crawl_date=None) -> int:
+        """
+        Append rows with the columns oil, profile, label, position, horizon
+        and value as the snapshot of `crawl_date`. Returns the number of rows
+        appended, see `append_crawl`.
+        """
+        crawl_date = _crawl_date(crawl_date)
+        if len(frame) == 0:
+            return 0
+
+        segment = {
+            'oil': np.array([self._code('oils', oil) for oil in frame['oil']], dtype=np.int32),
+            'profile': np.array([PROFILES.index(name) for name in frame['profile']], dtype=np.int8),
+            'label': np.array([self._code('labels', str(label)) for label in frame['label']], dtype=np.int32),
+            'position': frame['position'].to_numpy(dtype=np.int16),
+            'horizon': np.array([HORIZONS.index(name) for name in frame['horizon']], dtype=np.int8),
+            'value': frame['value'].to_numpy(dtype=np.float64),
+        }
+
+        # dedup on (oil, property, horizon) within the crawl date
+        keys = pd.DataFrame({name: segment[name] for name in KEY})
+        stored = [self._read_segment(entry) for entry in self.index['segments'] if entry['date'] == crawl_date]
+        duplicated = keys.duplicated().to_numpy()
+        if stored:
+            seen = pd.concat([pd.DataFrame({name: arrays[name] for name in KEY}) for arrays in stored])
+            known = pd.MultiIndex.from_frame(seen)
+            duplicated |= pd.MultiIndex.from_frame(keys).isin(known)
+        if duplicated.all():
+            return 0
+        segment = {name: values[~duplicated] for name, values in segment.items()}
+
+        os.makedirs(self.root, exist_ok=True)
+        file_name = '%s.%d.npz' % (crawl_date, len(stored))
+        tmp_path = os.path.join(self.root, file_name + '.tmp.npz')
+        np.savez(tmp_path, **segment)
+        os.replace(tmp_path, os.path.join(self.root, file_name))
+
+        self.index['segments'].append({'file': file_name, 'date': crawl_date, 'rows': len(segment['value'])})
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        return len(segment['value'])
+
+
+    def _read_segment(self, entry) -> dict:
+        with np.load(os.path.join(self.root, entry['file']), allow_pickle=False) as arrays:
+            return {name: arrays[name] for name in arrays.files}
+
+
+    def _read_window(self, start=None, end=None) -> dict:
+        # the columns of the segments crawled between start and end, plus the rank of their date
+        start = _crawl_date(start) if start is not None else None
+        end = _crawl_date(end) if end is not None else None
+        entries = [entry for entry in self.index['segments']
+                   if (start is None or entry['date'] >= start) and (end is None or entry['date'] <= end)]
+        dates = sorted({entry['date'] for entry in entries})
+        segments = [dict(self._read_segment(entry)) for entry in entries]
+        for entry, segment in zip(entries, segments):
+            segment['date'] = np.full(len(segment['value']), dates.index(entry['date']), dtype=np.int32)
+        names = KEY + ['value', 'date']
+        if not segments:
+            return {name: np.empty(0, dtype=np.float64 if name == 'value' else np.int32) for name in names}, dates
+        return {name: np.concatenate([segment[name] for segment in segments]) for name in names}, dates
+
+
+    def query(self, start=None, end=None) -> pd.DataFrame:
+        """
+        Every stored row with a crawl date between `start` and `end`
+        (included, both optional), with a `date` column. Only the segments of
+        that window are read.
+        """
+        columns, dates = self._read_window(start, end)
+        df = pd.DataFrame(columns)
+        df['oil'] = np.array(self.index['oils'], dtype=object)[df['oil'].to_numpy()]
+        df['profile'] = np.array(PROFILES, dtype=object)[df['profile'].to_numpy()]
+        df['label'] = np.array(self.index['labels'], dtype=object)[df['label'].to_numpy()]
+        df['horizon'] = np.array(HORIZONS, dtype=object)[df['horizon'].to_numpy()]
+        df['date'] = np.array(dates, dtype=object)[df['date'].to_numpy()]
+        return df
+
+
+    def history(self, oil, profile_name, label, horizon='most_recent') -> pd.Series:
+        """
+        The values of one property of one oil, indexed by crawl date.
+        """
+        df = self.query()
+        df = df[(df['oil'] == oil) & (df['profile'] == profile_name)
+                & (df['label'] == str(label)) & (df['horizon'] == horizon)]
+        return df.set_index('date')['value'].sort_index()
+
+
+    def x_y_data(self, start=None, end=None, average=False, horizon=None):
+        """
+        x and y data like CleanData.get_x_y_data, built from the snapshots
+        crawled between `start` and `end`.
+
+        Parameters:
+        ----------
+        start, end: optional crawl dates bounding the window, e.g. '2023-01-01'.
+        average: False takes the latest snapshot of every value in the window,
+        True the mean of its snapshots.
+        horizon: the horizon read, by default the one of PROFILE_SPECS (five
+        year). Missing values fall back to the most recent one, like CleanData.
+        """
+        columns, _ = self._read_window(start, end)
+        order = np.argsort(columns['date'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+        oil_names = np.array([oil.replace(' ', '') for oil in self.index['oils']], dtype=object)
+
+        def load_profile(profile_name, oils):
+            spec = PROFILE_SPECS[profile_name]
+            labels = spec['labels']
+            rows = columns['profile'] == PROFILES.index(profile_name)
+            if spec['match'] == 'position':
+                column = columns['position'][rows].astype(np.intp)
+            else:
+                label_columns = pd.Index([str(label) for label in labels]).get_indexer(self.index['labels'])
+                column = label_columns[columns['label'][rows]]
+            excluded = set(spec.get('exclude', ()))
+            wanted = np.array([name not in excluded and (oils is None or name in oils) for name in oil_names], dtype=bool)
+            oil = columns['oil'][rows]
+            keep = (column >= 0) & (column < len(labels)) & wanted[oil]
+
+            codes = np.unique(oil[keep])
+            names = list(oil_names[codes])
+            row = np.searchsorted(codes, oil)
+            result = np.full((len(names), len(labels)), np.nan)
+            value_horizon = SPEC_HORIZONS[spec['value']] if horizon is None else horizon
+            for name in (SPEC_HORIZONS[spec['fallback']], value_horizon):
+                values = columns['value'][rows]
+                selected = keep & (columns['horizon'][rows] == HORIZONS.index(name)) & ~np.isnan(values)
+                cells = row[selected] * len(labels) + column[selected]
+                if average:
+                    sums = np.bincount(cells, values[selected], minlength=result.size)
+                    counts = np.bincount(cells, minlength=result.size)
+                    found = counts > 0
+                    part = np.where(found, sums / np.maximum(counts, 1), np.nan)
+                else:
+                    # the rows are sorted by date, keep the last value of every cell
+                    cells, last = np.unique(cells[::-1], return_index=True)
+                    part = np.full(result.size, np.nan)
+                    part[cells] = values[selected][::-1][last]
+                part = part.reshape(result.shape)
+                result = np.where(np.isnan(part), result, part)
+
+            if spec.get('complete'):
+                # only keep oils which list every label of the profile
+                found = np.zeros(result.shape, dtype=bool)
+                found[row[keep], column[keep]] = True
+                complete = found.all(axis=1)
+                names = [name for name, k in zip(names, complete) if k]
+                result = result[complete]
+            return names, result
+
+        return assemble_x_y(load_profile)
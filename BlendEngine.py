@@ -0,0 +1,226 @@
+"""
+Blending of any number of crude oils. The feature data is copied once into a
+contiguous NumPy array with an oil -> row index, so mixing a blend is a dot
+product of its volume fractions with a few rows of that array, and mixing a
+batch of blends is one sparse (blends x oils) matrix product.
+
+Each property is mixed with the rule listed in MIXING_RULES:
+
+* volume: volume weighted average, for vol% compositions and the density.
+* mass: mass weighted average, the mass fractions coming from the volume 
+  fractions and the density of each oil. Used for wt% and mg/kg properties.
+* api: API gravity is not additive, the specific gravity is. The gravity is
+  turned into specific gravity, volume averaged, and turned back into API.
+* viscosity: viscosities are turned into a Refutas blending index, mass 
+  averaged, and turned back into a viscosity.
+"""
+
+import math
+import numbers
+
+import numpy as np
+from scipy import sparse
+
+
+DENSITY = 'Density(kg/m³)'
+
+# mixing rule of each property, any property not listed is volume averaged
+MIXING_RULES = {
+    'Density(kg/m³)': 'volume',
+    'Gravity(°API)': 'api',
+    'Sulphur(wt%)': 'mass',
+    'MicroCarbonResidue(wt%)': 'mass',
+    'Nickel(mg/kg)': 'mass',
+    'Vanadium(mg/kg)': 'mass',
+    'Viscosity(cSt)': 'viscosity',
+}
+
+
+def api_to_sg(api):
+    return 141.5 / (api + 131.5)
+
+
+def sg_to_api(sg):
+    return 141.5 / sg - 131.5
+
+
+def viscosity_to_index(viscosity):
+    # Refutas viscosity blending number, viscosity in cSt
+    return 14.534 * np.log(np.log(viscosity + 0.8)) + 10.975
+
+
+def index_to_viscosity(index):
+    return np.exp(np.exp((index - 10.975) / 14.534)) - 0.8
+
+
+# rule -> (transform into an additive quantity, inverse transform, basis of the average)
+RULES = {
+    'volume': (None, None, 'volume'),
+    'mass': (None, None, 'mass'),
+    'api': (api_to_sg, sg_to_api, 'volume'),
+    'viscosity': (viscosity_to_index, index_to_viscosity, 'mass'),
+}
+
+
+
+class blendEngine():
+    """
+    Parameters:
+    ----------
+    feature_df: pandas.DataFrame, one row per oil and one column per property,
+    like the x_data the model is trained on.
+
+    rules: dict property -> mixing rule, see MIXING_RULES. Pass {} to volume
+    average every property.
+    density_column: the property giving the density used for mass averages.
+
+    A blend is either a dict {oil name: volume} or a list of (oil name, volume)
+    pairs. Volumes are normalized into fractions, so any unit can be used.
+    """
+
+    def __init__(self, feature_df, rules=MIXING_RULES, density_column=DENSITY) -> None:
+        self.oils = list(feature_df.index)
+        self.columns = feature_df.columns
+        self.position = {oil: i for i, oil in enumerate(self.oils)}
+        self.features = np.ascontiguousarray(feature_df.to_numpy(dtype=np.float64))
+
+        # column indices of every rule, and the features in their additive form
+        column_rules = np.array([rules.get(column, 'volume') for column in self.columns])
+        self.rule_columns = {rule: np.flatnonzero(column_rules == rule) for rule in RULES
+                             if (column_rules == rule).any()}
+        self.additive = self.features.copy()
+        for rule, columns in self.rule_columns.items():
+            transform = RULES[rule][0]
+            if transform is not None:
+                self.additive[:, columns] = transform(self.features[:, columns])
+
+        mass_rules = [rule for rule, (_, _, basis) in RULES.items() if basis == 'mass']
+        self.mass_columns = np.flatnonzero(np.isin(column_rules, mass_rules))
+        self.density_column = density_column
+        self.density = None
+        if len(self.mass_columns):
+            if density_column not in self.columns:
+                raise ValueError('mass averaged properties need the %s column' % density_column)
+            self.density = self.features[:, self.columns.get_loc(density_column)]
+
+
+    def _finish(self, by_volume, by_mass) -> np.ndarray:
+        # take the mass averaged columns from by_mass and undo the transforms
+        mixed = by_volume
+        if len(self.mass_columns):
+            mixed[:, self.mass_columns] = by_mass[:, self.mass_columns]
+        for rule, columns in self.rule_columns.items():
+            inverse = RULES[rule][1]
+            if inverse is not None:
+                mixed[:, columns] = inverse(mixed[:, columns])
+        return mixed
+
+
+    def fractions(self, blend):
+        """
+        Returns (rows of the oils in `features`, their volume fractions).
+        Raises KeyError for an unknown oil and ValueError for invalid volumes.
+        """
+        items = blend.items() if isinstance(blend, dict) else blend
+        rows, volumes = [], []
+        for oil, volume in items:
+            # bools are numbers, infinite volumes give NaN fractions
+            if (not isinstance(volume, numbers.Real) or isinstance(volume, bool)
+                    or not math.isfinite(volume) or volume < 0):
+                raise ValueError('invalid volume %r of %s, volumes must be finite non negative numbers'
+                                 % (volume, oil))
+            rows.append(self.position[oil])
+            volumes.append(volume)
+
+        volumes = np.array(volumes, dtype=np.float64)
+        total = volumes.sum()
+        if not 0 < total < np.inf:
+            raise ValueError('a blend needs a positive total volume')
+        return np.array(rows), volumes / total
+
+
+    def mix(self, blend) -> np.ndarray:
+        """
+        The mixed properties of one blend, as a 1D array.
+        """
+        rows, fractions = self.fractions(blend)
+        additive = self.additive[rows]
+        by_volume = fractions @ additive
+        by_mass = None
+        if self.density is not None:
+            mass = fractions * self.density[rows]
+            by_mass = (mass / mass.sum()) @ additive
+            by_mass = by_mass[None, :]
+        return self._finish(by_volume[None, :], by_mass)[0]
+
+
+    def weight_matrix(self, blends) -> sparse.csr_matrix:
+        """
+        A sparse (blends x oils) matrix of volume fractions. An oil listed
+        twice in the same blend has its volumes added up.
+        """
+        indptr, indices, data = [0], [], []
+        for blend in blends:
+            rows, fractions = self.fractions(blend)
+            indices.extend(rows)
+            data.extend(fractions)
+            indptr.append(len(indices))
+        weights = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(self.oils)))
+        weights.sum_duplicates()
+        return weights
+
+
+    def mix_batch(self, blends) -> np.ndarray:
+        """
+        The mixed properties of many blends, one row per blend. `blends` can
+        also be a weight matrix from `weight_matrix`.
+        """
+        weights = blends if sparse.issparse(blends) else self.weight_matrix(blends)
+        by_volume = np.asarray(weights @ self.additive)
+        by_mass = None
+        if self.density is not None:
+            mass = sparse.csr_matrix(weights.multiply(self.density[None, :]))
+            totals = np.asarray(mass.sum(axis=1)).ravel()
+            by_mass = np.asarray(sparse.diags(1 / totals) @ mass @ self.additive)
+        return self._finish(by_volume, by_mass)
+
+
+    def mix_pairs(self, first, second, fractions, out=None, work=None) -> np.ndarray:
+        """
+        The mixed properties of many blends of two oils: oil at row `first[k]`
+        with volume fraction `fractions[k]` and oil at row `second[k]`. `out`
+        (blends x properties) and `work` (2 x blends x properties) are optional
+        buffers to reuse between calls; the result is written into `out`.
+        """
+        n_blends, n_columns = len(fractions), len(self.columns)
+        if out is None:
+            out = np.empty((n_blends, n_columns))
+        if work is None:
+            work = np.empty((2, n_blends, n_columns))
+        difference, weights = work[0], work[1]
+
+        np.take(self.additive, second, axis=0, out=out)
+        np.take(self.additive, first, axis=0, out=difference)
+        difference -= out
+        weights[:] = fractions[:, None]
+        if len(self.mass_columns):
+            mass_first = fractions * self.density[first]
+            mass = mass_first / (mass_first + (1 - fractions) * self.density[second])
+            weights[:, self.mass_columns] = mass[:, None]
+        difference *= weights
+        out += difference
+
+        for rule, columns in self.rule_columns.items():
+            inverse = RULES[rule][1]
+            if inverse is not None:
+                out[:, columns] = inverse(out[:, columns])
+        return out
+
+
+    def single_oil(self, blend):
+        """
+        The oil name when the blend contains a single oil with a positive volume, else None.
+        """
+        items = blend.items() if isinstance(blend, dict) else blend
+        used = {oil for oil, volume in items if volume > 0}
+        return used.pop() if len(used) == 1 else None
@@ -0,0 +1,208 @@
+"""
+Search for the volume fractions of a few available crude oils whose blend
+meets a target distillation curve or cut constraints, at the lowest cost.
+
+The search is a cross-entropy method over the simplex of volume fractions:
+every iteration samples a population of blends from a Dirichlet distribution,
+predicts all of them with one call to the model, and refits the distribution
+on the best ones. Fractions are rounded to `resolution`, so blends met again
+are not predicted twice. The search stops after `time_budget` seconds.
+
+Constraints are read on the predicted curve. A cut yield constraint is a
+bound on a temperature: "at least 30 vol% boils below 200°C" is
+bounds={30: (None, 200)}.
+"""
+
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from BlendPrediction import predict_blends
+
+
+REPORT_PCT = [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]
+
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _check_constraints(target, bounds) -> None:
+    """
+    Raise a ValueError unless `target` maps percentages to temperatures and
+    `bounds` percentages to (lowest, highest) pairs of temperatures or None.
+    """
+    if not isinstance(target, dict) or not isinstance(bounds, dict):
+        raise ValueError('target and bounds must map percentages to temperatures')
+    if not all(_is_number(temperature) for temperature in target.values()):
+        raise ValueError('target must map percentages to temperatures')
+    for bound in bounds.values():
+        if (not isinstance(bound, (list, tuple)) or len(bound) != 2
+                or not all(value is None or _is_number(value) for value in bound)):
+            raise ValueError('bounds must map percentages to [lowest or null, highest or null]')
+
+
+
+class blendOptimizer():
+    """
+    Parameters:
+    ----------
+    engine: a blendEngine over the feature data of the model.
+    model: a fitted model (or its compiledModel) predicting the temperatures at
+    `percentages`. A CurveModel.curveModel can also be asked for other percentages.
+    percentages: the percentages predicted by `model.predict`.
+    cache_size: number of predicted blends kept between searches. The cache
+    is shared by the searches of every thread.
+    """
+
+    def __init__(self, engine, model, percentages=REPORT_PCT, cache_size=200000) -> None:
+        self.engine = engine
+        self.model = model
+        self.percentages = list(percentages)
+        self.cache_size = cache_size
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def _columns(self, percentages):
+        # how to read the needed percentages: columns of predict, or predict_curve
+        if all(p in self.percentages for p in percentages):
+            return [self.percentages.index(p) for p in percentages]
+        if not hasattr(self.model, 'predict_curve'):
+            raise ValueError('the model only predicts the percentages %s' % self.percentages)
+        return None
+
+
+    def predict(self, rows, counts, percentages, columns) -> np.ndarray:
+        """
+        Temperatures at `percentages` of the blends of the oils at `rows` of the
+        engine, with volumes `counts` (one blend per row of counts), cached.
+        """
+        keys = [(rows.tobytes(), tuple(percentages), count.tobytes()) for count in counts]
+        curves = np.empty((len(counts), len(percentages)))
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                curve = self.cache.get(key)
+                if curve is None:
+                    missing.append(i)
+                else:
+                    curves[i] = curve
+            self.hits += len(counts) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return curves
+
+        weights = counts[missing] / counts[missing].sum(axis=1, keepdims=True)
+        weights = sparse.csr_matrix((weights.ravel(), np.tile(rows, len(missing)),
+                                     np.arange(0, weights.size + 1, len(rows))),
+                                    shape=(len(missing), len(self.engine.oils)))
+        if columns is None:
+            predicted = self.model.predict_curve(self.engine.mix_batch(weights), percentages)
+        else:
+            predicted = predict_blends(weights, self.engine, self.model)[:, columns]
+
+        curves[missing] = predicted
+        # the prediction runs unlocked, only the cache updates are serialized
+        with self.lock:
+            for i, curve in zip(missing, predicted):
+                self.cache[keys[i]] = curve
+            while len(self.cache) > self.cache_size:
+                del self.cache[next(iter(self.cache))]
+        return curves
+
+
+    def optimize(self, oils, target=None, bounds=None, prices=None, tolerance=2.0,
+                 max_fractions=None, time_budget=5.0, population=2000, elite=0.05,
+                 resolution=0.01, max_iterations=200, top=5, seed=None) -> dict:
+        """
+        Parameters:
+        ----------
+        oils: the names of the available crude oils.
+        target: dict percentage -> temperature, the curve to hit within `tolerance`
+        (mean absolute difference, in degrees).
+        bounds: dict percentage -> (lowest, highest) temperature, None for no bound.
+        prices: dict oil -> price per volume. Without prices, the blends closest
+        to the target come first.
+        max_fractions: dict oil -> largest volume fraction available.
+        time_budget: seconds the search may run for.
+        population: blends evaluated per iteration, elite: fraction of them kept.
+        resolution: fractions are multiples of it.
+
+        OUTPUT:
+        ------
+        a dict with 'blends': the `top` best blends found, each a dict with the
+        'recipe' {oil: fraction}, its 'cost', 'error' to the target, 'violation'
+        of the bounds (degrees), 'feasible' and 'profile' {percentage: temperature},
+        and the search statistics.
+        """
+        if not target and not bounds:
+            raise ValueError('give a target curve or bounds')
+        start = time.perf_counter()
+        hits, misses = self.hits, self.misses
+        target, bounds = target or {}, bounds or {}
+        _check_constraints(target, bounds)
+        rows = np.array([self.engine.position[oil] for oil in oils])
+        prices = np.array([prices[oil] for oil in oils], dtype=float) if prices else None
+        caps = np.array([(max_fractions or {}).get(oil, 1.0) for oil in oils], dtype=float)
+        if caps.sum() < 1:
+            raise ValueError('the available oils do not add up to a whole blend')
+
+        percentages = sorted(set(target) | set(bounds))
+        columns = self._columns(percentages)
+        goal = np.array([target.get(p, np.nan) for p in percentages])
+        lowest = np.array([np.nan if bounds.get(p, (None, None))[0] is None else bounds[p][0] for p in percentages])
+        highest = np.array([np.nan if bounds.get(p, (None, None))[1] is None else bounds[p][1] for p in percentages])
+
+        def score(counts):
+            curves = self.predict(rows, counts, percentages, columns)
+            fractions = counts / counts.sum(axis=1, keepdims=True)
+            error = np.nanmean(np.abs(curves - goal), axis=1) if target else np.zeros(len(counts))
+            violation = (np.nansum(np.maximum(lowest - curves, 0), axis=1)
+                         + np.nansum(np.maximum(curves - highest, 0), axis=1))
+            infeasibility = violation + np.maximum(error - tolerance, 0)
+            cost = fractions @ prices if prices is not None else error
+            return curves, fractions, error, violation, infeasibility, cost
+
+        rng = np.random.RandomState(seed)
+        alpha = np.ones(len(oils))
+        n_elite = max(2, int(population * elite))
+        steps = int(round(1 / resolution))
+        best = {}
+        iterations = 0
+        while iterations < max_iterations and time.perf_counter() - start < time_budget:
+            iterations += 1
+            samples = rng.dirichlet(alpha, population)
+            # keep exploring the whole simplex a little
+            explore = max(1, population // 10)
+            samples[:explore] = rng.dirichlet(np.ones(len(oils)), explore)
+            for _ in range(10):
+                samples = np.minimum(samples, caps)
+                samples /= samples.sum(axis=1, keepdims=True)
+            counts = np.unique(np.round(samples * steps).astype(np.int64), axis=0)
+            counts = counts[counts.sum(axis=1) > 0]
+
+            curves, fractions, error, violation, infeasibility, cost = score(counts)
+            order = np.lexsort((cost, infeasibility))
+            for i in order[:top]:
+                best[counts[i].tobytes()] = (infeasibility[i], cost[i], fractions[i], curves[i], error[i], violation[i])
+
+            # refit the Dirichlet distribution on the elite blends (method of moments)
+            elites = fractions[order[:n_elite]]
+            mean, var = elites.mean(axis=0), elites.var(axis=0) + 1e-6
+            concentration = np.median(mean * (1 - mean) / var - 1)
+            alpha = np.clip(mean * max(concentration, 1.0), 0.05, None)
+
+        ranked = sorted(best.values(), key=lambda item: (item[0], item[1]))[:top]
+        blends = [{'recipe': {oil: round(float(f), 6) for oil, f in zip(oils, fractions) if f > 0},
+                   'cost': float(cost), 'error': float(error), 'violation': float(violation),
+                   'feasible': bool(infeasibility == 0),
+                   'profile': dict(zip(percentages, curve.tolist()))}
+                  for infeasibility, cost, fractions, curve, error, violation in ranked]
+        return {'blends': blends, 'iterations': iterations, 'cache_hits': self.hits - hits,
+                'cache_misses': self.misses - misses, 'seconds': round(time.perf_counter() - start, 3)}
@@ -0,0 +1,85 @@
+"""
+The inference side of the blend model: mixing recipes and predicting their
+profiles with an already fitted model. It only needs NumPy, pandas and the
+blendEngine, so serving processes import it without scikit-learn, plotting
+or crawling libraries; the fitted model brings the modules it needs when it
+is unpickled. Training lives in CrudeBlendModel and ModelTrainer.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from BlendEngine import blendEngine
+from Metrics import timed
+
+
+
+# the function to calculate mixing rules 
+def mix_crude(oil_1, vol_1, oil_2, vol_2, feature_df):
+    """
+    The properties of the blend of `vol_1` of oil 1 and `vol_2` of oil 2,
+    each property mixed with its rule of BlendEngine.MIXING_RULES (volume or
+    mass average, API gravity through the specific gravity, viscosity through
+    the Refutas index). `feature_df` is the feature data or a blendEngine over it.
+    Raises KeyError for an unknown oil and ValueError for invalid volumes.
+    """
+    return mix_crudes([(oil_1, vol_1), (oil_2, vol_2)], feature_df)
+
+
+
+def mix_crudes(blend, feature_df):
+    """
+    The mixed properties of a blend of any number of oils, as a Series over
+    the feature columns, with the same mixing rules as mix_crude. `blend` is
+    a dict {oil: volume} or a list of (oil, volume) pairs.
+    """
+    engine = feature_df if isinstance(feature_df, blendEngine) else blendEngine(feature_df)
+    return pd.Series(engine.mix(blend), index=engine.columns)
+
+
+def predict_blends(recipes, engine, model, target_df=None) -> np.ndarray:
+    """
+    Predict the distillation profile of many recipes with a single call to
+    `model.predict`.
+
+    Parameters:
+    ----------
+    recipes: list of blends, each a dict {oil name: volume} or a list of 
+    (oil name, volume) pairs, with any number of oils.
+    It can also be a weight matrix of blendEngine.weight_matrix.
+    engine: a blendEngine over the feature data the model was trained on, 
+    or that feature data itself.
+    model: a fitted model, or its FastInference.compiledModel.
+    target_df: optional, the measured profiles. When given, recipes made of a 
+    single oil return its measured profile instead of a prediction.
+
+    Returns:
+    ----------
+    a (recipes x cut points) array.
+    """
+    if not isinstance(engine, blendEngine):
+        engine = blendEngine(engine)
+    with timed('mix'):
+        mixed = engine.mix_batch(recipes)
+        if not getattr(model, 'accepts_arrays', False):
+            mixed = pd.DataFrame(mixed, columns=engine.columns)
+    with timed('predict'):
+        predictions = np.asarray(model.predict(mixed), dtype=float)
+
+    if target_df is not None:
+        for i, recipe in enumerate(recipes):
+            oil = engine.single_oil(recipe)
+            if oil is not None:
+                predictions[i] = target_df.loc[oil].values
+    return predictions
+
+
+def available_cores() -> int:
+    """
+    Number of CPU cores this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
@@ -0,0 +1,185 @@
+"""
+Scenario sweeps over every pair of oils at fixed volume steps, e.g. all
+pairs of 100 oils at 1% steps (490 050 blends), without ever holding the
+whole sweep in memory.
+
+The blends are generated chunk by chunk from their position in the sweep,
+mixed with blendEngine.mix_pairs into buffers allocated once, predicted, and
+written out before the next chunk. Memory use depends on the chunk size, not
+on the size of the sweep. The results go to a CSV file or to a directory of
+columnar .npy files, memory mapped while they are written.
+"""
+
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+REPORT_PCT = [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]
+
+
+
+def print_progress(done, total, seconds) -> None:
+    rate = done / seconds if seconds else 0
+    eta = (total - done) / rate if rate else float('nan')
+    sys.stderr.write('\r%d/%d blends (%.1f%%), %.0f blends/s, %.0fs left ' % (done, total, 100 * done / total, rate, eta))
+    if done == total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+
+
+def fraction_steps(step) -> np.ndarray:
+    """
+    The fractions of the first oil of a pair: `step`, 2 * `step`, ... up to
+    1 - `step`. Raises a ValueError unless `step` divides 1 into two parts or more.
+    """
+    n_parts = round(1 / step) if 0 < step < 1 else 0
+    if n_parts < 2 or not math.isclose(n_parts * step, 1, rel_tol=1e-9):
+        raise ValueError('step must divide 1 into two parts or more, e.g. 0.5, 0.25 or 0.01, not %r' % step)
+    return np.arange(1, n_parts) * step
+
+
+
+class blendSweep():
+    """
+    Parameters:
+    ----------
+    engine: a blendEngine over the feature data of the model.
+    model: a fitted model predicting the temperatures at `percentages`,
+    preferably a FastInference.compiledModel.
+    oils: the oils to pair, by default all the oils of the engine.
+    step: volume fraction step, the first oil of a pair goes from `step` to
+    1 - `step`. It must divide 1, see fraction_steps.
+    chunk_size: number of blends mixed and predicted at once.
+    """
+
+    def __init__(self, engine, model, oils=None, step=0.01, chunk_size=50000, percentages=REPORT_PCT) -> None:
+        self.engine = engine
+        self.model = model
+        self.oils = list(engine.oils if oils is None else oils)
+        self.rows = np.array([engine.position[oil] for oil in self.oils])
+        self.percentages = list(percentages)
+        self.chunk_size = chunk_size
+
+        self.fraction_steps = fraction_steps(step)
+        self.first, self.second = np.triu_indices(len(self.oils), k=1)
+        self.allocate_buffers()
+
+
+    def allocate_buffers(self) -> None:
+        # buffers of one chunk, reused by every chunk
+        n_columns = len(self.engine.columns)
+        self.positions = np.arange(self.chunk_size)
+        self.index = np.empty((3, self.chunk_size), dtype=np.intp)
+        self.pair_oils = np.empty((2, self.chunk_size), dtype=np.intp)
+        self.pair_rows = np.empty((2, self.chunk_size), dtype=np.intp)
+        self.fractions = np.empty(self.chunk_size)
+        self.mixed = np.empty((self.chunk_size, n_columns))
+        self.work = np.empty((2, self.chunk_size, n_columns))
+
+
+    def __len__(self) -> int:
+        return len(self.first) * len(self.fraction_steps)
+
+
+    def chunk(self, start):
+        """
+        (first oil, second oil, fraction of the first oil, predictions) of the
+        chunk starting at blend `start`: the oils as indices in `self.oils` and
+        the predictions as a (blends x percentages) array. The arrays are
+        overwritten by the next chunk, copy them to keep them.
+        """
+        n = min(self.chunk_size, len(self) - start)
+        n_steps = len(self.fraction_steps)
+        position, pair, fraction_step = self.index[:, :n]
+        first, second = self.pair_oils[:, :n]
+        np.add(self.positions[:n], start, out=position)
+        np.floor_divide(position, n_steps, out=pair)
+        np.remainder(position, n_steps, out=fraction_step)
+
+        np.take(self.first, pair, out=first)
+        np.take(self.second, pair, out=second)
+        np.take(self.fraction_steps, fraction_step, out=self.fractions[:n])
+        np.take(self.rows, first, out=self.pair_rows[0, :n])
+        np.take(self.rows, second, out=self.pair_rows[1, :n])
+        mixed = self.engine.mix_pairs(self.pair_rows[0, :n], self.pair_rows[1, :n], self.fractions[:n],
+                                      out=self.mixed[:n], work=self.work[:, :n])
+        if not getattr(self.model, 'accepts_arrays', False):
+            mixed = pd.DataFrame(mixed, columns=self.engine.columns)
+        return first, second, self.fractions[:n], np.asarray(self.model.predict(mixed))
+
+
+    def chunks(self):
+        """
+        Yields every chunk of the sweep in order, see `chunk`.
+        """
+        for start in range(0, len(self), self.chunk_size):
+            yield self.chunk(start)
+
+
+    def run(self, write_chunk, progress=None) -> int:
+        start, done = time.perf_counter(), 0
+        for first, second, fractions, predictions in self.chunks():
+            write_chunk(done, first, second, fractions, predictions)
+            done += len(fractions)
+            if progress is not None:
+                progress(done, len(self), time.perf_counter() - start)
+        return done
+
+
+    def write_csv(self, path, progress=print_progress) -> int:
+        """
+        Write the sweep to a CSV file, one line per blend:
+        oil_1, oil_2, fraction_1, then the temperature at every percentage.
+        Returns the number of blends written.
+        """
+        names = np.array(self.oils, dtype=object)
+        columns = ['oil_1', 'oil_2', 'fraction_1'] + [str(p) for p in self.percentages]
+        with open(path, 'w', newline='') as f:
+            f.write(','.join(columns) + '\n')
+
+            def write_chunk(done, first, second, fractions, predictions):
+                chunk = pd.DataFrame(predictions, columns=columns[3:])
+                chunk.insert(0, 'fraction_1', fractions)
+                chunk.insert(0, 'oil_2', names[second])
+                chunk.insert(0, 'oil_1', names[first])
+                chunk.to_csv(f, header=False, index=False, float_format='%.4f')
+            return self.run(write_chunk, progress)
+
+
+    def write_columns(self, dir_path, progress=print_progress) -> int:
+        """
+        Write the sweep as columnar .npy files in `dir_path`: oil_1.npy and
+        oil_2.npy (indices in oils.json), fraction_1.npy and profile.npy
+        (blends x percentages). Load them with np.load(..., mmap_mode='r').
+        Returns the number of blends written.
+        """
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, 'oils.json'), 'w') as f:
+            json.dump({'oils': self.oils, 'percentages': self.percentages}, f)
+
+        def column(name, dtype, shape=()):
+            return np.lib.format.open_memmap(os.path.join(dir_path, name + '.npy'), mode='w+',
+                                             dtype=dtype, shape=(len(self),) + shape)
+        index_dtype = np.int16 if len(self.oils) < 2 ** 15 else np.int32
+        oil_1, oil_2 = column('oil_1', index_dtype), column('oil_2', index_dtype)
+        fraction_1 = column('fraction_1', np.float32)
+        profile = column('profile', np.float32, (len(self.percentages),))
+
+        def write_chunk(done, first, second, fractions, predictions):
+            end = done + len(fractions)
+            oil_1[done:end], oil_2[done:end] = first, second
+            fraction_1[done:end], profile[done:end] = fractions, predictions
+            # flush, so the written pages can leave memory
+            for array in (oil_1, oil_2, fraction_1, profile):
+                array.flush()
+
+        written = self.run(write_chunk, progress)
+        del oil_1, oil_2, fraction_1, profile
+        return written
@@ -0,0 +1,109 @@
+"""
+On-disk record of the last crawl, used to make crawls incremental. For every
+oil it keeps the page URL, the HTTP validators (ETag / Last-Modified) sent
+back by the server and a hash of each scraped table.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+
+def hash_table(content) -> str:
+    """
+    sha256 of a scraped table, given either its text or its list of rows.
+    """
+    if not isinstance(content, str):
+        content = json.dumps(content, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+
+class CrawlManifest():
+    """
+    Parameters:
+    ----------
+    path: str, the json file holding the manifest. It is loaded if it exists.
+
+    After a crawl, `changed_oils` lists the oils with at least one table
+    that differs from the previous crawl; it is saved as `last_crawl` in the
+    manifest so later stages can pick it up with `CrawlManifest(path).last_changed()`.
+    """
+
+    def __init__(self, path='./crawl_manifest.json') -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.oils = {}
+        self.last_crawl = {}
+        self.changed_oils = set()
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.oils = data.get('oils', {})
+            self.last_crawl = data.get('last_crawl', {})
+
+
+    def validators(self, oil_name, url) -> dict:
+        """
+        The conditional request headers for the oil page, empty when the oil
+        is new or its URL moved.
+        """
+        entry = self.oils.get(oil_name)
+        if not entry or entry.get('url') != url:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+
+    def update_validators(self, oil_name, url, etag=None, last_modified=None) -> None:
+        with self.lock:
+            entry = self.oils.setdefault(oil_name, {'hashes': {}})
+            entry['url'] = url
+            entry['etag'] = etag
+            entry['last_modified'] = last_modified
+
+
+    def table_changed(self, oil_name, profile_name, content):
+        """
+        The hash of a freshly scraped table when it differs from the stored
+        one, i.e. when the table has to be written again, else None. Record it
+        with `record_table` once the table is written.
+        """
+        digest = hash_table(content)
+        with self.lock:
+            entry = self.oils.get(oil_name, {'hashes': {}})
+            return None if entry['hashes'].get(profile_name) == digest else digest
+
+
+    def record_table(self, oil_name, profile_name, digest) -> None:
+        with self.lock:
+            entry = self.oils.setdefault(oil_name, {'hashes': {}})
+            entry['hashes'][profile_name] = digest
+            entry['updated'] = datetime.datetime.now().isoformat(timespec='seconds')
+            self.changed_oils.add(oil_name)
+
+
+    def last_changed(self) -> list:
+        """
+        The oils that changed during the last saved crawl.
+        """
+        return self.last_crawl.get('changed', [])
+
+
+    def save(self) -> None:
+        self.last_crawl = {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'changed': sorted(self.changed_oils),
+        }
+        data = {'last_crawl': self.last_crawl, 'oils': self.oils}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
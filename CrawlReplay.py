@@ -0,0 +1,177 @@
+"""
+Record and replay of crudemonitor.ca, so getProfiles (WebCrawler) can be run
+and tested without network access and without Chrome.
+
+* `record` saves the home page and every oil page once into a directory,
+  with the links of the home page pointing to the saved oil pages. The
+  pages in fixtures/crudemonitor have the same layout.
+* `replayServer` serves such a directory over HTTP on localhost.
+* `replayBrowser` stands in for the Selenium browser: it loads the pages
+  from the server and answers the scripts getProfiles uses, so the whole crawl and its parsing run in milliseconds.
+
+    with replayServer('fixtures/crudemonitor') as server:
+        getProfiles(replayBrowser(), server.URL, base_path=tmp, delay=0).get_all_profiles()
+"""
+
+import os
+import re
+import threading
+import urllib.request
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin
+
+from HttpCrawler import URL, USER_AGENT, hostRateLimiter
+from PageParser import LinkExtractor
+
+
+# the scripts getProfiles runs, see replayBrowser
+OPEN_SCRIPT = re.compile(r"window\.open\('(.*)',\s*'_self'\)")
+LINK_SCRIPT = re.compile(r"getElementsByClassName\('card home-card'\)\[(\d+)\]\.\s*getElementsByTagName\('li'\)"
+                         r"\[(\d+)\]\.getElementsByTagName\('a'\)\[0\]")
+ITEMS_SCRIPT = re.compile(r"getElementsByClassName\('card home-card'\)\[(\d+)\]\.\s*getElementsByTagName\('li'\)")
+SECTIONS_SCRIPT = re.compile(r"getElementsByClassName\('card home-card'\)")
+HEADING_SCRIPT = re.compile(r"getElementsByTagName\('h1'\)")
+
+
+
+def fetch(url) -> str:
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read().decode(response.headers.get_content_charset() or 'utf-8')
+
+
+def record(dir_path, URL=URL, min_interval=0.5) -> list:
+    """
+    Save the home page as `dir_path`/index.html and every oil page it links
+    to as `dir_path`/crudes/<n>.html, `min_interval` seconds apart.
+
+    OUTPUT:
+    ------
+    the list of (oil_name, saved path) of the oil pages.
+    """
+    rate_limiter = hostRateLimiter(min_interval)
+    os.makedirs(os.path.join(dir_path, 'crudes'), exist_ok=True)
+    rate_limiter.wait(URL)
+    home = fetch(URL)
+
+    parser = LinkExtractor()
+    parser.feed(home)
+    parser.close()
+
+    saved = []
+    for i, (oil_name, href) in enumerate(parser.links):
+        page_url = urljoin(URL, href)
+        rate_limiter.wait(page_url)
+        path = 'crudes/%d.html' % i
+        with open(os.path.join(dir_path, path), 'w', encoding='utf-8') as f:
+            f.write(fetch(page_url))
+        home = home.replace('href="%s"' % href, 'href="%s"' % path, 1)
+        saved.append((oil_name, path))
+
+    with open(os.path.join(dir_path, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(home)
+    return saved
+
+
+
+class quietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+
+class replayServer():
+    """
+    Serves the recorded pages of `dir_path` on localhost from a background
+    thread, the home page is at `URL`. Use it as a context manager, or call
+    `close` to stop it.
+    """
+
+    def __init__(self, dir_path, host='127.0.0.1', port=0) -> None:
+        self.server = ThreadingHTTPServer((host, port), partial(quietHandler, directory=dir_path))
+        self.URL = 'http://%s:%d/index.html' % (host, self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+
+class replayElement():
+    """
+    The part of a Selenium WebElement getProfiles reads: `text` and attributes.
+    """
+
+    def __init__(self, text, **attributes) -> None:
+        self.text = text
+        self.attributes = attributes
+
+
+    def get_attribute(self, name):
+        return self.attributes.get(name)
+
+
+
+class replayBrowser():
+    """
+    A stand-in for the Selenium browser getProfiles drives. Pages are fetched
+    over HTTP, e.g. from a replayServer; the scripts are
+    answered from the parsed page instead of a DOM. Any other script raises
+    a ValueError, so a change of getProfiles cannot silently go untested.
+    """
+
+    def __init__(self) -> None:
+        self.current_url = None
+        self.page_source = ''
+        self.sections = []
+        self.pages = 0
+
+
+    def get(self, url) -> None:
+        self.current_url = url
+        self.page_source = fetch(url)
+        self.pages += 1
+
+        links = LinkExtractor()
+        links.feed(self.page_source)
+        links.close()
+        self.sections = links.sections
+
+
+    def execute_script(self, script, *args):
+        match = OPEN_SCRIPT.search(script)
+        if match:
+            return self.get(urljoin(self.current_url or '', match.group(1)))
+        if script.strip().startswith('window.scrollTo'):
+            return None
+        if script.strip() == 'arguments[0].click();':
+            return self.get(urljoin(self.current_url, args[0].get_attribute('href')))
+
+        match = LINK_SCRIPT.search(script)
+        if match:
+            text, href = self.sections[int(match.group(1))][int(match.group(2))]
+            return replayElement(text, href=href)
+        match = ITEMS_SCRIPT.search(script)
+        if match:
+            return [replayElement(text, href=href) for text, href in self.sections[int(match.group(1))]]
+        if SECTIONS_SCRIPT.search(script):
+            return [replayElement('\n'.join(text for text, _ in section)) for section in self.sections]
+        if HEADING_SCRIPT.search(script):
+            return [replayElement(' '.join(text.split())) for text in re.findall(r'<h1[^>]*>(.*?)</h1>', self.page_source, re.S)]
+        raise ValueError('script not supported by the replay browser: %s' % script)
+
+
+    def close(self) -> None:
+        self.current_url = None
@@ -1,44 +1,15 @@
-import pandas as pd
-import numpy as np 
-
-from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression, Lasso
-from sklearn.naive_bayes import MultinomialNB 
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.decomposition import PCA
-from sklearn.neural_network import MLPRegressor
-from sklearn.impute import SimpleImputer 
-from sklearn.metrics import make_scorer, r2_score, mean_squared_error, auc, mean_absolute_error, accuracy_score
 from sklearn.pipeline import Pipeline
 from sklearn.base import BaseEstimator
+from sklearn.exceptions import NotFittedError
+from sklearn.utils.validation import check_is_fitted
 
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-
-from DataCleaner import CleanData 
-import random
-import numbers
-
-
-
-# the function to calculate mixing rules 
-def mix_crude(oil_1, vol_1, oil_2, vol_2, feature_df):
-    """
-    For all properties, the mixed results will be (p1*v1 + p2*v2) / (v1+v2),
-    where p1, and p2 are the corresponding property values for oil 1 and oil 2.
-    """
-    assert isinstance(vol_1, numbers.Number)
-    assert isinstance(vol_2, numbers.Number) 
-    
-    property_1 = feature_df.loc[oil_1]
-    property_2 = feature_df.loc[oil_2]
-    
-    property_mix = (property_1*vol_1 + property_2*vol_2) / (vol_1 + vol_2)
-    return property_mix.T
+# mixing and prediction moved to BlendPrediction, which serving imports alone
+from BlendPrediction import available_cores, mix_crude, mix_crudes, predict_blends  # noqa: F401
 
 
 
@@ -71,11 +42,27 @@ class modelSwitcher(BaseEstimator):
         return self.estimator.score(X, y)
 
 
+    def __sklearn_is_fitted__(self):
+        # recent scikit-learn versions check this before predicting with a pipeline
+        try:
+            check_is_fitted(self.estimator)
+        except NotFittedError:
+            return False
+        return True
+
+
 
-# Building pipeline 
-estimators = [('scaler', StandardScaler()), ('reduce_dim', PCA()), ('model', modelSwitcher())]
-pipe = Pipeline(estimators)
+def make_pipeline(memory=None) -> Pipeline:
+    """
+    A fresh scaler -> PCA -> model pipeline. `memory` (a directory or a 
+    joblib.Memory) caches the fitted scaler and PCA, so candidates that only
+    differ by their model hyperparameters reuse them.
+    """
+    estimators = [('scaler', StandardScaler()), ('reduce_dim', PCA()), ('model', modelSwitcher())]
+    return Pipeline(estimators, memory=memory)
 
+
+# the grid of every estimator family, searched by ModelTrainer.build_search
 parameters = [{
         'model__estimator': [Lasso()], 
         'reduce_dim__n_components': [2,5,10,20],
@@ -87,7 +74,7 @@ parameters = [{
         'reduce_dim__n_components': [2,5,10,20],
         'model__estimator__n_estimators': [5, 20, 50, 100, 200],
         'model__estimator__max_depth': [3, 5, 10, 20, None],
-        'model__estimator__max_features' : ["auto", "sqrt", "log2"]
+        'model__estimator__max_features' : [1.0, "sqrt", "log2"] # 1.0 is what "auto" meant for regressors
     },
     {
         'model__estimator': [KNeighborsRegressor()],
@@ -100,6 +87,4 @@ parameters = [{
         'reduce_dim__n_components': [2,5,10,20],
         'model__estimator__fit_intercept': [True, False]
     }
-]
-
-Model = GridSearchCV(pipe, param_grid=parameters, cv=5, n_jobs=12)
\ No newline at end of file
+]
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Distillation curve model: instead of the temperature at every reported
+percentage, the model predicts a compact parameterization of the whole
+boiling curve, from which any cut point can be read.
+
+A curve is described by its temperatures at a few knots (KNOTS percentages),
+encoded as the temperature at the first knot followed by the log of the
+temperature increments between consecutive knots. Any predicted encoding
+decodes into increasing knot temperatures, and a monotone (PCHIP) spline
+through the knots gives the temperature at any percentage between the first
+and the last knot, for a whole batch at once.
+"""
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+
+
+REPORT_PCT = [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]
+
+# percentages at which the curve is parameterized, 7 outputs instead of 12
+KNOTS = [5, 10, 30, 50, 70, 90, 99]
+
+
+
+def knot_temperatures(Y, percentages=REPORT_PCT, knots=KNOTS) -> np.ndarray:
+    """
+    The temperatures of every curve of Y (one row per oil, one column per
+    percentage) at the knots. Missing temperatures are interpolated from the
+    others of the same curve; past the last known point the curve stays flat.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    percentages = np.asarray(percentages, dtype=np.float64)
+    knots = np.asarray(knots, dtype=np.float64)
+    valid = ~np.isnan(Y)
+    assert valid.any(axis=1).all(), 'every curve needs at least one temperature'
+
+    temperatures = np.empty((len(Y), len(knots)))
+    complete = valid.all(axis=1)
+    if complete.any():
+        # the knots are reported percentages: pick the columns, else interpolate
+        if np.isin(knots, percentages).all():
+            temperatures[complete] = Y[complete][:, np.searchsorted(percentages, knots)]
+        else:
+            temperatures[complete] = PchipInterpolator(percentages, Y[complete], axis=1)(knots)
+    for i in np.flatnonzero(~complete):
+        temperatures[i] = np.interp(knots, percentages[valid[i]], Y[i, valid[i]])
+    return temperatures
+
+
+def encode(temperatures, min_increment=0.1) -> np.ndarray:
+    """
+    Knot temperatures -> (first temperature, log of the increments). Increments
+    below `min_increment` (non increasing measurements) are raised to it.
+    """
+    increments = np.maximum(np.diff(temperatures, axis=1), min_increment)
+    return np.concatenate([temperatures[:, :1], np.log(increments)], axis=1)
+
+
+def decode(encoded) -> np.ndarray:
+    """
+    The inverse of `encode`: strictly increasing knot temperatures.
+    """
+    encoded = np.asarray(encoded, dtype=np.float64)
+    return np.cumsum(np.concatenate([encoded[:, :1], np.exp(encoded[:, 1:])], axis=1), axis=1)
+
+
+
+class curveModel(BaseEstimator, RegressorMixin):
+    """
+    Parameters:
+    ----------
+    regressor: the model fitted on the encoded curves, e.g. a pipeline of
+    CrudeBlendModel.make_pipeline.
+    percentages: the percentages of the target columns.
+    knots: the percentages parameterizing the curve, within the range of `percentages`.
+    min_increment: smallest temperature increment between two knots.
+
+    `predict` returns the temperatures at `percentages`, like the models fitted
+    on the temperatures themselves. `predict_curve` reads any other cut point.
+    """
+
+    def __init__(self, regressor=None, percentages=REPORT_PCT, knots=KNOTS, min_increment=0.1):
+        self.regressor = regressor
+        self.percentages = percentages
+        self.knots = knots
+        self.min_increment = min_increment
+
+
+    @classmethod
+    def from_fitted(cls, regressor, **kwargs):
+        """
+        A curveModel around a regressor already fitted on encoded curves
+        (see `encode_targets`), e.g. by a hyperparameter search.
+        """
+        model = cls(regressor, **kwargs)
+        model.regressor_ = regressor
+        return model
+
+
+    def encode_targets(self, Y) -> np.ndarray:
+        return encode(knot_temperatures(Y, self.percentages, self.knots), self.min_increment)
+
+
+    def fit(self, X, Y):
+        assert min(self.knots) >= min(self.percentages) and max(self.knots) <= max(self.percentages)
+        self.regressor_ = clone(self.regressor).fit(X, self.encode_targets(Y))
+        return self
+
+
+    @property
+    def accepts_arrays(self) -> bool:
+        return getattr(self.regressor_, 'accepts_arrays', False)
+
+
+    def with_regressor(self, regressor):
+        """
+        A copy of this fitted model predicting with another regressor, e.g. the
+        FastInference.compiledModel of the fitted one.
+        """
+        return curveModel.from_fitted(regressor, percentages=self.percentages,
+                                      knots=self.knots, min_increment=self.min_increment)
+
+
+    def predict_knots(self, X) -> np.ndarray:
+        return decode(np.asarray(self.regressor_.predict(X)).reshape(len(X), -1))
+
+
+    def predict_curve(self, X, percentages) -> np.ndarray:
+        """
+        The temperatures at any `percentages` between the first and last knot,
+        one row per row of X.
+        """
+        percentages = np.asarray(percentages, dtype=np.float64)
+        if ((percentages < self.knots[0]) | (percentages > self.knots[-1])).any():
+            raise ValueError('percentages must be between %s and %s' % (self.knots[0], self.knots[-1]))
+        return PchipInterpolator(self.knots, self.predict_knots(X), axis=1)(percentages)
+
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_curve(X, self.percentages)
@@ -1,8 +1,48 @@
 import pandas as pd
+import hashlib
 import os
+import io
 import numpy as np
 import re
 
+from Metrics import timed_function
+
+
+# rows kept from each profile
+PERCENTAGES = ['IBP', 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]
+
+BASIC_PROPERTIES = ['Density(kg/m³)', 'Gravity(°API)', 'Sulphur(wt%)',
+       'MicroCarbonResidue(wt%)', 'Nickel(mg/kg)', 'Vanadium(mg/kg)']
+
+LIGHTENDS_COMPONENTS = ['C3-(vol%)', 'iC4iso-Butane(vol%)', 'nC4n-Butane(vol%)',
+       'iC5iso-Pentane(vol%)', 'nC5n-Pentane(vol%)', 'C6Hexanes(vol%)',
+       'C7Heptanes(vol%)', 'C8Octanes(vol%)', 'C9Nonanes(vol%)',
+       'C10Decanes(vol%)']
+
+BTEX_COMPONENTS = ['Benzene(vol%)', 'Toluene(vol%)', 'Ethylbenzene(vol%)',
+       'Xylenes(vol%)']
+
+# how each profile is read:
+# labels: the rows kept, in order
+# value / fallback: the column used, and the one used where it is missing
+# match: 'position' takes the rows in file order, 'label' looks them up by their label
+# complete: only keep the oils listing every label
+# exclude: oils left out of the profile
+PROFILE_SPECS = {
+    'distillation': {'labels': PERCENTAGES, 'value': '5_year_C', 'fallback': 'recent_C',
+                     'match': 'position'},
+    'basic': {'labels': BASIC_PROPERTIES, 'value': 'five_year', 'fallback': 'most_recent',
+              'match': 'label', 'complete': True, 'exclude': ['PremiumAlbianSynthetic(PAS)']},
+    'lightends': {'labels': LIGHTENDS_COMPONENTS, 'value': 'five_year', 'fallback': 'most_recent',
+                  'match': 'position'},
+    'btex': {'labels': BTEX_COMPONENTS, 'value': 'five_year', 'fallback': 'most_recent',
+             'match': 'position'},
+}
+
+# profiles making up the features, in column order
+FEATURE_PROFILES = ['basic', 'lightends', 'btex']
+
+
 class CleanData():
     """
     This class is used to clean data scraped from https://www.crudemonitor.ca/
@@ -13,33 +53,98 @@ class CleanData():
     Default is the current working directory
 
     profile_name: str. The profile which we intent to clean. By default "distillation"
+
+    store_path: str, optional. A consolidated dataset file written by `build_store`.
+    When it exists and the .csv files did not change since it was written,
+    `get_x_y_data` reads it instead of parsing the .csv files.
     """
 
-    def __init__(self, base_path='.') -> None:
+    def __init__(self, base_path='.', store_path=None) -> None:
         self.base_path = base_path
+        self.store_path = store_path
 
     
-    def clean_distillation(self) -> pd.DataFrame:
+    def load_profile(self, profile_name, oils=None):
+        """
+        Read every .csv file of a profile in one batch and apply the five-year ->
+        most-recent fallback on all of them at once, following PROFILE_SPECS.
 
-        data_folder = 'distillation_data'
-        dir_path = os.path.join(self.base_path, data_folder)
-        
-        percentages = ['IBP', 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]
-        distill_data = {'percentage': percentages}
-        
-        for file in os.listdir(dir_path):
-            if file.endswith('.csv'):
-                file_path = os.path.join(dir_path, file)
-                file_name = os.path.splitext(file)[0].replace(" ", "")
-                df = pd.read_csv(file_path)
-                df = df.replace('---', np.nan)
-                df['recent_C'] = df['recent_C'].astype('float64')
-                df['5_year_C'] = df['5_year_C'].astype('float64')
-                df['Temparature'] = df['5_year_C']
-                df['Temparature'].fillna(df.recent_C, inplace=True)
-                distill_data[file_name] = df.Temparature.values
-        
-        distill_df = pd.DataFrame(data=distill_data)
+        INPUT:
+        ------
+        profile_name: str, one of PROFILE_SPECS.
+        oils: optional, only the oils (names without spaces) in this collection are read.
+
+        OUTPUT:
+        ------
+        (oil names, 2D array with one row per oil and one column per label of the profile)
+        """
+        spec = PROFILE_SPECS[profile_name]
+        dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+        excluded = set(spec.get('exclude', ()))
+
+        # glue all files together, every line prefixed with the index of its oil
+        names, chunks, columns = [], [], None
+        for file in sorted(os.listdir(dir_path)):
+            if not file.endswith('.csv'):
+                continue
+            file_name = os.path.splitext(file)[0].replace(" ", "")
+            if (oils is not None and file_name not in oils) or file_name in excluded:
+                continue
+            with open(os.path.join(dir_path, file), encoding='utf-8') as f:
+                header = f.readline()
+                body = f.read()
+            columns = columns or header.strip().split(',')
+            chunks.append(re.sub(r'^(?=.)', '%d,' % len(names), body, flags=re.M))
+            names.append(file_name)
+
+        labels = spec['labels']
+        values = np.full((len(names), len(labels), 2), np.nan)
+        if not names:
+            return names, values[:, :, 0]
+
+        text = '\n'.join(chunk.rstrip('\n') for chunk in chunks)
+        df = pd.read_csv(io.StringIO(text), header=None, names=['oil'] + columns,
+                         dtype={columns[0]: str}, na_values=['---', 'ND'])
+        oil_index = df['oil'].to_numpy()
+
+        # column of each row, by its position in the file or by its label
+        if spec['match'] == 'position':
+            label_index = df.groupby('oil').cumcount().to_numpy()
+        else:
+            label_index = pd.Index([str(label) for label in labels]).get_indexer(df[columns[0]])
+        valid = (label_index >= 0) & (label_index < len(labels))
+
+        stacked = df[[spec['value'], spec['fallback']]].apply(pd.to_numeric, errors='coerce').to_numpy()
+        values[oil_index[valid], label_index[valid]] = stacked[valid]
+        values = np.where(np.isnan(values[:, :, 0]), values[:, :, 1], values[:, :, 0])
+
+        if spec.get('complete'):
+            # only keep oils which list every label of the profile
+            found = np.zeros(values.shape, dtype=bool)
+            found[oil_index[valid], label_index[valid]] = True
+            keep = found.all(axis=1)
+            names = [name for name, k in zip(names, keep) if k]
+            values = values[keep]
+        return names, values
+
+
+    def _profile_frame(self, profile_name, oils=None) -> pd.DataFrame:
+        # the layout returned by the clean_* methods: one row per label, one column per oil
+        names, values = self.load_profile(profile_name, oils)
+        df = pd.DataFrame(values.T, columns=names)
+        df.insert(0, 'property', PROFILE_SPECS[profile_name]['labels'])
+        return df
+
+    
+    @timed_function('clean_distillation')
+    def clean_distillation(self) -> pd.DataFrame:
+        """
+        OUTPUT:
+        ------
+        a pandas.DataFrame indexed by percentage (without IBP), with the boiling
+        temperature of every oil that has a distillation profile. 
+        """
+        distill_df = self._profile_frame('distillation').rename(columns={'property': 'percentage'})
         distill_df = distill_df.drop(0).reset_index(drop=True) # remove the row IBP 
         distill_df.set_index('percentage', inplace=True)
         
@@ -48,6 +153,7 @@ class CleanData():
         return distill_df
 
 
+    @timed_function('clean_basic')
     def clean_basic(self) -> pd.DataFrame:
         """
         OUTPUT:
@@ -55,32 +161,10 @@ class CleanData():
         a pandas.DataFrame containing basic information for all crude oils who have 
         valid distillation profile. 
         """
-
-        data_folder = 'basic_data'
-        dir_path = os.path.join(self.base_path, data_folder)
-
-        properties = ['Density(kg/m³)', 'Gravity(°API)', 'Sulphur(wt%)',
-       'MicroCarbonResidue(wt%)', 'Nickel(mg/kg)', 'Vanadium(mg/kg)']
-        basic_data = {"property": properties}
-
-        for file in os.listdir(dir_path):
-            if file.endswith('.csv'):
-                file_path = os.path.join(dir_path, file)
-                file_name = os.path.splitext(file)[0].replace(" ", "")
-                if (file_name in self.oil_types) and (file_name != 'PremiumAlbianSynthetic(PAS)'):
-                    df = pd.read_csv(file_path)
-                    df = df.replace(['---', 'ND'], np.nan)
-                    df = df[df["property"].isin(properties)].reset_index()
-                    df["values"] = df['five_year']
-                    df["values"].fillna(df.most_recent, inplace=True)
-                    if len(df.values) == len(properties):
-                        basic_data[file_name] = df["values"].values
-
-        basic_df = pd.DataFrame(data=basic_data)
-        return basic_df 
-
+        return self._profile_frame('basic', self.oil_types)
 
 
+    @timed_function('clean_lightends')
     def clean_lightends(self) -> pd.DataFrame:
         """
         OUTPUT:
@@ -88,32 +172,10 @@ class CleanData():
         a pandas.DataFrame containing light ends components for all crude oils who have 
         valid distillation profile. 
         """
-        
-        data_folder = 'lightends_data'
-        dir_path = os.path.join(self.base_path, data_folder)
-
-        components = ['C3-(vol%)', 'iC4iso-Butane(vol%)', 'nC4n-Butane(vol%)',
-       'iC5iso-Pentane(vol%)', 'nC5n-Pentane(vol%)', 'C6Hexanes(vol%)',
-       'C7Heptanes(vol%)', 'C8Octanes(vol%)', 'C9Nonanes(vol%)',
-       'C10Decanes(vol%)']
-        lightends_data = {"property": components}
-
-        for file in os.listdir(dir_path):
-            if file.endswith('.csv'):
-                file_path = os.path.join(dir_path, file)
-                file_name = os.path.splitext(file)[0].replace(" ", "")
-                if file_name in self.oil_types:
-                    df = pd.read_csv(file_path)
-                    df = df.replace(['---', 'ND'], np.nan)
-                    df["values"] = df.five_year
-                    df["values"].fillna(df.most_recent, inplace=True)
-                    lightends_data[file_name] = df["values"]
-
-        lightends_df = pd.DataFrame(data=lightends_data)
-        return lightends_df 
-
+        return self._profile_frame('lightends', self.oil_types)
 
 
+    @timed_function('clean_btex')
     def clean_btex(self) -> pd.DataFrame:
         """
         OUTPUT:
@@ -121,48 +183,167 @@ class CleanData():
         a pandas.DataFrame containing btex components for all crude oils who have 
         valid distillation profile. 
         """
-        
-        data_folder = 'btex_data'
-        dir_path = os.path.join(self.base_path, data_folder)
+        return self._profile_frame('btex', self.oil_types)
 
-        components = ['Benzene(vol%)', 'Toluene(vol%)', 'Ethylbenzene(vol%)',
-       'Xylenes(vol%)']
-        btex_data = {"property": components}
 
-        for file in os.listdir(dir_path):
-            if file.endswith('.csv'):
-                file_path = os.path.join(dir_path, file)
-                file_name = os.path.splitext(file)[0].replace(" ", "")
-                if file_name in self.oil_types:
-                    df = pd.read_csv(file_path)
-                    df = df.replace(['---', 'ND'], np.nan)
-                    df["values"] = df.five_year
-                    df["values"].fillna(df.most_recent, inplace=True)
-                    btex_data[file_name] = df["values"]
-
-        btex_df = pd.DataFrame(data=btex_data)
-        return btex_df 
-
-
-    def get_x_y_data(self) -> pd.DataFrame:
+    def source_stamp(self):
+        """
+        A hash of the name, size and modification time of every .csv file of
+        the profiles, or None when none of the profile directories exist.
+        """
+        digest = hashlib.sha256()
+        found = False
+        for profile_name in ['distillation'] + FEATURE_PROFILES:
+            dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+            if not os.path.isdir(dir_path):
+                continue
+            found = True
+            for file in sorted(os.listdir(dir_path)):
+                if file.endswith('.csv'):
+                    stat = os.stat(os.path.join(dir_path, file))
+                    digest.update(('%s/%s %d %d\n' % (profile_name, file, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+        return digest.hexdigest() if found else None
+
+
+    def get_x_y_data(self, from_store=True) -> pd.DataFrame:
         """
         Combining basic, light ends, and btex datas and return a large 
         dataframe containing all independent variables (X). The columns will 
         be all the features while the rows will be all different oil names with 
         valid distillation data. 
+
+        When `store_path` is set and `from_store` is True, both dataframes are 
+        read from the consolidated store without parsing any .csv file, as
+        long as the store was written from the current .csv files (see
+        `source_stamp`) or there are no .csv files left. Otherwise the store
+        is rebuilt.
         """
 
-        target_df = self.clean_distillation().T.astype(float)
-        
-        basic_df = self.clean_basic()
-        lightends_df = self.clean_lightends()
-        btex_df = self.clean_btex()
+        if from_store and self.store_path:
+            stamp = self.source_stamp()
+            if os.path.exists(self.store_path) and stamp in (None, read_store_metadata(self.store_path).get('sources')):
+                feature_df, target_df = read_store(self.store_path)
+                self.oil_types = target_df.index.values
+                return feature_df, target_df
+            return self.build_store()
+
+        feature_df, target_df = assemble_x_y(self.load_profile)
+        self.oil_types = target_df.index.values
+        return feature_df, target_df
+
 
-        feature_df = pd.concat([basic_df, lightends_df, btex_df]).set_index('property').T.astype(float)
+    def build_store(self, store_path=None) -> pd.DataFrame:
+        """
+        Parse the .csv files and write the result into one consolidated store
+        at `store_path` (by default `self.store_path`), along with the
+        `source_stamp` of the files parsed. Returns x and y data.
+        """
+        store_path = store_path or self.store_path
+        # stamped before parsing, so a file changed meanwhile triggers a rebuild next time
+        stamp = self.source_stamp()
+        feature_df, target_df = self.get_x_y_data(from_store=False)
+        write_store(store_path, feature_df, target_df, {'sources': stamp or ''})
+        self.store_path = store_path
         return feature_df, target_df
 
 
 
+def assemble_x_y(load_profile):
+    """
+    x and y data from the profiles returned by `load_profile`, a function
+    (profile_name, oils) -> (oil names, 2D array) like CleanData.load_profile.
+    The rows of y data are the oils with a distillation profile; features of
+    each profile are put side by side, oils missing from a profile are left NaN.
+    """
+    oils, distill = load_profile('distillation', None)
+    target_df = pd.DataFrame(distill[:, 1:], index=oils,  # remove the column IBP
+                             columns=pd.Index(PERCENTAGES[1:], name='percentage'))
+
+    profiles = [(name, *load_profile(name, set(oils))) for name in FEATURE_PROFILES]
+    feature_oils = list(dict.fromkeys(oil for _, names, _ in profiles for oil in names))
+    columns = [label for name in FEATURE_PROFILES for label in PROFILE_SPECS[name]['labels']]
+
+    features = np.full((len(feature_oils), len(columns)), np.nan)
+    rows = pd.Index(feature_oils)
+    start = 0
+    for name, names, values in profiles:
+        width = values.shape[1]
+        features[rows.get_indexer(names), start:start + width] = values
+        start += width
+
+    feature_df = pd.DataFrame(features, index=feature_oils, columns=pd.Index(columns, name='property'))
+    return feature_df, target_df
+
+
+def fill_values(x_data, Y_data) -> dict:
+    """
+    The value replacing the NaN values of each oil: the mean of its other 
+    features for x_data, and the highest temperature of its profile for Y_data
+    (it is usually the end of the curve which is missing).
+    """
+    return {'x_data': x_data.mean(axis=1), 'Y_data': Y_data.max(axis=1)}
+
+
+def fill_missing(x_data, Y_data, values=None):
+    """
+    Fill the NaN values left after cleaning with `values`, by default the
+    ones given by `fill_values`.
+    """
+    values = values or fill_values(x_data, Y_data)
+    x_data = x_data.mask(x_data.isna(), values['x_data'], axis=0)
+    Y_data = Y_data.mask(Y_data.isna(), values['Y_data'], axis=0)
+    return x_data, Y_data
+
+
+
+def write_store(path, x_data, Y_data, metadata=None) -> None:
+    """
+    Save x and y data in a single uncompressed .npz file: one float matrix for
+    each, plus their oil index and column labels. `metadata` is an optional
+    dict of strings saved alongside.
+    """
+    def labels(index):
+        if pd.api.types.infer_dtype(index) == 'integer':
+            return np.asarray(index, dtype='int64')
+        return np.asarray(index).astype(str)
+
+    arrays = {
+        'x_values': x_data.to_numpy(dtype='float64'),
+        'x_index': labels(x_data.index),
+        'x_columns': labels(x_data.columns),
+        'y_values': Y_data.to_numpy(dtype='float64'),
+        'y_index': labels(Y_data.index),
+        'y_columns': labels(Y_data.columns),
+        'names': np.array([name or '' for name in 
+                (x_data.index.name, x_data.columns.name, Y_data.index.name, Y_data.columns.name)]),
+    }
+    for key, value in (metadata or {}).items():
+        arrays['meta_' + key] = np.array(str(value))
+
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_store(path):
+    """
+    Read x and y data back from a file written by `write_store`.
+    """
+    with np.load(path, allow_pickle=False) as store:
+        names = [name or None for name in store['names']]
+        x_data = pd.DataFrame(store['x_values'], index=pd.Index(store['x_index'], name=names[0]),
+                              columns=pd.Index(store['x_columns'], name=names[1]))
+        Y_data = pd.DataFrame(store['y_values'], index=pd.Index(store['y_index'], name=names[2]),
+                              columns=pd.Index(store['y_columns'], name=names[3]))
+    return x_data, Y_data
+
+
+def read_store_metadata(path) -> dict:
+    with np.load(path, allow_pickle=False) as store:
+        return {key[5:]: str(store[key]) for key in store.files if key.startswith('meta_')}
+
+
+
 if __name__ == '__main__':
     data = CleanData()
     data.get_x_y_data()
\ No newline at end of file
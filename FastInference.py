@@ -0,0 +1,219 @@
+"""
+Lean inference for a fitted scaler -> PCA -> model pipeline.
+
+`Pipeline.predict` validates and converts its input at every step, and for a
+single blend that costs more than the prediction itself. compiledModel does
+the same math on plain NumPy arrays:
+
+* the scaler and the PCA are one affine map, folded into a matrix and an offset.
+* a linear model (Lasso, LinearRegression) is folded in as well, so a
+  prediction is a single matrix product.
+* k nearest neighbors compare the transformed rows with the transformed
+  training rows kept by the fitted model.
+* the trees of a random forest are packed into flat node arrays and walked
+  for all rows and trees at once, one level per step.
+
+Any other model falls back to the pipeline, and so do batches of more than
+`max_rows` rows for neighbors and forests, whose compiled code is built for
+latency: scikit-learn is faster on large batches. Predictions match the
+pipeline's to floating point tolerance.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+LINEAR_MODELS = ['Lasso', 'LinearRegression', 'Ridge', 'ElasticNet']
+
+
+
+def unwrap(model):
+    # search -> best pipeline, modelSwitcher -> estimator
+    model = getattr(model, 'best_estimator_', model)
+    steps = dict(getattr(model, 'steps', [('model', model)]))
+    estimator = steps['model']
+    return model, steps.get('scaler'), steps.get('reduce_dim'), getattr(estimator, 'estimator', estimator)
+
+
+def affine_map(scaler, pca, n_features):
+    """
+    (matrix, offset) such that `X @ matrix + offset` is the scaler and PCA transform of X.
+    """
+    matrix, offset = np.eye(n_features), np.zeros(n_features)
+    if scaler is not None and scaler != 'passthrough':
+        if scaler.scale_ is not None:
+            matrix = matrix / scaler.scale_[None, :]
+        if scaler.mean_ is not None:
+            offset = offset - scaler.mean_ @ matrix
+    if pca is not None and pca != 'passthrough':
+        components = pca.components_.T
+        if pca.whiten:
+            components = components / np.sqrt(pca.explained_variance_)[None, :]
+        offset = (offset - pca.mean_) @ components
+        matrix = matrix @ components
+    return np.ascontiguousarray(matrix), offset
+
+
+
+class compiledModel():
+    """
+    Parameters:
+    ----------
+    model: a fitted pipeline as built by CrudeBlendModel.make_pipeline, a
+    fitted search over it, or a bare fitted estimator.
+
+    max_rows: int, larger batches of a neighbors or forest model go through the pipeline.
+
+    `kind` tells which path is used: 'linear', 'neighbors', 'forest' or 'pipeline'.
+    """
+
+    # predict_blends can skip building a DataFrame
+    accepts_arrays = True
+
+    def __init__(self, model, max_rows=64) -> None:
+        self.max_rows = max_rows
+        self.pipeline, scaler, pca, estimator = unwrap(model)
+        first = next(step for step in (scaler, pca, estimator) if step not in (None, 'passthrough'))
+        self.feature_names = getattr(first, 'feature_names_in_', None)
+        self.n_features = first.n_features_in_
+        self.matrix, self.offset = affine_map(scaler, pca, self.n_features)
+        self.buffers = threading.local()
+
+        name = type(estimator).__name__
+        if name in LINEAR_MODELS:
+            self._compile_linear(estimator)
+        elif name == 'KNeighborsRegressor' and estimator.effective_metric_ == 'euclidean':
+            self._compile_neighbors(estimator)
+        elif name == 'RandomForestRegressor':
+            self._compile_forest(estimator)
+        else:
+            self.kind = 'pipeline'
+            self.squeeze = False
+
+
+    def __getstate__(self) -> dict:
+        # the per thread buffers are not pickled, e.g. when sent to worker processes
+        state = self.__dict__.copy()
+        del state['buffers']
+        return state
+
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.buffers = threading.local()
+
+
+    def _compile_linear(self, estimator) -> None:
+        self.kind = 'linear'
+        coef = np.atleast_2d(estimator.coef_)
+        self.squeeze = np.ndim(estimator.coef_) == 1
+        self.matrix, self.offset = (np.ascontiguousarray(self.matrix @ coef.T),
+                                    self.offset @ coef.T + estimator.intercept_)
+
+
+    def _compile_neighbors(self, estimator) -> None:
+        self.kind = 'neighbors'
+        self.train_points = np.ascontiguousarray(estimator._fit_X, dtype=np.float64)
+        self.train_targets = estimator._y.reshape(len(estimator._y), -1).astype(np.float64)
+        self.squeeze = estimator._y.ndim == 1
+        self.n_neighbors = estimator.n_neighbors
+        self.weights = estimator.weights
+        assert self.weights in ('uniform', 'distance')
+
+
+    def _compile_forest(self, estimator) -> None:
+        self.kind = 'forest'
+        trees = [tree.tree_ for tree in estimator.estimators_]
+        sizes = [tree.node_count for tree in trees]
+        self.roots = np.cumsum([0] + sizes[:-1])
+        self.depth = max(tree.max_depth for tree in trees)
+
+        left, right, feature, threshold, value = [], [], [], [], []
+        for root, tree in zip(self.roots, trees):
+            nodes = np.arange(tree.node_count) + root
+            leaf = tree.children_left == -1
+            # a leaf points to itself, so walking past it changes nothing
+            left.append(np.where(leaf, nodes, tree.children_left + root))
+            right.append(np.where(leaf, nodes, tree.children_right + root))
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            value.append(tree.value[:, :, 0])
+        self.left, self.right = np.concatenate(left), np.concatenate(right)
+        self.feature, self.threshold = np.concatenate(feature), np.concatenate(threshold)
+        self.value = np.concatenate(value)
+        self.squeeze = estimator.n_outputs_ == 1
+
+
+    def _nodes(self, n_rows) -> np.ndarray:
+        # node of every (row, tree), reused between calls of the same thread
+        nodes = getattr(self.buffers, 'nodes', None)
+        if nodes is None or nodes.shape[0] < n_rows:
+            nodes = self.buffers.nodes = np.empty((max(n_rows, 1), len(self.roots)), dtype=np.intp)
+        nodes = nodes[:n_rows]
+        nodes[:] = self.roots[None, :]
+        return nodes
+
+
+    def _array(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None:
+                X = X[self.feature_names]
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError('expected %d features, got an array of shape %s' % (self.n_features, X.shape))
+        return X
+
+
+    def predict(self, X) -> np.ndarray:
+        X = self._array(X)
+        if self.kind == 'pipeline' or (self.kind != 'linear' and len(X) > self.max_rows):
+            if self.feature_names is not None:
+                X = pd.DataFrame(X, columns=self.feature_names)
+            return np.asarray(self.pipeline.predict(X))
+
+        if self.kind == 'linear':
+            predictions = X @ self.matrix + self.offset
+        elif self.kind == 'neighbors':
+            predictions = self._predict_neighbors(X @ self.matrix + self.offset)
+        else:
+            predictions = self._predict_forest(X @ self.matrix + self.offset)
+        return predictions[:, 0] if self.squeeze else predictions
+
+
+    def _predict_neighbors(self, Z, chunk_size=256) -> np.ndarray:
+        predictions = np.empty((len(Z), self.train_targets.shape[1]))
+        k = self.n_neighbors
+        for start in range(0, len(Z), chunk_size):
+            chunk = Z[start:start + chunk_size]
+            distances = np.sqrt(((chunk[:, None, :] - self.train_points[None, :, :]) ** 2).sum(axis=2))
+            neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            targets = self.train_targets[neighbors]
+
+            if self.weights == 'uniform':
+                predictions[start:start + len(chunk)] = targets.mean(axis=1)
+                continue
+            # like scikit-learn: an exact match takes all the weight
+            with np.errstate(divide='ignore'):
+                weights = 1.0 / np.take_along_axis(distances, neighbors, axis=1)
+            exact = np.isinf(weights)
+            exact_rows = exact.any(axis=1)
+            weights[exact_rows] = exact[exact_rows]
+            predictions[start:start + len(chunk)] = (
+                (targets * weights[:, :, None]).sum(axis=1) / weights.sum(axis=1)[:, None])
+        return predictions
+
+
+    def _predict_forest(self, Z) -> np.ndarray:
+        # the trees compare float32 features with float64 thresholds
+        Z = Z.astype(np.float32)
+        nodes = self._nodes(len(Z))
+        rows = np.arange(len(Z))[:, None]
+        for _ in range(self.depth):
+            go_left = Z[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes[:] = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
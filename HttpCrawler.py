@@ -0,0 +1,231 @@
+"""
+A browser-free crawler for https://www.crudemonitor.ca/
+
+Oil pages are fetched over plain HTTP by a bounded pool of worker threads
+and the profile tables are parsed straight from the HTML. The output is the
+same set of .csv files getProfiles writes, so DataCleaner works unchanged.
+Crawls are incremental: pages are requested with the validators kept in the
+crawl manifest and only the tables whose content changed are rewritten.
+"""
+
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from CrawlManifest import CrawlManifest
+from Metrics import timed_function
+from PageParser import PROFILE_TABLES, extract_oil_links, extract_valid_tables, write_profile_csv
+
+
+# specify URL
+URL = "https://www.crudemonitor.ca/"
+
+USER_AGENT = "BlendedCrudeDistillationProfile/1.0 (+https://github.com/Pxie024/BlendedCrudeDistillationProfile)"
+
+# HTTP status codes worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+
+class hostRateLimiter():
+    """
+    Spaces out requests to the same host by at least `min_interval` seconds,
+    no matter how many worker threads are asking.
+    """
+
+    def __init__(self, min_interval=0.5) -> None:
+        self.min_interval = min_interval
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+
+    def wait(self, url) -> None:
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+
+class fetchProfiles():
+    """
+    Used to get information about Profiles for all crude oils listed on
+    https://www.crudemonitor.ca/ without launching a browser.
+
+    Parameters:
+    ----------
+    URL: str, the home page listing all the oils.
+    base_path: str, the directory holding the *_data directories.
+    max_workers: int, number of pages fetched concurrently.
+    min_interval: float, minimum number of seconds between two requests to the same host.
+    max_retries: int, number of retries for a failed request.
+    backoff: float, the first retry waits `backoff` seconds, doubling on every attempt.
+    max_delay: float, the longest wait before a retry, also for the delays a
+    server asks for with Retry-After. By default `backoff * 2 ** max_retries`.
+    timeout: float, socket timeout of a single request in seconds.
+    """
+
+    def __init__(self, URL=URL, base_path='.', max_workers=8, min_interval=0.5,
+                 max_retries=3, backoff=1.0, timeout=30, manifest=None, max_delay=None) -> None:
+        self.URL = URL
+        self.base_path = base_path
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay if max_delay is not None else backoff * 2 ** max_retries
+        self.timeout = timeout
+        self.rate_limiter = hostRateLimiter(min_interval)
+        self.manifest = manifest or CrawlManifest(os.path.join(base_path, 'crawl_manifest.json'))
+        self.errors = {}
+        self.stats = {}
+        self.crawled_oils = []
+        self.changed_oils = []
+
+        for profile_name in PROFILE_TABLES:
+            dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+
+
+    def get(self, url, headers=None):
+        """
+        GET `url`, waiting for the rate limiter and retrying on connection errors
+        and on 429/5xx responses, at most `max_delay` seconds after each failure.
+
+        OUTPUT:
+        ------
+        (body, response headers). body is None when the server answered
+        304 Not Modified to a conditional request.
+        """
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, **(headers or {})})
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(url)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    charset = response.headers.get_content_charset() or 'utf-8'
+                    return response.read().decode(charset, errors='replace'), response.headers
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    return None, e.headers
+                if e.code not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                delay = e.headers.get('Retry-After') if e.headers else None
+                delay = float(delay) if delay and delay.isdigit() else self.backoff * 2 ** attempt
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            time.sleep(min(delay, self.max_delay))
+
+
+    def fetch(self, url) -> str:
+        """
+        GET `url` and return the decoded body.
+        """
+        return self.get(url)[0]
+
+
+    def get_oil_links(self) -> list:
+        """
+        Returns the list of (oil_name, absolute url) found on the home page.
+        """
+        html = self.fetch(self.URL)
+        return [(name, urljoin(self.URL, href)) for name, href in extract_oil_links(html)]
+
+
+    def get_profiles(self, oil_name, url) -> list:
+        """
+        Fetch one oil page and write the profile tables that changed since the
+        last crawl as .csv files. Nothing is parsed or written when the server
+        says the page was not modified. Every table is checked first (see
+        PageParser.extract_valid_tables), a ValueError leaves all the files of
+        the oil untouched.
+
+        OUTPUT:
+        ------
+        the list of profile names that were written.
+        """
+        html, headers = self.get(url, self.manifest.validators(oil_name, url))
+        if html is None:
+            return []
+
+        written = []
+        for profile_name, rows in extract_valid_tables(html).items():
+            digest = self.manifest.table_changed(oil_name, profile_name, rows)
+            if digest is not None:
+                dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+                write_profile_csv(dir_path, oil_name, profile_name, rows)
+                # only a written table counts as crawled, a failed write is retried next time
+                self.manifest.record_table(oil_name, profile_name, digest)
+                written.append(profile_name)
+        self.manifest.update_validators(oil_name, url, headers.get('ETag'), headers.get('Last-Modified'))
+        return written
+
+
+    @timed_function('crawl')
+    def get_all_profiles(self) -> list:
+        """
+        Crawl every oil listed on the home page. Oils whose page could not be
+        fetched are recorded in `self.errors` instead of stopping the crawl.
+        The oils crawled successfully are kept in `self.crawled_oils`.
+
+        OUTPUT:
+        ------
+        the list of oil names with at least one table that changed since the
+        last crawl. It is also saved in the crawl manifest.
+        """
+        start = time.perf_counter()
+        self.errors = {}
+        self.manifest.changed_oils = set()
+        oil_links = self.get_oil_links()
+
+        crawled, changed = [], []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [(oil_name, pool.submit(self.get_profiles, oil_name, url))
+                       for oil_name, url in oil_links]
+            for oil_name, future in futures:
+                try:
+                    if future.result():
+                        changed.append(oil_name)
+                    crawled.append(oil_name)
+                except Exception as e:
+                    self.errors[oil_name] = repr(e)
+        self.manifest.save()
+        self.crawled_oils = crawled
+        self.changed_oils = changed
+
+        elapsed = time.perf_counter() - start
+        pages = len(oil_links) + 1 # oil pages plus the home page
+        self.stats = {'pages': pages, 'seconds': elapsed, 'pages_per_second': pages / elapsed}
+        print('crawled %d pages in %.1fs (%.2f pages/s), %d oils changed' % (pages, elapsed, pages / elapsed, len(changed)))
+        return changed
+
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--min-interval', type=float, default=0.5)
+    parser.add_argument('--compare', action='store_true',
+                        help='also run the Selenium crawler and report both throughputs')
+    args = parser.parse_args()
+
+    oil_profiles = fetchProfiles(args.url, max_workers=args.workers, min_interval=args.min_interval)
+    oil_profiles.get_all_profiles()
+
+    if args.compare:
+        from WebCrawler import getProfiles
+        selenium_profiles = getProfiles()
+        selenium_profiles.get_all_profiles()
+        for name, stats in [('http', oil_profiles.stats), ('selenium', selenium_profiles.stats)]:
+            print('%-8s %6d pages %8.1fs %8.2f pages/s' % (name, stats['pages'], stats['seconds'], stats['pages_per_second']))
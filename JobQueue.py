@@ -0,0 +1,388 @@
+"""
+Background jobs: retrains, crawls and sweeps submitted from the web app run in
+worker processes, so the app keeps answering requests meanwhile.
+
+* the queue is a SQLite database (`artifacts/jobs.sqlite`), one row per job
+  with its parameters, status, progress, result and timings. It survives
+  restarts and can be shared by any number of apps and workers.
+* a worker (`python JobQueue.py`, or started by `python main.py serve
+  --job-workers 1`) claims the oldest queued job and runs it in a child process
+  at a lower priority, in a process group of its own. The child reports its
+  progress with `report_progress`; a job cancelled while running has its
+  whole process group terminated, pool workers included.
+* every finished job records its wall clock time and the CPU time of its
+  process and of the processes it waited for. Processes it leaves running,
+  e.g. the reusable workers of joblib, are not counted, and are terminated
+  with the job.
+
+    queue = jobQueue()
+    job_id = queue.submit('sweep', step=0.05, out='sweep.csv')
+    queue.get(job_id)['status']     # 'queued', 'running', 'done', 'failed' or 'cancelled'
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+import traceback
+
+from ModelRegistry import JOBS_PATH
+
+
+# the function run by each kind of job, as 'module:function', called with the job parameters
+JOBS = {
+    'crawl': 'main:crawl',
+    'clean': 'main:clean',
+    'train': 'main:train',
+    'sweep': 'main:sweep',
+}
+
+STATUSES = ['queued', 'running', 'done', 'failed', 'cancelled']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker INTEGER,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    wall_seconds REAL,
+    cpu_seconds REAL
+)
+"""
+
+# the job run by this process, see report_progress
+_current = None
+
+
+
+class jobQueue():
+    """
+    Parameters:
+    ----------
+    path: str, the SQLite database, created if needed.
+    jobs: dict, the function of each kind of job accepted by `submit`, see
+    JOBS. It is stored with every job, so any worker can run it.
+    """
+
+    def __init__(self, path=JOBS_PATH, jobs=JOBS) -> None:
+        self.path = path
+        self.jobs = jobs
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+
+
+    @contextlib.contextmanager
+    def connect(self):
+        # one short lived connection per call, so threads and processes never share one
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+    def submit(self, kind, **params) -> int:
+        """
+        Queue a job of `kind` (a key of `jobs`) called with `params`, which must
+        be JSON serializable. Returns the job id.
+        """
+        assert kind in self.jobs, 'unknown job %r, expected one of %s' % (kind, sorted(self.jobs))
+        with self.connect() as db:
+            cursor = db.execute('INSERT INTO jobs (kind, target, params, submitted) VALUES (?, ?, ?, ?)',
+                                (kind, self.jobs[kind], json.dumps(params), time.time()))
+        return cursor.lastrowid
+
+
+    def get(self, job_id):
+        """
+        The job as a dict, or None when there is no such job.
+        """
+        with self.connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _to_dict(row) if row is not None else None
+
+
+    def list(self, status=None, limit=50) -> list:
+        """
+        The last `limit` jobs, newest first, optionally only those of `status`.
+        """
+        with self.connect() as db:
+            if status is None:
+                rows = db.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+            else:
+                rows = db.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?',
+                                  (status, limit)).fetchall()
+        return [_to_dict(row) for row in rows]
+
+
+    def cancel(self, job_id) -> bool:
+        """
+        Cancel a queued job at once, or ask the worker of a running job to stop
+        it. Returns False when the job already finished.
+        """
+        with self.connect() as db:
+            queued = db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                                (time.time(), job_id)).rowcount
+            running = db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                                 (job_id,)).rowcount
+        return bool(queued or running)
+
+
+    def claim(self, worker=None):
+        """
+        Mark the oldest queued job as running for `worker` (a pid) and return
+        it, or None when nothing is queued.
+        """
+        with self.connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                           (worker or os.getpid(), time.time(), row['id']))
+            db.execute('COMMIT')
+        return self.get(row['id']) if row is not None else None
+
+
+    def progress(self, job_id, fraction, message=None) -> None:
+        with self.connect() as db:
+            db.execute('UPDATE jobs SET progress = ?, message = COALESCE(?, message) WHERE id = ?',
+                       (fraction, message, job_id))
+
+
+    def cancel_requested(self, job_id) -> bool:
+        with self.connect() as db:
+            row = db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+
+    def store_result(self, job_id, result=None, error=None) -> None:
+        with self.connect() as db:
+            db.execute('UPDATE jobs SET result = ?, error = ? WHERE id = ?',
+                       (json.dumps(result, default=str), error, job_id))
+
+
+    def finish(self, job_id, status, wall_seconds, cpu_seconds, error=None) -> None:
+        assert status in STATUSES[2:], 'a job finishes as one of %s' % STATUSES[2:]
+        with self.connect() as db:
+            db.execute("""UPDATE jobs SET status = ?, finished = ?, wall_seconds = ?, cpu_seconds = ?,
+                          error = COALESCE(?, error), progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END
+                          WHERE id = ?""",
+                       (status, time.time(), wall_seconds, cpu_seconds, error, status, job_id))
+
+
+    def fail_orphans(self) -> int:
+        """
+        Mark as failed the running jobs whose worker process is gone, e.g.
+        after a crash or a reboot. Returns their number.
+        """
+        orphans = []
+        for job in self.list('running', limit=-1):
+            try:
+                os.kill(job['worker'], 0)
+            except (OSError, TypeError):
+                orphans.append(job['id'])
+        for job_id in orphans:
+            self.finish(job_id, 'failed', None, None, error='the worker running the job stopped')
+        return len(orphans)
+
+
+
+def _to_dict(row) -> dict:
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def _group_alive(pgid) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+
+def report_progress(fraction, message=None, min_interval=0.5) -> None:
+    """
+    Report the progress (0 to 1) of the job run by this process, at most every
+    `min_interval` seconds. Does nothing outside a job.
+    """
+    global _current
+    if _current is None:
+        return
+    queue, job_id, last = _current
+    now = time.monotonic()
+    if now - last >= min_interval or fraction >= 1:
+        queue.progress(job_id, fraction, message)
+        _current = (queue, job_id, now)
+
+
+def _run_job(path, job_id, target, params, niceness) -> None:
+    # the child process of a job: run it and store its result or error
+    global _current
+    # a session of its own, so the worker can stop the job and every process it started
+    os.setsid()
+    if niceness:
+        os.nice(niceness)
+    queue = jobQueue(path)
+    _current = (queue, job_id, 0.0)
+    try:
+        module, function = target.split(':')
+        result = getattr(importlib.import_module(module), function)(**params)
+    except BaseException:
+        queue.store_result(job_id, error=traceback.format_exc(limit=5))
+        sys.exit(1)
+    queue.store_result(job_id, result)
+
+
+
+class jobWorker():
+    """
+    Runs the jobs of a queue one at a time, each in its own child process.
+
+    Parameters:
+    ----------
+    queue: jobQueue.
+    poll_interval: float, seconds between two looks at the queue when it is
+    empty, and between two checks of the cancellation of a running job.
+    niceness: int, added to the priority of the job processes, so they leave
+    the CPU to the web app.
+    """
+
+    def __init__(self, queue, poll_interval=0.5, niceness=10) -> None:
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.niceness = niceness
+
+
+    def run_one(self):
+        """
+        Run the oldest queued job, if any, and return it once finished.
+        """
+        job = self.queue.claim()
+        if job is None:
+            return None
+
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        process = multiprocessing.Process(target=_run_job, args=(self.queue.path, job['id'], job['target'],
+                                                                 job['params'], self.niceness))
+        process.start()
+        cancelled = False
+        try:
+            while process.is_alive():
+                process.join(self.poll_interval)
+                if process.is_alive() and self.queue.cancel_requested(job['id']):
+                    self.stop(process)
+                    cancelled = True
+        except BaseException:
+            # the worker is stopped (e.g. SIGTERM from the app), its job with it
+            self.stop(process)
+            self.queue.finish(job['id'], 'failed', None, None, error='the worker running the job stopped')
+            raise
+        # pool workers the job left behind
+        self.stop(process)
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # the CPU time of the job process and of the processes it waited for,
+        # not of those it left running
+        cpu_seconds = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        wall_seconds = time.perf_counter() - start
+        if cancelled:
+            status = 'cancelled'
+        else:
+            status = 'done' if process.exitcode == 0 else 'failed'
+        error = None
+        if status == 'failed' and self.queue.get(job['id'])['error'] is None:
+            error = 'the job process exited with code %s' % process.exitcode
+        self.queue.finish(job['id'], status, round(wall_seconds, 4), round(cpu_seconds, 4), error)
+        return self.queue.get(job['id'])
+
+
+    def stop(self, process, timeout=5.0) -> None:
+        """
+        Terminate the process group of a job process, then kill what is left
+        of it after `timeout` seconds.
+        """
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            # the group is gone, or the job did not start its session yet
+            if not process.is_alive():
+                return
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        process.join(timeout)
+        while _group_alive(process.pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if _group_alive(process.pid):
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+    def run(self, max_jobs=None, stop_when_idle=False) -> int:
+        """
+        Run jobs until `max_jobs` ran, or until the queue is empty with
+        `stop_when_idle`, or forever. Returns the number of jobs run.
+        """
+        self.queue.fail_orphans()
+        done = 0
+        while max_jobs is None or done < max_jobs:
+            if self.run_one() is not None:
+                done += 1
+            elif stop_when_idle:
+                break
+            else:
+                time.sleep(self.poll_interval)
+        return done
+
+
+
+def start_workers(path=JOBS_PATH, n_workers=1) -> list:
+    """
+    Start `n_workers` worker processes on the queue at `path`, independent of
+    the calling process. Returns their subprocess.Popen handles.
+    """
+    return [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--db', path])
+            for _ in range(n_workers)]
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=JOBS_PATH, help='the SQLite database of the queue')
+    parser.add_argument('--poll', type=float, default=0.5, help='seconds between two looks at an empty queue')
+    parser.add_argument('--nice', type=int, default=10, help='priority decrease of the job processes')
+    parser.add_argument('--until-idle', action='store_true', help='stop once the queue is empty')
+    args = parser.parse_args()
+
+    # stop through SystemExit, so the running job is stopped and recorded as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # run the worker of the module imported as JobQueue, the one jobs report their progress to
+    import JobQueue
+    JobQueue.jobWorker(JobQueue.jobQueue(args.db), args.poll, args.nice).run(stop_when_idle=args.until_idle)
@@ -0,0 +1,202 @@
+"""
+Timing instrumentation of the request path and of the offline stages.
+
+    with timed('mix'):
+        ...
+
+adds the time spent in the block to the `crude_stage_seconds` histogram,
+labelled by stage, and to the stage timings of the current request. With
+`instrument(app)`, every request is also timed as a whole, logged as one
+json line on the 'crude.requests' logger, and the histograms are served on
+/metrics in the Prometheus text format. In prefork serving, every worker
+process has its own histograms.
+
+The instrumentation is off when the environment variable CRUDE_METRICS is
+0, or after set_enabled(False): `timed` then returns a shared no-op context
+and the request hooks return at once.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+# upper bounds of the buckets in seconds, from a cached prediction to a training run
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+enabled = os.environ.get('CRUDE_METRICS', '1') != '0'
+
+request_logger = logging.getLogger('crude.requests')
+
+# stage -> seconds of the request being handled, see instrument
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+_NOOP = contextlib.nullcontext()
+
+
+
+class histogram():
+    """
+    A Prometheus histogram with labels.
+
+    Parameters:
+    ----------
+    name, help: name and description of the metric.
+    label_names: list of label names, `observe` takes their values in order.
+    buckets: sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, name, help, label_names, buckets=BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def observe(self, value, *label_values) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+
+    def render(self) -> list:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ''.join('%s="%s",' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket{%sle="%s"} %d' % (self.name, labels, le, cumulative))
+            braces = '{%s}' % labels.rstrip(',') if labels else ''
+            lines.append('%s_sum%s %r' % (self.name, braces, total))
+            lines.append('%s_count%s %d' % (self.name, braces, cumulative))
+        return lines
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.series.clear()
+
+
+
+STAGES = histogram('crude_stage_seconds', 'Time spent in each stage of the requests and offline commands.', ['stage'])
+REQUESTS = histogram('crude_request_seconds', 'Time to answer a request.', ['endpoint', 'method', 'status'])
+HISTOGRAMS = [STAGES, REQUESTS]
+
+
+
+class _timer():
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage) -> None:
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        STAGES.observe(elapsed, self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+
+
+def timed(stage):
+    """
+    A context manager timing the stage `stage`, a no-op when metrics are disabled.
+    """
+    return _timer(stage) if enabled else _NOOP
+
+
+def timed_function(stage):
+    """
+    A decorator timing every call of the function as the stage `stage`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_enabled(flag) -> None:
+    global enabled
+    enabled = bool(flag)
+
+
+def render() -> str:
+    """
+    All histograms in the Prometheus text format.
+    """
+    return '\n'.join(line for metric in HISTOGRAMS for line in metric.render()) + '\n'
+
+
+def write(path) -> None:
+    """
+    Write `render()` to `path`, e.g. for the textfile collector of the node exporter.
+    """
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+
+def instrument(app) -> None:
+    """
+    Time every request of the Flask `app`, log it and serve /metrics.
+    """
+    from flask import Response, abort, g, request
+
+    @app.before_request
+    def start_timer():
+        if enabled:
+            g.metrics_start = time.perf_counter()
+            g.metrics_token = _request_timings.set({})
+
+    @app.after_request
+    def record(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        timings = _request_timings.get() or {}
+        _request_timings.reset(g.pop('metrics_token'))
+
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUESTS.observe(elapsed, endpoint, request.method, response.status_code)
+        request_logger.info(json.dumps({
+            'event': 'request', 'method': request.method, 'path': request.path, 'endpoint': endpoint,
+            'status': response.status_code, 'ms': round(elapsed * 1000, 3),
+            'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+            'pid': os.getpid()}))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if not enabled:
+            abort(404)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,300 @@
+"""
+Saving and loading of the artifacts produced offline, so the web app can
+start from disk without crawling, cleaning or training anything.
+
+* the dataset artifact holds the cleaned `x_data` and `Y_data`, in the
+  consolidated .npz store of DataCleaner. The nearest analog index of the
+  dataset (see AnalogIndex) is saved next to it, `<name>.analogs.pkl`.
+* model artifacts live in a registry directory, one file per version. An
+  artifact holds the best fitted pipeline, the data it was trained on (oil
+  index and feature columns included), the fill values used to preprocess it
+  and the holdout error. Its version is a hash of that input dataset and of
+  the model configuration, so models trained on the same data with other
+  settings are kept side by side. The `LATEST` file of the registry names
+  the version to serve.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+from DataCleaner import read_store, read_store_metadata, write_store
+
+
+ARTIFACT_DIR = './artifacts'
+DATASET_PATH = os.path.join(ARTIFACT_DIR, 'dataset.npz')
+REGISTRY_DIR = os.path.join(ARTIFACT_DIR, 'models')
+ASSAY_DIR = os.path.join(ARTIFACT_DIR, 'assays')
+JOBS_PATH = os.path.join(ARTIFACT_DIR, 'jobs.sqlite')
+
+
+
+def dataset_version(x_data, Y_data) -> str:
+    """
+    A short hash identifying the content of a dataset.
+    """
+    digest = hashlib.sha256()
+    for df in (x_data, Y_data):
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+        digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def model_version(model, data_version, info) -> str:
+    """
+    A short hash of the dataset version, the model class and parameters and
+    the extra `info` of ModelRegistry.save.
+    """
+    def describe(value):
+        # nested estimators by class, their parameters are listed by get_params(deep=True)
+        if hasattr(value, 'get_params'):
+            return '%s.%s' % (type(value).__module__, type(value).__qualname__)
+        return repr(value)
+
+    params = model.get_params(deep=True) if hasattr(model, 'get_params') else {}
+    digest = hashlib.sha256()
+    digest.update(data_version.encode('utf-8'))
+    digest.update(describe(model).encode('utf-8'))
+    digest.update(repr(sorted((name, describe(value)) for name, value in params.items())).encode('utf-8'))
+    digest.update(json.dumps(info, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def _write_atomic(path, data, mode='wb') -> None:
+    # write to a temporary file first so readers never see a half written file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def analogs_path(path) -> str:
+    return os.path.splitext(path)[0] + '.analogs.pkl'
+
+
+def save_dataset(x_data, Y_data, path=DATASET_PATH) -> str:
+    """
+    Save the dataset artifact and its analog index. When the dataset only
+    gained or changed oils since the previous save, the previous index is
+    updated instead of being rebuilt.
+    """
+    from AnalogIndex import analogIndex
+
+    version = dataset_version(x_data, Y_data)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_store(path, x_data, Y_data, metadata={'version': version})
+
+    analogs = load_analogs(path)
+    if (analogs is None or analogs.columns != list(x_data.columns)
+            or analogs.percentages != list(Y_data.columns) or not set(analogs.oils) <= set(x_data.index)):
+        analogs = analogIndex(x_data, Y_data)
+    else:
+        analogs.update(x_data, Y_data)
+    analogs.version = version
+    _write_atomic(analogs_path(path), pickle.dumps(analogs, protocol=pickle.HIGHEST_PROTOCOL))
+    return version
+
+
+def load_analogs(path=DATASET_PATH):
+    """
+    The analog index saved with the dataset artifact at `path`, or None.
+    """
+    try:
+        with open(analogs_path(path), 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_dataset(path=DATASET_PATH) -> dict:
+    """
+    OUTPUT:
+    ------
+    a dict with keys 'x_data', 'Y_data', 'version' and 'analogs', the analog
+    index of this version of the dataset or None.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError('%s does not exist, build it first (see `python main.py --help`)' % path)
+    x_data, Y_data = read_store(path)
+    version = read_store_metadata(path)['version']
+    analogs = load_analogs(path)
+    if analogs is not None and analogs.version != version:
+        analogs = None
+    return {'x_data': x_data, 'Y_data': Y_data, 'version': version, 'analogs': analogs}
+
+
+class ModelRegistry():
+    """
+    A directory of versioned model artifacts.
+
+    Parameters:
+    ----------
+    root: str, the registry directory. `<version>.pkl` holds an artifact,
+    `<version>.json` its metadata and `LATEST` the version being served.
+    """
+
+    def __init__(self, root=REGISTRY_DIR) -> None:
+        self.root = root
+
+
+    def path(self, version) -> str:
+        return os.path.join(self.root, '%s.pkl' % version)
+
+
+    def save(self, model, x_data, Y_data, error, fill_values=None, promote=True, analogs=None, **info) -> str:
+        """
+        Save a fitted model with the data it was trained on, `fill_values` as
+        returned by DataCleaner.fill_values, the analog index of the dataset
+        and any extra `info` (e.g. the search strategy). The version hashes the
+        input dataset, the model configuration and `info`, see model_version;
+        the hash of the dataset alone is kept as 'data_version' in the
+        metadata. With `promote`, the artifact becomes the one served.
+        Returns the version.
+        """
+        data_version = dataset_version(x_data, Y_data)
+        version = model_version(model, data_version, info)
+        meta = {'version': version, 'data_version': data_version, 'error': error,
+                'created': datetime.datetime.now().isoformat(timespec='microseconds'),
+                'oils': len(x_data), 'features': len(x_data.columns), **info}
+        artifact = {'model': model, 'x_data': x_data, 'Y_data': Y_data,
+                    'columns': list(x_data.columns), 'oils': list(x_data.index),
+                    'fill_values': fill_values, 'analogs': analogs, 'error': error, 'version': version,
+                    'meta': meta}
+
+        _write_atomic(self.path(version), pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL))
+        _write_atomic(os.path.join(self.root, '%s.json' % version), json.dumps(meta, indent=1), 'w')
+        if promote:
+            self.promote(version)
+        return version
+
+
+    def promote(self, version) -> None:
+        """
+        Make `version` the artifact served. Running apps pick it up on their next check.
+        """
+        if not os.path.exists(self.path(version)):
+            raise FileNotFoundError('no artifact %s in %s' % (version, self.root))
+        stamp = datetime.datetime.now().isoformat(timespec='microseconds')
+        _write_atomic(os.path.join(self.root, 'LATEST'), '%s %s\n' % (version, stamp), 'w')
+
+
+    def pointer(self):
+        """
+        The content of LATEST, or None when nothing was promoted yet. It changes
+        on every promotion, even of the same version.
+        """
+        try:
+            with open(os.path.join(self.root, 'LATEST')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+
+    def latest_version(self):
+        pointer = self.pointer()
+        return pointer.split()[0] if pointer else None
+
+
+    def versions(self) -> list:
+        """
+        The metadata of every artifact, newest first.
+        """
+        metas = []
+        for file in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            if file.endswith('.json'):
+                with open(os.path.join(self.root, file)) as f:
+                    metas.append(json.load(f))
+        return sorted(metas, key=lambda meta: meta['created'], reverse=True)
+
+
+    def load(self, version=None) -> dict:
+        """
+        Load an artifact, by default the latest promoted one.
+        """
+        version = version or self.latest_version()
+        if version is None:
+            raise FileNotFoundError('%s holds no model, build one first (see `python main.py --help`)' % self.root)
+        with open(self.path(version), 'rb') as f:
+            return pickle.load(f)
+
+
+
+class liveModel():
+    """
+    The model artifact used by a running app. It is loaded lazily on first use;
+    afterwards the registry pointer is checked at most every `check_interval`
+    seconds and a newly promoted artifact is loaded by a background thread, then
+    swapped in at once. Requests keep using the previous artifact meanwhile.
+
+    Parameters:
+    ----------
+    registry: ModelRegistry.
+    prepare: optional function called on every loaded artifact (a dict), to add
+    whatever the app derives from it before it is swapped in.
+    check_interval: float, seconds between two checks of the registry pointer.
+    """
+
+    def __init__(self, registry, prepare=None, check_interval=5.0) -> None:
+        self.registry = registry
+        self.prepare = prepare
+        self.check_interval = check_interval
+        self.artifact = None
+        self.pointer = None
+        self.report = {}
+        self.lock = threading.Lock()
+        self.loader = None
+        self.next_check = 0.0
+
+
+    def load(self) -> dict:
+        """
+        Load the latest artifact and swap it in. Returns it.
+        """
+        start = time.perf_counter()
+        pointer = self.registry.pointer()
+        artifact = self.registry.load(pointer.split()[0] if pointer else None)
+        if self.prepare is not None:
+            self.prepare(artifact)
+
+        self.artifact, self.pointer = artifact, pointer
+        self.report = {
+            'artifact_path': self.registry.path(artifact['version']),
+            'artifact_version': artifact['version'],
+            'load_seconds': round(time.perf_counter() - start, 4),
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        return artifact
+
+
+    def current(self) -> dict:
+        """
+        The artifact to answer a request with. Only the very first call waits for a load.
+        """
+        if self.artifact is None:
+            with self.lock:
+                if self.artifact is None:
+                    self.load()
+                    self.next_check = time.monotonic() + self.check_interval
+            return self.artifact
+
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.check_interval
+            if self.registry.pointer() != self.pointer:
+                self._reload_in_background()
+        return self.artifact
+
+
+    def _reload_in_background(self) -> None:
+        with self.lock:
+            if self.loader is not None and self.loader.is_alive():
+                return
+            self.loader = threading.Thread(target=self.load, daemon=True)
+            self.loader.start()
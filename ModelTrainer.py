@@ -0,0 +1,122 @@
+"""
+Hyperparameter search for the crude blend model.
+
+The search runs over the pipeline and parameter grid of CrudeBlendModel with
+* the fitted scaler and PCA cached per fold and n_components (pipeline memory),
+* a choice of strategy: the full grid, successive halving (weak candidates are
+  dropped after being fitted on a fraction of the training data) or a random
+  sample of the grid,
+* a worker pool sized from the cores available to the process,
+and reports the time spent on every estimator family.
+"""
+
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+from joblib import Memory
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV
+
+from CrudeBlendModel import available_cores, make_pipeline, parameters
+from Metrics import timed
+
+
+STRATEGIES = ['grid', 'halving', 'random']
+
+
+
+def min_resources(param_grid, cv) -> int:
+    """
+    The smallest number of samples the halving strategy can start with: every
+    training fold must hold at least as many samples as the largest 
+    n_components and n_neighbors of the grid.
+    """
+    grids = param_grid if isinstance(param_grid, list) else [param_grid]
+    needed = [value for grid in grids for key, values in grid.items()
+              if key.endswith(('n_components', 'n_neighbors')) for value in values
+              if isinstance(value, int)]
+    largest = max(needed, default=1)
+    return -(-largest * cv // (cv - 1)) + 1
+
+
+def build_search(strategy='grid', param_grid=parameters, cv=5, n_jobs=None, memory=None,
+                 n_iter=60, factor=3, random_state=None):
+    """
+    Parameters:
+    ----------
+    strategy: str, one of STRATEGIES.
+    param_grid: the parameter grid, by default the one of CrudeBlendModel.
+    cv: int, number of cross validation folds.
+    n_jobs: int, size of the worker pool. By default the number of available cores.
+    memory: a directory or joblib.Memory caching the fitted transformers, None disables caching.
+    n_iter: int, number of candidates sampled by the 'random' strategy.
+    factor: int, the 'halving' strategy keeps 1/factor of the candidates at every round.
+    random_state: seed of the 'random' and 'halving' strategies.
+    """
+    assert strategy in STRATEGIES
+    pipe = make_pipeline(memory)
+    n_jobs = n_jobs or available_cores()
+
+    if strategy == 'grid':
+        return GridSearchCV(pipe, param_grid=param_grid, cv=cv, n_jobs=n_jobs)
+    if strategy == 'halving':
+        return HalvingGridSearchCV(pipe, param_grid=param_grid, cv=cv, n_jobs=n_jobs, factor=factor,
+                                   min_resources=min_resources(param_grid, cv), random_state=random_state)
+    return RandomizedSearchCV(pipe, param_distributions=param_grid, n_iter=n_iter, cv=cv,
+                              n_jobs=n_jobs, random_state=random_state)
+
+
+def timing_report(search) -> pd.DataFrame:
+    """
+    One row per estimator family (Lasso, RandomForestRegressor, ...) of a
+    fitted search: number of candidates and fits, fit and score time summed
+    over all folds, and the best mean test score of the family.
+    """
+    results = pd.DataFrame(search.cv_results_)
+    n_splits = search.n_splits_
+    results['family'] = [type(estimator).__name__ for estimator in results['param_model__estimator']]
+    results['fit_seconds'] = results['mean_fit_time'] * n_splits
+    results['score_seconds'] = results['mean_score_time'] * n_splits
+
+    report = results.groupby('family').agg(
+        candidates=('family', 'size'),
+        fit_seconds=('fit_seconds', 'sum'),
+        score_seconds=('score_seconds', 'sum'),
+        best_score=('mean_test_score', 'max'),
+    )
+    report['fits'] = report['candidates'] * n_splits
+    return report[['candidates', 'fits', 'fit_seconds', 'score_seconds', 'best_score']]
+
+
+def fit_search(x_train, Y_train, strategy='grid', cache_dir=None, **kwargs):
+    """
+    Build a search with `build_search`, fit it and print its timing report.
+    When `cache_dir` is None, the transformers are cached in a temporary
+    directory removed after the fit.
+
+    OUTPUT:
+    ------
+    (the fitted search, its timing report)
+    """
+    tmp_dir = None
+    if cache_dir is None:
+        tmp_dir = cache_dir = tempfile.mkdtemp(prefix='crude_pipeline_cache_')
+    try:
+        search = build_search(strategy, memory=Memory(cache_dir, verbose=0), **kwargs)
+        start = time.perf_counter()
+        with timed('fit'):
+            search.fit(x_train, Y_train)
+        elapsed = time.perf_counter() - start
+        # the cache is only useful during the search, do not ship it with the model
+        if hasattr(search, 'best_estimator_'):
+            search.best_estimator_.set_params(memory=None)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = timing_report(search)
+    print('%s search: %d candidates in %.1fs on %d workers' % (strategy, len(search.cv_results_['params']), elapsed, search.n_jobs))
+    print(report.to_string(float_format='%.3f'))
+    return search, report
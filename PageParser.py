@@ -0,0 +1,260 @@
+"""
+Parsing helpers shared by the crawlers. They read the raw HTML served by
+https://www.crudemonitor.ca/ and return plain Python lists, so no browser is
+needed to get the profile tables out of an oil page.
+"""
+
+import csv
+import os
+import re
+from html.parser import HTMLParser
+
+
+# id of the <table> holding each profile on an oil page
+PROFILE_TABLES = {
+    'distillation': 'HTSD',
+    'basic': 'basic-analysis',
+    'lightends': 'light-ends',
+    'btex': 'BTEX',
+}
+
+# cells standing for a missing value
+MISSING_VALUES = ['---', 'ND']
+
+# header of the .csv file written for each profile
+PROFILE_HEADERS = {
+    'distillation': ['percentage', 'recent_C', '5_year_C', 'recent_F', '5_year_F'],
+    'basic': ['property', 'most_recent', 'six_month', 'one_year', 'five_year'],
+    'lightends': ['property', 'most_recent', 'six_month', 'one_year', 'five_year'],
+    'btex': ['property', 'most_recent', 'six_month', 'one_year', 'five_year'],
+}
+
+
+
+class TableExtractor(HTMLParser):
+    """
+    Collects the cell texts of the first <tbody> of every table whose id is
+    in `table_ids`. After feeding a page, `tables` maps table id -> list of rows,
+    each row being a list of cell strings.
+    """
+
+    def __init__(self, table_ids) -> None:
+        super().__init__(convert_charrefs=True)
+        self.table_ids = set(table_ids)
+        self.tables = {}
+        self._table = None      # id of the wanted table we are inside of
+        self._depth = 0         # nesting depth of <table> tags inside it
+        self._in_tbody = False
+        self._row = None
+        self._cell = None
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._table is not None:
+                self._depth += 1
+                return
+            table_id = dict(attrs).get('id')
+            if table_id in self.table_ids and table_id not in self.tables:
+                self._table = table_id
+                self._depth = 0
+            return
+
+        if self._table is None or self._depth:
+            return
+
+        if tag == 'tbody' and not self.tables.get(self._table):
+            self._in_tbody = True
+            self.tables[self._table] = []
+        elif self._in_tbody and tag == 'tr':
+            self._row = []
+        elif self._row is not None and tag in ('td', 'th'):
+            self._cell = []
+        elif self._cell is not None and tag == 'br':
+            self._cell.append(' ')
+
+
+    def handle_endtag(self, tag):
+        if self._table is None:
+            return
+        if tag == 'table':
+            if self._depth:
+                self._depth -= 1
+            else:
+                self.tables.setdefault(self._table, [])
+                self._table = None
+                self._in_tbody = False
+            return
+        if self._depth:
+            return
+
+        if tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if any(self._row):
+                self.tables[self._table].append(self._row)
+            self._row = None
+        elif tag == 'tbody':
+            self._in_tbody = False
+
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+
+class LinkExtractor(HTMLParser):
+    """
+    Collects (text, href) for every link inside a list item of the
+    `card home-card` sections of the home page, in `links` and per section
+    in `sections`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.sections = []
+        self._div_depth = 0     # depth of <div> tags, counted inside a card only
+        self._li_depth = 0
+        self._href = None
+        self._text = None
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            if self._div_depth:
+                self._div_depth += 1
+            elif (dict(attrs).get('class') or '').split() == ['card', 'home-card']:
+                self._div_depth = 1
+                self.sections.append([])
+        elif not self._div_depth:
+            return
+        elif tag == 'li':
+            self._li_depth += 1
+        elif tag == 'a' and self._li_depth:
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._div_depth:
+            self._div_depth -= 1
+        elif tag == 'li' and self._li_depth:
+            self._li_depth -= 1
+        elif tag == 'a' and self._text is not None:
+            text = ' '.join(''.join(self._text).split())
+            if text and self._href:
+                self.links.append((text, self._href))
+                self.sections[-1].append((text, self._href))
+            self._href = None
+            self._text = None
+
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+
+def extract_tables(html, profiles=PROFILE_TABLES) -> dict:
+    """
+    INPUT:
+    ------
+    html: str, the source of an oil page.
+    profiles: optional, a subset of PROFILE_TABLES.
+
+    OUTPUT:
+    ------
+    a dict profile_name -> list of rows (see `normalize_rows`). Profiles whose
+    table is missing from the page are left out.
+    """
+    parser = TableExtractor(profiles.values())
+    parser.feed(html)
+    parser.close()
+
+    tables = {}
+    for profile_name, table_id in profiles.items():
+        if table_id in parser.tables:
+            tables[profile_name] = normalize_rows(parser.tables[table_id], profile_name)
+    return tables
+
+
+def extract_valid_tables(html, profiles=PROFILE_TABLES) -> dict:
+    """
+    Same as `extract_tables`, once every table was checked with `parse_values`.
+    A ValueError names the first invalid row, so the crawlers drop the whole
+    oil instead of writing any of its tables.
+    """
+    tables = extract_tables(html, profiles)
+    for profile_name, rows in tables.items():
+        parse_values(rows, profile_name)
+    return tables
+
+
+def extract_oil_links(html) -> list:
+    """
+    Returns the list of (oil_name, href) linked from the home page.
+    """
+    parser = LinkExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.links
+
+
+def normalize_rows(rows, profile_name) -> list:
+    """
+    Turn raw table cells into rows matching PROFILE_HEADERS[profile_name].
+    The last cells hold the values, every cell before them is part of the
+    label, which gets its spaces removed, e.g. "BC Light (BCL)" -> "BCLight(BCL)"
+    like the Selenium crawler does. Rows that are too short (section titles) are dropped.
+    """
+    num_values = len(PROFILE_HEADERS[profile_name]) - 1
+    normalized = []
+    for row in rows:
+        cells = ' '.join(row).split()
+        if len(cells) <= num_values:
+            continue
+        label = re.sub(r'\s+', '', ''.join(cells[:-num_values]))
+        normalized.append([label] + cells[-num_values:])
+    return normalized
+
+
+def parse_values(rows, profile_name) -> list:
+    """
+    Typed records of normalized rows: (label, value, ...) with every value a
+    float, or None where the site shows a missing value.
+    A ValueError names the first row holding anything else. The crawlers
+    only use it to check a page, see `extract_valid_tables`, and write the
+    rows unchanged.
+    """
+    num_values = len(PROFILE_HEADERS[profile_name]) - 1
+    records = []
+    for row in rows:
+        if len(row) != num_values + 1:
+            raise ValueError('%s row %r has %d cells, expected %d' % (profile_name, row, len(row), num_values + 1))
+        try:
+            values = [None if cell in MISSING_VALUES else float(cell) for cell in row[1:]]
+        except ValueError:
+            raise ValueError('%s row %r holds a value that is not a number' % (profile_name, row)) from None
+        records.append(tuple([row[0]] + values))
+    return records
+
+
+def write_profile_csv(dir_path, oil_name, profile_name, rows) -> str:
+    """
+    Write the normalized rows of one profile into `dir_path/oil_name.csv`:
+    a header with the PROFILE_HEADERS columns of the profile (the label, then
+    one column per period), and one line per row with the cells as the site
+    shows them. Returns the file path.
+    """
+    csv_path = os.path.join(dir_path, '%s.csv' % oil_name)
+    # a failed write leaves the previous file, never half of one
+    tmp_path = csv_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(PROFILE_HEADERS[profile_name])
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    return csv_path
@@ -0,0 +1,130 @@
+"""
+In-process cache of blend predictions. The web app is asked for the same few
+blends over and over, a cached prediction skips the mixing and the model.
+
+A recipe is cached under its canonical form: oils sorted, volumes normalized
+to fractions and rounded to `tolerance`, so {'A': 1, 'B': 1} and
+[('B', 50), ('A', 50)] share an entry. The prediction is made for that
+canonical form, so every recipe of an entry gets the same answer.
+
+The cache belongs to one model artifact (see main.prepare): a newly loaded
+artifact comes with an empty cache.
+"""
+
+import collections
+import math
+import numbers
+import threading
+import time
+
+import numpy as np
+
+from BlendPrediction import predict_blends
+from Metrics import timed
+
+
+
+class predictionCache():
+    """
+    Parameters:
+    ----------
+    max_size: int, number of predictions kept, the least recently used go first.
+    ttl: float, seconds a prediction is kept. None keeps them until evicted.
+    tolerance: float, fractions are rounded to a multiple of it in the keys.
+    """
+
+    def __init__(self, max_size=4096, ttl=3600.0, tolerance=1e-4) -> None:
+        assert max_size > 0 and tolerance > 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def key(self, blend) -> tuple:
+        """
+        The canonical form of a recipe: a sorted tuple of (oil, rounded fraction).
+        Oils listed twice are added up and oils with no volume are dropped.
+        """
+        items = blend.items() if isinstance(blend, dict) else blend
+        volumes = collections.defaultdict(float)
+        for oil, volume in items:
+            if (not isinstance(volume, numbers.Real) or isinstance(volume, bool)
+                    or not math.isfinite(volume) or volume < 0):
+                raise ValueError('invalid volume %r of %s, volumes must be finite non negative numbers'
+                                 % (volume, oil))
+            volumes[oil] += volume
+
+        total = sum(volumes.values())
+        if not 0 < total < math.inf:
+            raise ValueError('a blend needs a positive total volume')
+        digits = max(0, int(np.ceil(-np.log10(self.tolerance))))
+        return tuple(sorted((oil, round(round(volume / total / self.tolerance) * self.tolerance, digits))
+                            for oil, volume in volumes.items() if volume > 0))
+
+
+    def get(self, key):
+        """
+        The cached prediction of a key, or None. Counts a hit or a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+
+    def put(self, key, prediction) -> None:
+        prediction = np.array(prediction, dtype=float)
+        prediction.setflags(write=False)
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires, prediction)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+
+    def predict(self, recipes, engine, model, target_df=None) -> np.ndarray:
+        """
+        Same as CrudeBlendModel.predict_blends, the recipes missing from the
+        cache are predicted in one batch and added to it.
+        """
+        with timed('cache_lookup'):
+            keys = [self.key(recipe) for recipe in recipes]
+            found = [self.get(key) for key in keys]
+
+        missing = list(dict.fromkeys(key for key, prediction in zip(keys, found) if prediction is None))
+        if missing:
+            predictions = predict_blends([list(key) for key in missing], engine, model, target_df)
+            computed = dict(zip(missing, predictions))
+            for key, prediction in computed.items():
+                self.put(key, prediction)
+            found = [computed[key] if prediction is None else prediction for key, prediction in zip(keys, found)]
+
+        if not found:
+            return np.empty((0, 0))
+        return np.vstack(found)
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self.entries), 'max_size': self.max_size, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None}
@@ -0,0 +1,146 @@
+"""
+Pair sweeps (see BlendSweep) spread over a pool of worker processes.
+
+The feature matrix and the fitted model are written once to memory mapped
+files in a temporary directory. Every worker maps them when it starts, so
+the pages are shared between processes and neither the model nor the data
+is pickled per task: a task is only the position of a chunk in the sweep,
+and its result the predictions of that chunk. Results come back in sweep
+order and are written like those of a single process sweep.
+"""
+
+import collections
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from BlendEngine import blendEngine
+from BlendSweep import REPORT_PCT, blendSweep
+from BlendPrediction import available_cores
+
+
+# the sweep of a worker process, see _start_worker
+_worker_sweep = None
+# why the sweep of a worker process could not be built
+_worker_error = None
+
+
+
+def _start_worker(dir_path, oils, columns, engine_kwargs, sweep_kwargs) -> None:
+    global _worker_sweep, _worker_error
+    try:
+        features = np.load(os.path.join(dir_path, 'features.npy'), mmap_mode='r')
+        model = joblib.load(os.path.join(dir_path, 'model.joblib'), mmap_mode='r')
+        engine = blendEngine(pd.DataFrame(features, index=oils, columns=columns, copy=False), **engine_kwargs)
+        _worker_sweep = blendSweep(engine, model, **sweep_kwargs)
+    except Exception as e:
+        # the pool would replace a worker whose initializer raises forever,
+        # the worker stays up and fails its tasks instead
+        _worker_error = '%s: %s' % (type(e).__name__, e)
+
+
+def _run_chunk(start):
+    if _worker_sweep is None:
+        raise RuntimeError('the sweep worker could not start, %s' % _worker_error)
+    first, second, fractions, predictions = _worker_sweep.chunk(start)
+    # the chunk buffers are reused, send copies
+    return first.astype(np.int32), second.astype(np.int32), fractions.copy(), predictions.copy()
+
+
+
+class shardedSweep(blendSweep):
+    """
+    A blendSweep whose chunks are computed by `n_workers` processes, by
+    default one per available core. Same parameters as blendSweep; `engine`
+    must be a blendEngine and `model` picklable (a FastInference.compiledModel
+    keeps its arrays memory mapped in the workers).
+
+    The workers are started by `start`, on entering the context manager or
+    on the first chunk, and stopped by `close`. A worker failing to load the
+    model or the data makes the sweep raise a RuntimeError.
+    """
+
+    def __init__(self, engine, model, oils=None, step=0.01, chunk_size=50000, percentages=REPORT_PCT,
+                 n_workers=None) -> None:
+        super().__init__(engine, model, oils, step, chunk_size, percentages)
+        self.n_workers = n_workers or available_cores()
+        self.sweep_kwargs = {'oils': self.oils, 'step': step, 'chunk_size': chunk_size, 'percentages': self.percentages}
+        self.dir_path = None
+        self.pool = None
+
+
+    def allocate_buffers(self) -> None:
+        # the chunks are computed by the workers, each with its own buffers
+        pass
+
+
+    def start(self) -> None:
+        """
+        Write the features and the model to memory mapped files and start the workers.
+        """
+        if self.pool is not None:
+            return
+        engine = self.engine
+        self.dir_path = tempfile.mkdtemp(prefix='crude_sweep_')
+        np.save(os.path.join(self.dir_path, 'features.npy'), engine.features)
+        joblib.dump(self.model, os.path.join(self.dir_path, 'model.joblib'))
+
+        rules = {engine.columns[i]: rule for rule, indices in engine.rule_columns.items() for i in indices}
+        engine_kwargs = {'rules': rules, 'density_column': engine.density_column}
+        self.pool = multiprocessing.get_context().Pool(
+            self.n_workers, initializer=_start_worker,
+            initargs=(self.dir_path, engine.oils, list(engine.columns), engine_kwargs, self.sweep_kwargs))
+
+
+    def chunk(self, start):
+        """
+        The chunk starting at blend `start`, see blendSweep.chunk, computed by
+        one of the workers. The arrays are copies, they are not overwritten.
+        """
+        self.start()
+        return self.pool.apply(_run_chunk, (start,))
+
+
+    def chunks(self):
+        """
+        Yields every chunk of the sweep in order, computed by the workers.
+        At most `2 * n_workers` chunks are in flight, so memory stays bounded
+        when the results are written slower than they are computed.
+        """
+        self.start()
+        pending = collections.deque()
+        for start in range(0, len(self), self.chunk_size):
+            pending.append(self.pool.apply_async(_run_chunk, (start,)))
+            if len(pending) >= 2 * self.n_workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+    def close(self, terminate=False) -> None:
+        """
+        Stop the workers, right away with `terminate`, and remove the mapped files.
+        """
+        if self.pool is not None:
+            if terminate:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.dir_path is not None:
+            shutil.rmtree(self.dir_path, ignore_errors=True)
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close(terminate=exc_info[0] is not None)
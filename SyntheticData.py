@@ -0,0 +1,96 @@
+"""
+Writes made up crude oil profiles in the layout produced by the crawlers,
+so DataCleaner, the models and the benchmarks can be exercised offline and
+on datasets much larger than what crudemonitor.ca lists.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from DataCleaner import PERCENTAGES, BASIC_PROPERTIES, LIGHTENDS_COMPONENTS, BTEX_COMPONENTS
+from PageParser import PROFILE_HEADERS
+
+
+# extra rows found in the basic analysis table, dropped by DataCleaner
+EXTRA_BASIC_PROPERTIES = ['Sediment(ppmw)', 'TAN(mgKOH/g)']
+
+
+
+def oil_names(n_oils) -> list:
+    return ['Synthetic Crude %04d (S%04d)' % (i, i) for i in range(n_oils)]
+
+
+def make_oils(n_oils, seed=0) -> dict:
+    """
+    OUTPUT:
+    ------
+    a dict profile_name -> {oil_name: 2D array of values}. Every array has one
+    row per property of the profile and the value columns of PROFILE_HEADERS.
+    Heavier oils get higher sulphur, metals and boiling points.
+    """
+    rng = np.random.RandomState(seed)
+    heaviness = rng.rand(n_oils)
+    density = 800 + 150 * heaviness + rng.normal(0, 5, n_oils)
+    api = 141.5 / (density / 999.0) - 131.5
+    sulphur = 0.1 + 4 * heaviness
+    basic = np.stack([density, api, sulphur, 1 + 10 * heaviness,
+                      2 + 70 * heaviness, 3 + 180 * heaviness,
+                      30 + 20 * heaviness, 0.1 + 1.5 * heaviness], axis=1)
+
+    lightends = (3.5 - 3 * heaviness)[:, None] * np.array([0.1, 0.3, 1.0, 1.0, 1.4, 2.0, 2.0, 1.8, 1.2, 1.0])
+    btex = (3.5 - 3 * heaviness)[:, None] * np.array([0.2, 0.5, 0.1, 0.6])
+
+    start = 20 + 20 * heaviness
+    end = 580 + 160 * heaviness
+    steps = (np.arange(len(PERCENTAGES)) / (len(PERCENTAGES) - 1)) ** 1.3
+    distill_c = start[:, None] + (end - start)[:, None] * steps
+
+    def spread(values, n_columns):
+        # most recent, six month, one year and five year values around the same mean
+        noise = 1 + rng.normal(0, 0.02, values.shape + (n_columns,))
+        return values[..., None] * noise
+
+    profiles = {'distillation': {}, 'basic': {}, 'lightends': {}, 'btex': {}}
+    names = oil_names(n_oils)
+    for i, name in enumerate(names):
+        celsius = spread(distill_c[i], 2)
+        profiles['distillation'][name] = np.concatenate([celsius, celsius * 9 / 5 + 32], axis=1)
+        profiles['basic'][name] = spread(basic[i], 4)
+        profiles['lightends'][name] = spread(lightends[i], 4)
+        profiles['btex'][name] = spread(btex[i], 4)
+    return profiles
+
+
+def write_crawl_data(base_path, n_oils, seed=0, missing_rate=0.02) -> list:
+    """
+    Write the four *_data directories under `base_path` for `n_oils` made up oils.
+    A fraction `missing_rate` of the values is written as '---' like on the site.
+
+    OUTPUT:
+    ------
+    the list of oil names, as used for the file names.
+    """
+    rng = np.random.RandomState(seed + 1)
+    labels = {
+        'distillation': [str(p) for p in PERCENTAGES],
+        'basic': BASIC_PROPERTIES + EXTRA_BASIC_PROPERTIES,
+        'lightends': LIGHTENDS_COMPONENTS,
+        'btex': BTEX_COMPONENTS,
+    }
+
+    for profile_name, oils in make_oils(n_oils, seed).items():
+        dir_path = os.path.join(base_path, '{}_data'.format(profile_name))
+        os.makedirs(dir_path, exist_ok=True)
+        for oil_name, values in oils.items():
+            cells = np.round(values, 2).astype(str)
+            # never blank the five year value and its fallback at once
+            missing = rng.rand(*cells.shape) < missing_rate
+            primary = 1 if profile_name == 'distillation' else -1
+            missing[:, primary] &= ~missing[:, 0]
+            cells[missing] = '---'
+            df = pd.DataFrame(cells, columns=PROFILE_HEADERS[profile_name][1:])
+            df.insert(0, PROFILE_HEADERS[profile_name][0], labels[profile_name])
+            df.to_csv(os.path.join(dir_path, '%s.csv' % oil_name), index=False)
+    return oil_names(n_oils)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from AnalogIndex import analogIndex
+from ModelRegistry import load_dataset, save_dataset
+
+
+class TestAnalogIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        oils = ['Oil%d' % i for i in range(50)]
+        self.x_data = pd.DataFrame(rng.rand(50, 5) * [1, 10, 100, 1, 1], index=oils, columns=list('abcde'))
+        self.x_data.iloc[3, 2] = np.nan
+        self.Y_data = pd.DataFrame(np.sort(rng.rand(50, 4) * 600, axis=1), index=oils, columns=[5, 50, 95, 99])
+        self.queries = pd.DataFrame(rng.rand(8, 5) * [1, 10, 100, 1, 1], columns=list('abcde'))
+
+    def brute_force(self, index, X, k):
+        points = index.transform(X)
+        distances = np.sqrt(((points[:, None, :] - index.points[None, :, :]) ** 2).sum(axis=2))
+        return np.sort(distances, axis=1)[:, :k]
+
+    def test_nearest(self):
+        index = analogIndex(self.x_data, self.Y_data)
+        positions, distances = index.query(self.queries, k=4)
+        self.assertEqual(positions.shape, (8, 4))
+        np.testing.assert_allclose(distances, self.brute_force(index, self.queries, 4))
+
+        # an oil of the dataset is its own nearest analog
+        result = index.analogs(self.x_data.loc[['Oil7']], k=1)[0][0]
+        self.assertEqual(result['oil'], 'Oil7')
+        self.assertAlmostEqual(result['distance'], 0)
+        self.assertEqual(result['profile'], self.Y_data.loc['Oil7'].to_dict())
+        self.assertEqual(index.query(self.queries, k=100)[0].shape, (8, 50))
+
+    def test_incremental_update(self):
+        index = analogIndex(self.x_data.iloc[:40], self.Y_data.iloc[:40], rebuild_fraction=0.5)
+        self.assertEqual(index.update(self.x_data, self.Y_data), 10)
+        self.assertEqual(index.tree_size, 40)
+
+        # the oils outside the tree are found as well
+        for k in (1, 3):
+            positions, distances = index.query(self.queries, k)
+            np.testing.assert_allclose(distances, self.brute_force(index, self.queries, k))
+        positions, _ = index.query(self.x_data.iloc[40:], 1)
+        self.assertEqual([index.oils[j] for j in positions[:, 0]], list(self.x_data.index[40:]))
+
+        x_data = self.x_data.copy()
+        x_data.loc['Oil0', 'a'] += 5
+        self.assertEqual(index.update(x_data, self.Y_data), 1)
+        self.assertEqual(index.tree_size, 50)
+        self.assertEqual(index.update(x_data, self.Y_data), 0)
+
+    def test_saved_with_dataset(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, 'dataset.npz')
+            save_dataset(self.x_data.iloc[:45], self.Y_data.iloc[:45], path)
+            version = save_dataset(self.x_data, self.Y_data, path)
+            dataset = load_dataset(path)
+            self.assertEqual(dataset['analogs'].version, version)
+            self.assertEqual(len(dataset['analogs']), 50)
+            # updated, not rebuilt: the scaling is still the one of the first 45 oils
+            np.testing.assert_allclose(dataset['analogs'].mean, np.nanmean(self.x_data.iloc[:45], axis=0))
+
+            save_dataset(self.x_data.iloc[10:], self.Y_data.iloc[10:], path)
+            self.assertEqual(len(load_dataset(path)['analogs']), 40)
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from AssayStore import AssayStore
+from DataCleaner import CleanData
+from SyntheticData import write_crawl_data
+
+
+class TestAssayStore(unittest.TestCase):
+
+    def setUp(self):
+        warnings.simplefilter('ignore', FutureWarning)
+        self.base_path = tempfile.mkdtemp()
+        self.oils = write_crawl_data(self.base_path, 12)
+        self.store = AssayStore(os.path.join(self.base_path, 'assays'))
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def test_same_data_as_cleaner(self):
+        self.store.append_crawl(self.base_path, crawl_date='2023-01-01')
+        x_data, Y_data = CleanData(self.base_path).get_x_y_data()
+        x_store, Y_store = AssayStore(self.store.root).x_y_data()
+
+        pd.testing.assert_frame_equal(x_store.loc[x_data.index], x_data, check_names=False)
+        pd.testing.assert_frame_equal(Y_store.loc[Y_data.index], Y_data, check_names=False)
+
+    def test_append_only_and_dedup(self):
+        rows = self.store.append_crawl(self.base_path, crawl_date='2023-01-01')
+        self.assertGreater(rows, 0)
+        self.assertEqual(self.store.append_crawl(self.base_path, crawl_date='2023-01-01'), 0)
+        self.assertEqual(self.store.append_crawl(self.base_path, oils=self.oils[:2], crawl_date='2023-02-01'),
+                         rows * 2 // 12)
+        self.assertEqual(self.store.dates(), ['2023-01-01', '2023-02-01'])
+        self.assertEqual(sorted(os.listdir(self.store.root)), ['2023-01-01.0.npz', '2023-02-01.0.npz', 'index.json'])
+
+    def test_time_window(self):
+        self.store.append_crawl(self.base_path, crawl_date='2023-01-01')
+        first = AssayStore(self.store.root).x_y_data()[0]
+        # a later crawl of one oil with other values
+        write_crawl_data(self.base_path, 12, seed=1)
+        self.store.append_crawl(self.base_path, oils=self.oils[:1], crawl_date='2023-06-01')
+        second = CleanData(self.base_path).get_x_y_data()[0]
+
+        oil = self.oils[0].replace(' ', '')
+        latest = self.store.x_y_data()[0]
+        np.testing.assert_allclose(latest.loc[oil], second.loc[oil])
+        np.testing.assert_allclose(latest.loc[self.oils[1].replace(' ', '')], first.loc[self.oils[1].replace(' ', '')])
+
+        before = self.store.x_y_data(end='2023-03-01')[0]
+        np.testing.assert_allclose(before.loc[oil], first.loc[oil])
+        average = self.store.x_y_data(average=True)[0]
+        np.testing.assert_allclose(average.loc[oil], (first.loc[oil] + second.loc[oil]) / 2)
+
+        history = self.store.history(self.oils[0], 'basic', 'Density(kg/m³)')
+        self.assertEqual(list(history.index), ['2023-01-01', '2023-06-01'])
+
+    def test_window_after_partial_change(self):
+        # the second crawl changed one oil, and every crawled oil is appended as main.crawl does
+        self.store.append_crawl(self.base_path, oils=self.oils, crawl_date='2023-01-01')
+        first = CleanData(self.base_path).get_x_y_data()[0]
+        write_crawl_data(self.base_path, 1, seed=1)
+        self.store.append_crawl(self.base_path, oils=self.oils, crawl_date='2023-06-01')
+
+        window = self.store.x_y_data(start='2023-03-01')[0]
+        self.assertEqual(len(window), len(first))
+        unchanged = self.oils[5].replace(' ', '')
+        np.testing.assert_allclose(window.loc[unchanged], first.loc[unchanged])
+
+
+if __name__ == '__main__':
+    unittest.main()
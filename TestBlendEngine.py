@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from BlendEngine import blendEngine
+from CrudeBlendModel import mix_crude
+
+
+class TestBlendEngine(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.feature_df = pd.DataFrame(rng.rand(5, 3) * 100, index=['A', 'B', 'C', 'D', 'E'],
+                                       columns=['p1', 'p2', 'p3'])
+        self.engine = blendEngine(self.feature_df)
+
+    def test_two_oils_match_mix_crude(self):
+        expected = mix_crude('A', 3.0, 'C', 1.0, self.feature_df)
+        np.testing.assert_allclose(self.engine.mix({'A': 3.0, 'C': 1.0}), expected.values)
+        np.testing.assert_allclose(self.engine.mix([('A', 30), ('C', 10)]), expected.values)
+
+    def test_many_oils(self):
+        blend = {'A': 1, 'B': 2, 'D': 3, 'E': 4}
+        expected = (self.feature_df.loc[list(blend)].T * np.array(list(blend.values()))).sum(axis=1) / 10
+        np.testing.assert_allclose(self.engine.mix(blend), expected.values)
+
+    def test_batch_matches_single(self):
+        blends = [{'A': 1, 'B': 1}, [('C', 2), ('D', 1), ('C', 1)], {'E': 5}]
+        batch = self.engine.mix_batch(blends)
+        self.assertEqual(batch.shape, (3, 3))
+        for row, blend in zip(batch, blends):
+            np.testing.assert_allclose(row, self.engine.mix(blend))
+
+    def test_mixing_rules(self):
+        feature_df = pd.DataFrame({
+            'Density(kg/m³)': [800.0, 1000.0],
+            'Gravity(°API)': [45.38, 10.0],
+            'Sulphur(wt%)': [0.5, 4.0],
+            'C6Hexanes(vol%)': [3.0, 1.0],
+            'Viscosity(cSt)': [5.0, 500.0],
+        }, index=['Light', 'Heavy'])
+        engine = blendEngine(feature_df)
+        mixed = pd.Series(engine.mix({'Light': 1, 'Heavy': 1}), index=feature_df.columns)
+
+        self.assertAlmostEqual(mixed['Density(kg/m³)'], 900.0)
+        self.assertAlmostEqual(mixed['C6Hexanes(vol%)'], 2.0)
+        # 400 kg at 0.5 wt% and 500 kg at 4 wt%
+        self.assertAlmostEqual(mixed['Sulphur(wt%)'], (400 * 0.5 + 500 * 4.0) / 900)
+        sg = (141.5 / (45.38 + 131.5) + 141.5 / (10.0 + 131.5)) / 2
+        self.assertAlmostEqual(mixed['Gravity(°API)'], 141.5 / sg - 131.5)
+        self.assertTrue(5.0 < mixed['Viscosity(cSt)'] < 500.0)
+
+        # a single oil keeps its own properties, and batches give the same result
+        np.testing.assert_allclose(engine.mix({'Heavy': 2}), feature_df.loc['Heavy'].values)
+        np.testing.assert_allclose(engine.mix_batch([{'Light': 1, 'Heavy': 1}])[0], mixed.values)
+
+    def test_mix_crude_uses_mixing_rules(self):
+        feature_df = pd.DataFrame({
+            'Density(kg/m³)': [800.0, 1000.0],
+            'Gravity(°API)': [45.38, 10.0],
+            'Sulphur(wt%)': [0.5, 4.0],
+            'Viscosity(cSt)': [5.0, 500.0],
+        }, index=['Light', 'Heavy'])
+        mixed = mix_crude('Light', 1.0, 'Heavy', 1.0, feature_df)
+        np.testing.assert_allclose(mixed.values, blendEngine(feature_df).mix({'Light': 1, 'Heavy': 1}))
+        self.assertAlmostEqual(mixed['Sulphur(wt%)'], (400 * 0.5 + 500 * 4.0) / 900)
+        self.assertRaises(ValueError, mix_crude, 'Light', float('inf'), 'Heavy', 1.0, feature_df)
+
+    def test_invalid_blends(self):
+        self.assertRaises(KeyError, self.engine.mix, {'Z': 1})
+        self.assertRaises(ValueError, self.engine.mix, {'A': 0})
+        self.assertRaises(ValueError, self.engine.mix, {'A': -1, 'B': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from BlendEngine import blendEngine
+from BlendOptimizer import REPORT_PCT, blendOptimizer
+
+
+class TestBlendOptimizer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.oils = ['Oil%d' % i for i in range(6)]
+        heaviness = np.linspace(0, 1, 6)
+        x_data = pd.DataFrame({'heaviness': heaviness}, index=cls.oils)
+        steps = (np.array(REPORT_PCT) / 100) ** 1.3
+        Y_data = pd.DataFrame((20 + 20 * heaviness)[:, None] + (560 + 140 * heaviness)[:, None] * steps,
+                              index=cls.oils, columns=REPORT_PCT)
+        cls.model = LinearRegression().fit(x_data, Y_data)
+        cls.engine = blendEngine(x_data, rules={})
+        cls.Y_data = Y_data
+
+    def test_target(self):
+        optimizer = blendOptimizer(self.engine, self.model)
+        # 30/70 of Oil1 and Oil4 has the curve of Oil3
+        target = self.Y_data.loc['Oil3', [10, 50, 90]].to_dict()
+        result = optimizer.optimize(['Oil1', 'Oil4'], target=target, tolerance=0.5, time_budget=2, seed=0)
+        best = result['blends'][0]
+        self.assertTrue(best['feasible'])
+        self.assertAlmostEqual(best['recipe']['Oil1'], 1 / 3, delta=0.01)
+        self.assertLess(best['error'], 0.5)
+
+        # a second search reuses the predicted blends
+        result = optimizer.optimize(['Oil1', 'Oil4'], target=target, time_budget=0.2, seed=0)
+        self.assertGreater(result['cache_hits'], 0)
+
+    def test_bounds_and_prices(self):
+        optimizer = blendOptimizer(self.engine, self.model)
+        prices = {oil: 10 - i for i, oil in enumerate(self.oils)}
+        limit = self.Y_data.loc['Oil2', 50]
+        result = optimizer.optimize(self.oils, bounds={50: (None, limit)}, prices=prices,
+                                    max_fractions={'Oil0': 0.5}, time_budget=2, seed=0)
+        best = result['blends'][0]
+        self.assertTrue(best['feasible'])
+        self.assertLessEqual(best['profile'][50], limit)
+        self.assertLessEqual(best['recipe'].get('Oil0', 0), 0.51)
+        # the heavier oils are cheaper: the best blends sit on the bound, as heavy as Oil2
+        self.assertGreater(best['profile'][50], limit - 5)
+        self.assertAlmostEqual(best['cost'], prices['Oil2'], delta=0.1)
+
+    def test_unknown_percentage(self):
+        optimizer = blendOptimizer(self.engine, self.model)
+        with self.assertRaises(ValueError):
+            optimizer.optimize(self.oils, target={15: 100}, time_budget=0.1)
+
+
+    def test_shared_between_threads(self):
+        # a small cache keeps every thread evicting at once
+        optimizer = blendOptimizer(self.engine, self.model, cache_size=50)
+        target = self.Y_data.loc['Oil3', [10, 50, 90]].to_dict()
+        errors = []
+
+        def search(seed):
+            try:
+                optimizer.optimize(self.oils, target=target, time_budget=0.3, population=200, seed=seed)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=search, args=(seed,)) for seed in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(optimizer.cache), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from BlendEngine import blendEngine
+from BlendSweep import REPORT_PCT, blendSweep, fraction_steps
+from CrudeBlendModel import predict_blends
+from FastInference import compiledModel
+
+
+class TestBlendSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        cls.oils = ['Oil%d' % i for i in range(7)]
+        x_data = pd.DataFrame(rng.rand(7, 3) + 1, index=cls.oils,
+                              columns=['Density(kg/m³)', 'Sulphur(wt%)', 'Viscosity(cSt)'])
+        x_data['Density(kg/m³)'] *= 800
+        cls.engine = blendEngine(x_data)
+        cls.model = compiledModel(LinearRegression().fit(x_data, rng.rand(7, 12) * 600))
+        cls.tmp_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_chunks(self):
+        sweep = blendSweep(self.engine, self.model, step=0.1, chunk_size=50)
+        self.assertEqual(len(sweep), 21 * 9)
+
+        seen = []
+        for first, second, fractions, predictions in sweep.chunks():
+            self.assertLessEqual(len(fractions), 50)
+            recipes = [[(self.oils[a], f), (self.oils[b], 1 - f)] for a, b, f in zip(first, second, fractions)]
+            np.testing.assert_allclose(predictions, predict_blends(recipes, self.engine, self.model))
+            seen.extend(zip(first, second, np.round(fractions, 6)))
+        self.assertEqual(len(set(seen)), len(sweep))
+        self.assertIn((0, 6, 0.1), seen)
+
+    def test_fraction_steps(self):
+        np.testing.assert_allclose(fraction_steps(0.25), [0.25, 0.5, 0.75])
+        self.assertAlmostEqual(fraction_steps(0.01)[-1], 0.99)
+        for step in (0.6, 0.75, 0.3, 0.03, 0, 1, float('nan')):
+            self.assertRaises(ValueError, fraction_steps, step)
+        self.assertRaises(ValueError, blendSweep, self.engine, self.model, step=0.3)
+
+    def test_write(self):
+        sweep = blendSweep(self.engine, self.model, oils=self.oils[:4], step=0.25, chunk_size=4)
+        path = os.path.join(self.tmp_dir, 'sweep.csv')
+        self.assertEqual(sweep.write_csv(path, progress=None), 18)
+        table = pd.read_csv(path)
+        self.assertEqual(list(table.columns[3:]), [str(p) for p in REPORT_PCT])
+        self.assertEqual(table.iloc[0, :3].tolist(), ['Oil0', 'Oil1', 0.25])
+
+        progress = []
+        dir_path = os.path.join(self.tmp_dir, 'sweep')
+        sweep.write_columns(dir_path, progress=lambda done, total, seconds: progress.append((done, total)))
+        self.assertEqual(progress[-1], (18, 18))
+        profile = np.load(os.path.join(dir_path, 'profile.npy'), mmap_mode='r')
+        np.testing.assert_allclose(profile, table.iloc[:, 3:].to_numpy(), atol=1e-3, rtol=1e-6)
+        with open(os.path.join(dir_path, 'oils.json')) as f:
+            self.assertEqual(json.load(f)['oils'], self.oils[:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
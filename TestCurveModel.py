@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from CrudeBlendModel import make_pipeline
+from CurveModel import REPORT_PCT, curveModel, decode, encode, knot_temperatures
+
+
+class TestCurveModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        heaviness = rng.rand(50)
+        cls.x_data = pd.DataFrame(np.stack([heaviness, heaviness ** 2, rng.rand(50)], axis=1), columns=['a', 'b', 'c'])
+        steps = (np.array(REPORT_PCT) / 100) ** 1.3
+        cls.Y_data = pd.DataFrame((20 + 20 * heaviness)[:, None] + (560 + 140 * heaviness)[:, None] * steps,
+                                  columns=REPORT_PCT)
+
+    def test_encode_decode(self):
+        temperatures = knot_temperatures(self.Y_data)
+        self.assertEqual(temperatures.shape, (50, 7))
+        np.testing.assert_allclose(decode(encode(temperatures)), temperatures)
+
+        # flat or decreasing measurements still decode into an increasing curve
+        flat = decode(encode(np.array([[100.0, 150.0, 150.0, 140.0, 300.0, 400.0, 500.0]])))
+        self.assertTrue((np.diff(flat) > 0).all())
+
+    def test_missing_temperatures(self):
+        Y = self.Y_data.to_numpy().copy()
+        Y[0, -2:] = np.nan
+        Y[1, 3] = np.nan
+        temperatures = knot_temperatures(Y)
+        self.assertEqual(temperatures[0, -1], Y[0, -3])
+        self.assertFalse(np.isnan(temperatures).any())
+
+    def test_predict(self):
+        model = curveModel(make_pipeline().set_params(model__estimator=LinearRegression(), reduce_dim__n_components=3))
+        model.fit(self.x_data, self.Y_data)
+        predictions = model.predict(self.x_data)
+        self.assertEqual(predictions.shape, (50, 12))
+        self.assertTrue((np.diff(predictions, axis=1) > 0).all())
+        self.assertLess(np.abs(predictions - self.Y_data.to_numpy()).mean(), 5)
+
+        cuts = model.predict_curve(self.x_data.iloc[:4], [15, 50, 65])
+        self.assertEqual(cuts.shape, (4, 3))
+        np.testing.assert_allclose(cuts[:, 1], predictions[:4, 5])
+        self.assertTrue(((predictions[:4, 1] < cuts[:, 0]) & (cuts[:, 0] < predictions[:4, 2])).all())
+        with self.assertRaises(ValueError):
+            model.predict_curve(self.x_data, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+
+from DataCleaner import CleanData, fill_missing
+from SyntheticData import write_crawl_data
+
+
+class TestDataCleaner(unittest.TestCase):
+
+    def setUp(self):
+        warnings.simplefilter('ignore', FutureWarning)
+        self.base_path = tempfile.mkdtemp()
+        self.oils = write_crawl_data(self.base_path, 12)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def test_x_y_data(self):
+        x_data, Y_data = CleanData(self.base_path).get_x_y_data()
+        self.assertEqual(x_data.shape, (12, 20))
+        self.assertEqual(Y_data.shape, (12, 12))
+        self.assertEqual(list(Y_data.columns), [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99])
+        self.assertIn(self.oils[0].replace(' ', ''), Y_data.index)
+
+        x_data, Y_data = fill_missing(x_data, Y_data)
+        self.assertFalse(np.isnan(x_data.values).any())
+        self.assertFalse(np.isnan(Y_data.values).any())
+
+    def test_store_round_trip(self):
+        store_path = os.path.join(self.base_path, 'dataset.npz')
+        x_data, Y_data = CleanData(self.base_path).build_store(store_path)
+
+        # the store is read even once the .csv files are gone
+        for name in os.listdir(self.base_path):
+            if name.endswith('_data'):
+                shutil.rmtree(os.path.join(self.base_path, name))
+        x_store, Y_store = CleanData(self.base_path, store_path).get_x_y_data()
+
+        np.testing.assert_array_equal(x_store.values, x_data.values)
+        np.testing.assert_array_equal(Y_store.values, Y_data.values)
+        self.assertEqual(list(x_store.index), list(x_data.index))
+        self.assertEqual(list(x_store.columns), list(x_data.columns))
+        self.assertEqual(list(Y_store.columns), list(Y_data.columns))
+
+    def test_store_rebuilt_when_files_change(self):
+        store_path = os.path.join(self.base_path, 'dataset.npz')
+        CleanData(self.base_path).build_store(store_path)
+        data = CleanData(self.base_path, store_path)
+        with mock.patch('DataCleaner.assemble_x_y', side_effect=AssertionError('parsed')):
+            x_data, _ = data.get_x_y_data()
+
+        # one oil loses its BTEX profile
+        btex_dir = os.path.join(self.base_path, 'btex_data')
+        oil = os.path.splitext(sorted(os.listdir(btex_dir))[0])[0].replace(' ', '')
+        os.remove(os.path.join(btex_dir, sorted(os.listdir(btex_dir))[0]))
+        self.assertFalse(x_data.loc[oil, 'Benzene(vol%)':].isna().all())
+
+        x_rebuilt, _ = data.get_x_y_data()
+        self.assertTrue(x_rebuilt.loc[oil, 'Benzene(vol%)':].isna().all())
+        # the rebuilt store is current again
+        with mock.patch('DataCleaner.assemble_x_y', side_effect=AssertionError('parsed')):
+            x_store, _ = data.get_x_y_data()
+        np.testing.assert_array_equal(x_store.values, x_rebuilt.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
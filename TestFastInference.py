@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Lasso, LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.svm import SVR
+
+from CrudeBlendModel import make_pipeline
+from FastInference import compiledModel
+
+
+class TestFastInference(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        cls.x_data = pd.DataFrame(rng.rand(60, 15), columns=['f%d' % i for i in range(15)])
+        cls.Y_data = np.sort(rng.rand(60, 12) * 600, axis=1)
+        cls.queries = pd.DataFrame(rng.rand(9, 15), columns=cls.x_data.columns)
+
+    def check(self, estimator, kind, Y_data=None):
+        Y_data = self.Y_data if Y_data is None else Y_data
+        pipeline = make_pipeline().set_params(model__estimator=estimator, reduce_dim__n_components=5)
+        pipeline.fit(self.x_data, Y_data)
+        compiled = compiledModel(pipeline)
+        self.assertEqual(compiled.kind, kind)
+        for X in (self.queries, self.x_data, self.queries.iloc[:1]):
+            np.testing.assert_allclose(compiled.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(compiled.predict(self.queries.to_numpy()), pipeline.predict(self.queries), rtol=1e-9)
+        self.assertRaises(ValueError, compiled.predict, self.queries.to_numpy()[:, 1:])
+
+    def test_linear(self):
+        self.check(Lasso(alpha=5.0), 'linear')
+        self.check(LinearRegression(fit_intercept=False), 'linear')
+
+    def test_neighbors(self):
+        self.check(KNeighborsRegressor(n_neighbors=5), 'neighbors')
+        self.check(KNeighborsRegressor(n_neighbors=5, weights='distance'), 'neighbors')
+
+    def test_forest(self):
+        self.check(RandomForestRegressor(n_estimators=20, random_state=0), 'forest')
+        self.check(RandomForestRegressor(n_estimators=5, max_depth=3, random_state=0), 'forest', self.Y_data[:, 0])
+
+    def test_fallback(self):
+        self.check(SVR(), 'pipeline', self.Y_data[:, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
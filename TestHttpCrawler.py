@@ -0,0 +1,104 @@
+import email.message
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+from functools import partial
+from unittest import mock
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from HttpCrawler import fetchProfiles
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'crudemonitor')
+
+
+class quietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpCrawler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        handler = partial(quietHandler, directory=FIXTURE_DIR)
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        cls.URL = 'http://127.0.0.1:%d/index.html' % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def test_get_all_profiles(self):
+        crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0)
+        changed = crawler.get_all_profiles()
+
+        self.assertEqual(len(changed), 4)
+        self.assertEqual(crawler.crawled_oils, changed)
+        self.assertEqual(crawler.errors, {})
+        self.assertEqual(crawler.stats['pages'], 5)
+
+        distill = os.listdir(os.path.join(self.base_path, 'distillation_data'))
+        self.assertEqual(len(distill), 3) # SYN has no distillation table
+
+        df = pd.read_csv(os.path.join(self.base_path, 'lightends_data', 'Western Canadian Select (WCS).csv'))
+        self.assertEqual(list(df.columns), ['property', 'most_recent', 'six_month', 'one_year', 'five_year'])
+        self.assertEqual(df.property[1], 'iC4iso-Butane(vol%)')
+
+    def test_second_crawl_is_incremental(self):
+        fetchProfiles(self.URL, base_path=self.base_path, min_interval=0).get_all_profiles()
+        csv_path = os.path.join(self.base_path, 'basic_data', 'Mixed Sweet Blend (MSW).csv')
+        os.utime(csv_path, (0, 0))
+
+        crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0)
+        changed = crawler.get_all_profiles()
+
+        self.assertEqual(changed, [])
+        self.assertEqual(len(crawler.crawled_oils), 4)
+        self.assertEqual(os.path.getmtime(csv_path), 0)
+        self.assertEqual(crawler.manifest.last_changed(), [])
+
+    def test_retry_after_is_capped(self):
+        headers = email.message.Message()
+        headers['Retry-After'] = '86400'
+        error = urllib.error.HTTPError(self.URL, 503, 'Service Unavailable', headers, None)
+        crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0, max_retries=2, backoff=0.5)
+        with mock.patch('urllib.request.urlopen', side_effect=error), mock.patch('time.sleep') as sleep:
+            self.assertRaises(urllib.error.HTTPError, crawler.fetch, self.URL)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2.0, 2.0])
+
+    def test_failed_write_is_retried(self):
+        # a write failing after the tables were hashed must not mark them as crawled
+        with mock.patch('HttpCrawler.write_profile_csv', side_effect=OSError('disk full')):
+            crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0)
+            self.assertEqual(crawler.get_all_profiles(), [])
+        self.assertEqual(len(crawler.errors), 4)
+
+        crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0)
+        self.assertEqual(len(crawler.get_all_profiles()), 4)
+        self.assertEqual(len(os.listdir(os.path.join(self.base_path, 'basic_data'))), 4)
+
+    def test_missing_page_is_reported(self):
+        crawler = fetchProfiles(self.URL, base_path=self.base_path, min_interval=0, max_retries=0)
+        crawler.get_oil_links = lambda: [('Missing (MIS)', self.URL.replace('index.html', 'crudes/MIS.html'))]
+        changed = crawler.get_all_profiles()
+
+        self.assertEqual(changed, [])
+        self.assertIn('Missing (MIS)', crawler.errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
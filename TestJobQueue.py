@@ -0,0 +1,141 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from JobQueue import jobQueue, jobWorker, report_progress
+
+
+# job functions, run by the worker in a child process
+def add(a, b):
+    return a + b
+
+
+def spin(seconds):
+    # burns CPU and reports its progress until `seconds` passed
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sum(range(10000))
+        report_progress((time.perf_counter() - start) / seconds, 'spinning', min_interval=0)
+    return seconds
+
+
+def children(path):
+    # starts two worker processes that outlive it, writes their pids to `path`
+    # and waits to be cancelled
+    workers = [subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']) for _ in range(2)]
+    with open(path, 'w') as f:
+        f.write(' '.join(str(worker.pid) for worker in workers))
+    report_progress(0.5, min_interval=0)
+    time.sleep(30)
+
+
+def fail():
+    raise ValueError('no such oil')
+
+
+def running(pid):
+    # not a zombie waiting for its parent either
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+JOBS = {'add': 'TestJobQueue:add', 'spin': 'TestJobQueue:spin', 'fail': 'TestJobQueue:fail',
+        'children': 'TestJobQueue:children'}
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.queue = jobQueue(os.path.join(self.root, 'jobs.sqlite'), JOBS)
+        self.worker = jobWorker(self.queue, poll_interval=0.05, niceness=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_run_and_timings(self):
+        first = self.queue.submit('add', a=1, b=2)
+        second = self.queue.submit('spin', seconds=0.3)
+        self.assertEqual(self.queue.get(first)['status'], 'queued')
+        self.assertEqual(self.worker.run(stop_when_idle=True), 2)
+
+        job = self.queue.get(first)
+        self.assertEqual((job['status'], job['result'], job['progress']), ('done', 3, 1))
+        job = self.queue.get(second)
+        self.assertEqual((job['status'], job['message']), ('done', 'spinning'))
+        self.assertGreaterEqual(job['wall_seconds'], 0.3)
+        self.assertGreater(job['cpu_seconds'], 0.1)
+        self.assertEqual([job['id'] for job in self.queue.list()], [second, first])
+
+    def test_failure(self):
+        job_id = self.queue.submit('fail')
+        job = self.worker.run_one()
+        self.assertEqual((job['id'], job['status']), (job_id, 'failed'))
+        self.assertIn('no such oil', job['error'])
+        with self.assertRaises(AssertionError):
+            self.queue.submit('format_disk')
+
+    def test_cancel(self):
+        queued = self.queue.submit('add', a=1, b=1)
+        self.assertTrue(self.queue.cancel(queued))
+        self.assertEqual(self.queue.get(queued)['status'], 'cancelled')
+
+        running = self.queue.submit('spin', seconds=30)
+        thread = threading.Thread(target=self.worker.run_one)
+        thread.start()
+        while self.queue.get(running)['progress'] == 0:
+            time.sleep(0.01)
+        self.assertTrue(self.queue.cancel(running))
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        job = self.queue.get(running)
+        self.assertEqual(job['status'], 'cancelled')
+        self.assertLess(job['wall_seconds'], 10)
+        self.assertFalse(self.queue.cancel(running))
+
+    def test_cancel_stops_child_processes(self):
+        path = os.path.join(self.root, 'pids')
+        job_id = self.queue.submit('children', path=path)
+        thread = threading.Thread(target=self.worker.run_one)
+        thread.start()
+        while self.queue.get(job_id)['progress'] == 0:
+            time.sleep(0.01)
+        self.queue.cancel(job_id)
+        thread.join(10)
+        self.assertEqual(self.queue.get(job_id)['status'], 'cancelled')
+
+        with open(path) as f:
+            pids = [int(pid) for pid in f.read().split()]
+        self.assertEqual(len(pids), 2)
+        self.assertFalse(any(running(pid) for pid in pids))
+
+    def test_worker_process(self):
+        # a worker started on its own runs the jobs queued elsewhere, and records
+        # its running job as failed when stopped
+        job_id = self.queue.submit('spin', seconds=30)
+        worker = subprocess.Popen([sys.executable, 'JobQueue.py', '--db', self.queue.path, '--poll', '0.05'],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, PYTHONPATH='.'))
+        try:
+            deadline = time.monotonic() + 20
+            while self.queue.get(job_id)['progress'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            worker.send_signal(signal.SIGTERM)
+            worker.wait(10)
+        job = self.queue.get(job_id)
+        self.assertGreater(job['progress'], 0)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('stopped', job['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression, Ridge
+
+import main
+from JobQueue import jobQueue, jobWorker
+from ModelRegistry import ModelRegistry, dataset_version, liveModel
+
+
+class TestMain(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        oils = ['Oil%d' % i for i in range(6)]
+        cls.x_data = pd.DataFrame(rng.rand(6, 4), index=oils, columns=['a', 'b', 'c', 'd'])
+        cls.Y_data = pd.DataFrame(np.sort(rng.rand(6, 12) * 600, axis=1), index=oils, columns=main.report_pct)
+        cls.model = model = LinearRegression().fit(cls.x_data, cls.Y_data)
+
+        cls.artifact_dir = tempfile.mkdtemp()
+        cls.registry = ModelRegistry(os.path.join(cls.artifact_dir, 'models'))
+        cls.version = cls.registry.save(model, cls.x_data, cls.Y_data, 1.5)
+        main.load_state(cls.registry.root)
+        main.jobs = jobQueue(os.path.join(cls.artifact_dir, 'jobs.sqlite'))
+        main.job_paths['sweeps'] = os.path.join(cls.artifact_dir, 'sweeps')
+        cls.client = main.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.artifact_dir)
+
+    def test_startup_report(self):
+        report = self.client.get('/status').get_json()
+        self.assertEqual(report['artifact_version'], self.version)
+        self.assertLess(report['load_seconds'], 1)
+        self.assertIn('hits', report['cache'])
+
+    def test_swap_new_artifact(self):
+        live = liveModel(self.registry, check_interval=0)
+        self.assertEqual(live.current()['version'], self.version)
+
+        Y_data = self.Y_data + 1
+        version = self.registry.save(LinearRegression().fit(self.x_data, Y_data), self.x_data, Y_data, 2.5, promote=False)
+        self.assertEqual(live.current()['version'], self.version)
+
+        self.registry.promote(version)
+        live.current()
+        live.loader.join()
+        self.assertEqual(live.current()['version'], version)
+        self.assertEqual(live.current()['error'], 2.5)
+        self.assertEqual([meta['version'] for meta in self.registry.versions()], [version, self.version])
+        self.registry.promote(self.version)
+
+    def test_version_per_configuration(self):
+        registry = ModelRegistry(os.path.join(self.artifact_dir, 'configurations'))
+        grid = registry.save(self.model, self.x_data, self.Y_data, 1.5, strategy='grid', curve=False)
+        curve = registry.save(self.model, self.x_data, self.Y_data, 1.5, strategy='grid', curve=True)
+        ridge = registry.save(Ridge(alpha=2.0).fit(self.x_data, self.Y_data), self.x_data, self.Y_data, 1.5,
+                              strategy='grid', curve=False)
+        self.assertEqual(len({grid, curve, ridge}), 3)
+        self.assertEqual(registry.save(self.model, self.x_data, self.Y_data, 1.5, strategy='grid', curve=False), grid)
+
+        for version in (grid, curve, ridge):
+            artifact = registry.load(version)
+            self.assertEqual(artifact['version'], version)
+            self.assertEqual(artifact['meta']['data_version'], dataset_version(self.x_data, self.Y_data))
+
+    def test_output(self):
+        response = self.client.post('/output', data={
+            'oil_1_select': 'Oil0', 'oil_1_vol': '3', 'oil_2_select': 'Oil1', 'oil_2_vol': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'1.5', response.data)
+
+    def test_output_invalid_volume(self):
+        for volume in ('abc', 'inf', '-1'):
+            response = self.client.post('/output', data={'oil_1_select': 'Oil0', 'oil_1_vol': volume})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(b'Invalid blend', response.data)
+
+    def test_output_quiet(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            response = self.client.post('/output', data={'oil_1_select': 'Oil0', 'oil_1_vol': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_blend_json(self):
+        response = self.client.post('/api/blend', json={'recipe': {'Oil0': 3, 'Oil1': 1}})
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result['version'], self.version)
+        mixed = self.x_data.loc[['Oil0', 'Oil1']].T @ np.array([0.75, 0.25])
+        np.testing.assert_allclose(list(result['profile'].values()), self.model.predict(mixed.to_frame().T)[0])
+
+        self.assertEqual(self.client.post('/api/blend', json={'recipe': {'Nope': 1}}).status_code, 400)
+        self.assertEqual(self.client.post('/api/blend', json={'recipe': [1]}).status_code, 400)
+
+    def test_output_many_oils(self):
+        response = self.client.post('/output', data={
+            'oil_1_select': 'Oil0', 'oil_1_vol': '1', 'oil_2_select': 'Oil1', 'oil_2_vol': '1',
+            'oil_3_select': 'Oil2', 'oil_3_vol': '2', 'oil_4_select': '', 'oil_4_vol': ''})
+        self.assertEqual(response.status_code, 200)
+
+        mixed = self.x_data.loc[['Oil0', 'Oil1', 'Oil2']].T @ np.array([0.25, 0.25, 0.5])
+        expected = self.model.predict(mixed.to_frame().T)[0]
+        self.assertIn(str(expected[0]).encode(), response.data)
+
+    def test_batch_blends(self):
+        recipes = [{'Oil0': 3, 'Oil1': 1}, {'Oil2': 1, 'Oil3': 1, 'Oil4': 2}, {'Oil5': 10}]
+        response = self.client.post('/api/blends', json={'recipes': recipes})
+        self.assertEqual(response.status_code, 200)
+
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1]['recipe'], recipes[1])
+        self.assertEqual(len(lines[0]['profile']), 12)
+        # a single oil gives back its measured profile
+        np.testing.assert_allclose(list(lines[2]['profile'].values()), self.Y_data.loc['Oil5'].values)
+
+        mixed = self.x_data.loc[['Oil0', 'Oil1']].T @ np.array([0.75, 0.25])
+        expected = self.model.predict(mixed.to_frame().T)[0]
+        np.testing.assert_allclose(list(lines[0]['profile'].values()), expected)
+
+    def test_batch_blends_percentages(self):
+        # only a curve model reads arbitrary cut points
+        response = self.client.post('/api/blends', json={'recipes': [{'Oil0': 1}], 'percentages': [15]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_optimize(self):
+        target = self.Y_data.loc['Oil1', [50, 90]].to_dict()
+        response = self.client.post('/api/optimize', json={
+            'oils': ['Oil0', 'Oil1', 'Oil2'], 'target': {str(p): t for p, t in target.items()}, 'time_budget': 0.5})
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertLessEqual(len(result['blends']), 5)
+        self.assertEqual(set(result['blends'][0]['profile']), {'50', '90'})
+
+        response = self.client.post('/api/optimize', json={'oils': ['Nope'], 'target': {'50': 300}})
+        self.assertEqual(response.status_code, 400)
+        for constraints in ({'bounds': {'50': [300]}}, {'bounds': {'50': 300}}, {'target': [1, 2]},
+                            {'target': {'50': 'hot'}}, {'bounds': {'50': [True, None]}},
+                            {'target': {'50': 300}, 'prices': [1, 2]},
+                            {'target': {'50': 300}, 'max_fractions': [0.5, 0.5]},
+                            {'target': {'50': 300}, 'time_budget': 'nan'},
+                            {'target': {'50': 300}, 'tolerance': 'inf'}):
+            response = self.client.post('/api/optimize', json=dict(constraints, oils=['Oil0', 'Oil1']))
+            self.assertEqual(response.status_code, 400, constraints)
+            self.assertIn('must', response.get_json()['error'])
+
+    def test_analogs(self):
+        response = self.client.post('/api/analogs', json={'recipes': [{'Oil3': 1}, {'Oil0': 1, 'Oil1': 1}], 'k': 2})
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()['analogs']
+        self.assertEqual([len(analogs) for analogs in result], [2, 2])
+        self.assertEqual(result[0][0]['oil'], 'Oil3')
+        self.assertEqual(list(result[0][0]['profile'].values()), self.Y_data.loc['Oil3'].tolist())
+
+        assay = self.x_data.loc['Oil5'].to_dict()
+        del assay['d']
+        response = self.client.post('/api/analogs', json={'assays': [assay], 'k': 1})
+        self.assertEqual(response.get_json()['analogs'][0][0]['oil'], 'Oil5')
+
+        for payload in ({'recipes': [{'Nope': 1}]}, {'assays': [{'z': 1}]}, {'recipes': [{'Oil0': 1}], 'k': 0},
+                        {'recipes': [{'Oil0': 1}], 'k': True}):
+            self.assertEqual(self.client.post('/api/analogs', json=payload).status_code, 400)
+
+        for payload in ({'recipes': []}, {'assays': []}):
+            response = self.client.post('/api/analogs', json=payload)
+            self.assertEqual((response.status_code, response.get_json()['analogs']), (200, []))
+
+    def test_jobs(self):
+        response = self.client.post('/api/jobs', json={'kind': 'sweep', 'params': {'step': 0.25}})
+        self.assertEqual(response.status_code, 202)
+        job = response.get_json()
+        self.assertEqual((job['status'], job['params']['registry_dir']), ('queued', self.registry.root))
+        out = job['params']['out']
+        self.assertEqual(os.path.dirname(out), main.job_paths['sweeps'])
+        self.assertEqual(self.client.get('/api/jobs/%d/result' % job['id']).status_code, 409)
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            jobWorker(main.jobs, poll_interval=0.05, niceness=0).run_one()
+        job = self.client.get('/api/jobs/%d' % job['id']).get_json()
+        self.assertEqual((job['status'], job['progress']), ('done', 1))
+        self.assertIsNotNone(job['cpu_seconds'])
+        # 15 pairs of 6 oils at 3 fractions each
+        self.assertEqual(self.client.get('/api/jobs/%d/result' % job['id']).get_json()['result'], 45)
+        self.assertTrue(os.path.exists(out))
+
+        queued = self.client.post('/api/jobs', json={'kind': 'crawl'}).get_json()
+        self.assertTrue(self.client.post('/api/jobs/%d/cancel' % queued['id']).get_json()['cancelled'])
+        self.assertEqual([job['status'] for job in self.client.get('/api/jobs').get_json()['jobs']][:2],
+                         ['cancelled', 'done'])
+        self.assertEqual(self.client.post('/api/jobs', json={'kind': 'shell'}).status_code, 400)
+        for params in ({'out': '/tmp/x.csv'}, {'registry_dir': '/tmp'}, {'step': '0.1'}, {'step': 2}, {'step': 0.75}, {'step': 0.3},
+                       {'n_workers': True}, {'format': 'exe'}):
+            response = self.client.post('/api/jobs', json={'kind': 'sweep', 'params': params})
+            self.assertEqual(response.status_code, 400, params)
+        response = self.client.post('/api/jobs', json={'kind': 'clean', 'params': {'dataset_path': '/etc/x'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/jobs/999').status_code, 404)
+
+    def test_metrics(self):
+        with self.assertLogs('crude.requests', 'INFO') as logs:
+            response = self.client.post('/api/blend', json={'recipe': {'Oil2': 1, 'Oil4': 3}})
+        self.assertEqual(response.status_code, 200)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['endpoint'], line['status']), ('/api/blend', 200))
+        self.assertTrue({'parse_json', 'cache_lookup', 'mix', 'predict'} <= set(line['stages_ms']))
+
+        metrics = self.client.get('/metrics').data.decode()
+        self.assertIn('crude_request_seconds_count{endpoint="/api/blend",method="POST",status="200"}', metrics)
+        self.assertIn('crude_stage_seconds_bucket{stage="predict",le="+Inf"}', metrics)
+
+    def test_import_is_slim(self):
+        # serving must not pay for training, plotting or crawling libraries
+        code = "import sys, main; print(sorted(m for m in ('sklearn', 'matplotlib', 'seaborn', 'selenium') if m in sys.modules))"
+        process = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(main.__file__)),
+                                 capture_output=True, text=True, check=True)
+        self.assertEqual(process.stdout.strip(), '[]')
+
+    def test_invalid_volumes(self):
+        # 1e400 is parsed as an infinite float
+        for volume in ('1e400', 'true', '-1', '1e308, "Oil1": 1e308', '"1"', 'null', '[1]'):
+            body = '{"recipe": {"Oil0": %s}}' % volume
+            response = self.client.post('/api/blend', data=body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, volume)
+        response = self.client.post('/api/analogs', data='{"recipes": [{"Oil0": 1e400}]}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_blends_unknown_oil(self):
+        response = self.client.post('/api/blends', json={'recipes': [{'Nope': 1}]})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
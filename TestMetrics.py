@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        Metrics.set_enabled(True)
+
+    def test_histogram_render(self):
+        metric = Metrics.histogram('test_seconds', 'A test.', ['stage'], buckets=(0.1, 1.0))
+        metric.observe(0.05, 'a')
+        metric.observe(0.5, 'a')
+        metric.observe(5.0, 'a')
+        lines = metric.render()
+        self.assertEqual(lines[:2], ['# HELP test_seconds A test.', '# TYPE test_seconds histogram'])
+        self.assertEqual(lines[2:], ['test_seconds_bucket{stage="a",le="0.1"} 1',
+                                     'test_seconds_bucket{stage="a",le="1.0"} 2',
+                                     'test_seconds_bucket{stage="a",le="+Inf"} 3',
+                                     'test_seconds_sum{stage="a"} 5.55',
+                                     'test_seconds_count{stage="a"} 3'])
+
+    def test_timed(self):
+        with Metrics.timed('test_stage'):
+            pass
+        self.assertIn('crude_stage_seconds_count{stage="test_stage"} 1', Metrics.render())
+
+        @Metrics.timed_function('test_function')
+        def double(x):
+            return 2 * x
+        self.assertEqual(double(2), 4)
+        self.assertIn('crude_stage_seconds_count{stage="test_function"} 1', Metrics.render())
+
+    def test_disabled(self):
+        Metrics.set_enabled(False)
+        self.assertIs(Metrics.timed('off'), Metrics._NOOP)
+        with Metrics.timed('off'):
+            pass
+        self.assertNotIn('stage="off"', Metrics.render())
+
+        app = Flask(__name__)
+        Metrics.instrument(app)
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
+
+    def test_write(self):
+        dir_path = tempfile.mkdtemp()
+        try:
+            path = os.path.join(dir_path, 'crude.prom')
+            Metrics.write(path)
+            with open(path) as f:
+                self.assertIn('# TYPE crude_stage_seconds histogram', f.read())
+            self.assertEqual(os.listdir(dir_path), ['crude.prom'])
+        finally:
+            shutil.rmtree(dir_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
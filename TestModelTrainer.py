@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from sklearn.linear_model import Lasso, LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+
+from DataCleaner import CleanData, fill_missing
+from ModelTrainer import fit_search
+from SyntheticData import write_crawl_data
+
+
+param_grid = [
+    {'model__estimator': [Lasso()], 'reduce_dim__n_components': [2, 5],
+     'model__estimator__alpha': [1.0, 10.0]},
+    {'model__estimator': [KNeighborsRegressor()], 'reduce_dim__n_components': [2, 5],
+     'model__estimator__n_neighbors': [2, 5]},
+    {'model__estimator': [LinearRegression()], 'reduce_dim__n_components': [2, 5]},
+]
+
+
+class TestModelTrainer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        warnings.simplefilter('ignore', FutureWarning)
+        base_path = tempfile.mkdtemp()
+        try:
+            write_crawl_data(base_path, 60)
+            cls.x_data, cls.Y_data = fill_missing(*CleanData(base_path).get_x_y_data())
+        finally:
+            shutil.rmtree(base_path)
+
+    def test_strategies(self):
+        for strategy, candidates in [('grid', 10), ('random', 4), ('halving', None)]:
+            with self.subTest(strategy=strategy):
+                search, report = fit_search(self.x_data, self.Y_data, strategy, param_grid=param_grid,
+                                            cv=3, n_jobs=1, n_iter=4, random_state=0)
+                self.assertLessEqual(set(report.index), {'Lasso', 'KNeighborsRegressor', 'LinearRegression'})
+                if candidates:
+                    self.assertEqual(report['candidates'].sum(), candidates)
+                self.assertEqual(search.predict(self.x_data).shape, self.Y_data.shape)
+
+    def test_persistent_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            fit_search(self.x_data, self.Y_data, 'grid', cache_dir=cache_dir, param_grid=param_grid, cv=3, n_jobs=1)
+            first = set(self._cached(cache_dir))
+            self.assertTrue(first)
+            fit_search(self.x_data, self.Y_data, 'grid', cache_dir=cache_dir, param_grid=param_grid, cv=3, n_jobs=1)
+            self.assertEqual(set(self._cached(cache_dir)), first)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def _cached(self, cache_dir):
+        for root, dirs, files in os.walk(cache_dir):
+            for name in dirs:
+                yield os.path.relpath(os.path.join(root, name), cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
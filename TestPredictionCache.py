@@ -0,0 +1,57 @@
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from BlendEngine import blendEngine
+from CrudeBlendModel import predict_blends
+from PredictionCache import predictionCache
+
+
+class TestPredictionCache(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        oils = ['Oil%d' % i for i in range(4)]
+        x_data = pd.DataFrame(rng.rand(4, 3), index=oils, columns=['a', 'b', 'c'])
+        self.engine = blendEngine(x_data, rules={})
+        self.model = LinearRegression().fit(x_data, rng.rand(4, 5))
+
+    def test_key(self):
+        cache = predictionCache(tolerance=1e-3)
+        key = cache.key({'Oil1': 1, 'Oil0': 1})
+        self.assertEqual(key, (('Oil0', 0.5), ('Oil1', 0.5)))
+        self.assertEqual(cache.key([('Oil1', 50), ('Oil0', 50), ('Oil2', 0)]), key)
+        self.assertEqual(cache.key([('Oil0', 30), ('Oil1', 40), ('Oil0', 30)]), (('Oil0', 0.6), ('Oil1', 0.4)))
+        self.assertEqual(cache.key({'Oil0': 0.70001, 'Oil1': 0.29999}), (('Oil0', 0.7), ('Oil1', 0.3)))
+        with self.assertRaises(ValueError):
+            cache.key({'Oil0': 0})
+
+    def test_predict(self):
+        cache = predictionCache()
+        recipes = [{'Oil0': 1, 'Oil1': 1}, {'Oil2': 7, 'Oil3': 3}, {'Oil1': 50, 'Oil0': 50}]
+        predictions = cache.predict(recipes, self.engine, self.model)
+        np.testing.assert_allclose(predictions, predict_blends(recipes, self.engine, self.model))
+        self.assertEqual(cache.stats()['misses'], 3)
+        self.assertEqual(cache.stats()['size'], 2)
+
+        np.testing.assert_allclose(cache.predict(recipes[:1], self.engine, self.model), predictions[:1])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_size_and_ttl(self):
+        cache = predictionCache(max_size=2, ttl=0.05)
+        for oil in ['Oil0', 'Oil1', 'Oil2']:
+            cache.predict([{oil: 1}], self.engine, self.model)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertIsNone(cache.get(cache.key({'Oil0': 1})))
+        self.assertIsNotNone(cache.get(cache.key({'Oil2': 1})))
+
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(cache.key({'Oil2': 1})))
+        self.assertEqual(cache.stats()['size'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
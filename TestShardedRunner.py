@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from BlendEngine import blendEngine
+from BlendSweep import blendSweep
+from CrudeBlendModel import make_pipeline
+from FastInference import compiledModel
+from ShardedRunner import shardedSweep
+
+
+class unloadableModel():
+    # pickles fine in the parent, fails to load in the workers
+    def __init__(self):
+        self.weights = [1.0]
+
+    def __setstate__(self, state):
+        raise RuntimeError('cannot load this model')
+
+
+class TestShardedRunner(unittest.TestCase):
+
+    def test_same_as_single_process(self):
+        rng = np.random.RandomState(0)
+        x_data = pd.DataFrame(rng.rand(8, 4) + 1, index=['Oil%d' % i for i in range(8)],
+                              columns=['Density(kg/m³)', 'Sulphur(wt%)', 'Viscosity(cSt)', 'Gravity(°API)'])
+        pipeline = make_pipeline().set_params(model__estimator=RandomForestRegressor(10, random_state=0),
+                                              reduce_dim__n_components=3)
+        model = compiledModel(pipeline.fit(x_data, rng.rand(8, 12) * 600))
+        engine = blendEngine(x_data)
+
+        expected = list(blendSweep(engine, model, step=0.1, chunk_size=30).chunks())
+        expected = np.vstack([chunk[3] for chunk in expected])
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with shardedSweep(engine, model, step=0.1, chunk_size=30, n_workers=2) as sweep:
+                chunks = list(sweep.chunks())
+                self.assertEqual(sum(len(chunk[2]) for chunk in chunks), len(sweep))
+                np.testing.assert_allclose(np.vstack([chunk[3] for chunk in chunks]), expected)
+                np.testing.assert_allclose(sweep.chunk(30)[3], expected[30:60])
+
+                path = os.path.join(tmp_dir, 'sweep.csv')
+                self.assertEqual(sweep.write_csv(path, progress=None), len(sweep))
+                self.assertEqual(len(pd.read_csv(path)), len(sweep))
+            self.assertFalse(os.path.exists(sweep.dir_path))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_workers_started_on_use(self):
+        x_data = pd.DataFrame(np.random.RandomState(0).rand(4, 2), index=['A', 'B', 'C', 'D'], columns=['p1', 'p2'])
+        sweep = shardedSweep(blendEngine(x_data), unloadableModel(), step=0.1, chunk_size=10, n_workers=2)
+        # no chunk buffers nor workers in the parent until the sweep runs
+        self.assertFalse(hasattr(sweep, 'mixed'))
+        self.assertIsNone(sweep.pool)
+
+        try:
+            with self.assertRaisesRegex(RuntimeError, 'cannot load this model'):
+                list(sweep.chunks())
+        finally:
+            sweep.close(terminate=True)
+        self.assertIsNone(sweep.pool)
+        self.assertFalse(os.path.exists(sweep.dir_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,31 +1,129 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
 import unittest
+
+import pandas as pd
+
+from CrawlReplay import record, replayBrowser, replayServer
+from HttpCrawler import fetchProfiles
+from PageParser import parse_values
 from WebCrawler import getProfiles
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'crudemonitor')
 
 
 class TestWebCrawler(unittest.TestCase):
-    options = webdriver.ChromeOptions()
-    options.add_argument("headless")
-    browser = webdriver.Chrome(options=options)
-    URL = "https://www.crudemonitor.ca/"
-
-    def setUpClasss():
-        TestWebCrawler.URL = URL
-        TestWebCrawler.browser = browser
-
-    def  test_title_text(self):
-        print('---- Testing Page Title ----')
-        TestWebCrawler.browser.execute_script("window.open('%s', '_self');" % TestWebCrawler.URL)
-        pageTitle = TestWebCrawler.browser.execute_script("return document.getElementsByTagName('h1');")[0].text
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = replayServer(FIXTURE_DIR)
+        cls.URL = cls.server.URL
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def crawl(self, base_path=None, URL=None):
+        crawler = getProfiles(replayBrowser(), URL or self.URL, base_path=base_path or self.base_path, delay=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            changed = crawler.get_all_profiles()
+        return crawler, changed
+
+    def test_title_text(self):
+        browser = replayBrowser()
+        browser.execute_script("window.open('%s', '_self');" % self.URL)
+        pageTitle = browser.execute_script("return document.getElementsByTagName('h1');")[0].text
         self.assertEqual('CrudeMonitor', pageTitle)
 
-    def test_content_exists(self):
-        print('---- Testing Content ----')
-        TestWebCrawler.browser.execute_script("window.open('%s', '_self');" % TestWebCrawler.URL)
-        content = TestWebCrawler.browser.find_elements(By.XPATH, "//div[@class='card home-card']")
-        self.assertIsNotNone(content)
+    def test_get_all_profiles(self):
+        crawler, changed = self.crawl()
+
+        self.assertEqual(len(changed), 4)
+        self.assertEqual(crawler.browser.pages, 9) # the home page before and after every oil page
+        distill = os.listdir(os.path.join(self.base_path, 'distillation_data'))
+        self.assertEqual(len(distill), 3) # SYN has no distillation table
+        self.assertTrue(all(name.endswith('.csv') for name in distill))
+
+        df = pd.read_csv(os.path.join(self.base_path, 'lightends_data', 'Western Canadian Select (WCS).csv'))
+        self.assertEqual(list(df.columns), ['property', 'most_recent', 'six_month', 'one_year', 'five_year'])
+        self.assertEqual(df.property[1], 'iC4iso-Butane(vol%)')
+
+    def test_same_files_as_http_crawler(self):
+        self.crawl()
+        http_path = os.path.join(self.base_path, 'http')
+        with contextlib.redirect_stdout(io.StringIO()):
+            fetchProfiles(self.URL, base_path=http_path, min_interval=0).get_all_profiles()
+
+        for profile_name in ['distillation', 'basic', 'lightends', 'btex']:
+            dir_path = os.path.join(self.base_path, '%s_data' % profile_name)
+            for file in os.listdir(dir_path):
+                expected = pd.read_csv(os.path.join(http_path, '%s_data' % profile_name, file))
+                pd.testing.assert_frame_equal(pd.read_csv(os.path.join(dir_path, file)), expected)
+
+    def test_second_crawl_is_incremental(self):
+        self.crawl()
+        _, changed = self.crawl()
+        self.assertEqual(changed, [])
+
+    def test_record_and_replay(self):
+        record_path = os.path.join(self.base_path, 'recorded')
+        saved = record(record_path, self.URL, min_interval=0)
+        self.assertEqual([oil_name for oil_name, _ in saved][:2], ['Access Western Blend (AWB)', 'Western Canadian Select (WCS)'])
+
+        with replayServer(record_path) as server:
+            _, changed = self.crawl(os.path.join(self.base_path, 'replayed'), server.URL)
+        self.assertEqual(len(changed), 4)
+
+    def test_no_intermediate_files(self):
+        self.crawl()
+        for profile_name in ['distillation', 'basic', 'lightends', 'btex']:
+            files = os.listdir(os.path.join(self.base_path, '%s_data' % profile_name))
+            self.assertTrue(files)
+            self.assertEqual([file for file in files if not file.endswith('.csv')], [])
+
+    def test_parse_error_per_oil(self):
+        pages_path = os.path.join(self.base_path, 'pages')
+        shutil.copytree(FIXTURE_DIR, pages_path)
+        page_path = os.path.join(pages_path, 'crudes', 'MSW.html')
+        with open(page_path) as f:
+            page = f.read()
+        with open(page_path, 'w') as f:
+            f.write(page.replace('<td>', '<td>n/a ', 3))
+
+        with replayServer(pages_path) as server:
+            crawler, changed = self.crawl(os.path.join(self.base_path, 'out'), server.URL)
+            # the HTTP crawler drops the same oil
+            fetcher = fetchProfiles(server.URL, base_path=os.path.join(self.base_path, 'http'), min_interval=0)
+            self.assertEqual(set(fetcher.get_all_profiles()), set(changed))
+        self.assertEqual(list(crawler.errors), ['Mixed Sweet Blend (MSW)'])
+        self.assertEqual(len(crawler.crawled_oils), 3)
+        self.assertNotIn('Mixed Sweet Blend (MSW)', changed)
+        self.assertEqual(list(fetcher.errors), ['Mixed Sweet Blend (MSW)'])
+        self.assertEqual(sorted(fetcher.crawled_oils), sorted(crawler.crawled_oils))
+        for out in ('out', 'http'):
+            basic = os.listdir(os.path.join(self.base_path, out, 'basic_data'))
+            self.assertNotIn('Mixed Sweet Blend (MSW).csv', basic)
+
+    def test_parse_values(self):
+        records = parse_values([['Density(kg/m³)', '916.3', '---', '921.2', 'ND']], 'basic')
+        self.assertEqual(records, [('Density(kg/m³)', 916.3, None, 921.2, None)])
+        with self.assertRaises(ValueError):
+            parse_values([['Density(kg/m³)', '916.3', 'n/a', '921.2', '929.8']], 'basic')
+
+    def test_unknown_script(self):
+        with self.assertRaises(ValueError):
+            replayBrowser().execute_script('return document.title;')
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,26 @@
+import contextlib
+import io
+import unittest
+
+from flask import Flask
+
+from WebServer import serve_prefork
+
+
+class TestWebServer(unittest.TestCase):
+
+    def test_prefork_gives_up_on_failing_workers(self):
+        def on_start():
+            raise FileNotFoundError('no model artifact')
+
+        with contextlib.redirect_stderr(io.StringIO()) as log:
+            with self.assertRaises(RuntimeError):
+                serve_prefork(Flask(__name__), port=0, workers=2, on_start=on_start,
+                              max_quick_exits=4, backoff=0.01)
+        # 0.01 + 0.02 + 0.04 seconds between the respawns
+        self.assertEqual(log.getvalue().count('starting a new one'), 3)
+        self.assertIn('in 0.04s', log.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
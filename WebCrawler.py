@@ -7,17 +7,12 @@ Created on Sat Jan 21 21:27:19 2023
 """
 
 
-import io
-import pandas as pd
 import os
-
-import urllib.request
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-
 import time
-import re
+
+from CrawlManifest import CrawlManifest
+from Metrics import timed_function
+from PageParser import PROFILE_TABLES, extract_valid_tables, write_profile_csv
 
 
 # specify URL 
@@ -25,23 +20,16 @@ URL = "https://www.crudemonitor.ca/"
 
 
 
-# Launch Chrome browser in headless mode
-options = webdriver.ChromeOptions()
-options.add_argument("headless")
-browser = webdriver.Chrome(options=options)
-
-
-if not os.path.exists("./distillation_data"):
-    os.makedirs("./distillation_data")
-
-if not os.path.exists("./basic_data"):
-    os.makedirs("./basic_data")
-    
-if not os.path.exists("./lightends_data"):
-    os.makedirs("./lightends_data")
+def make_browser():
+    """
+    Launch Chrome in headless mode. Only called when getProfiles is not given
+    a browser, e.g. a CrawlReplay.replayBrowser.
+    """
+    from selenium import webdriver
 
-if not os.path.exists("./btex_data"):
-    os.makedirs("./btex_data")
+    options = webdriver.ChromeOptions()
+    options.add_argument("headless")
+    return webdriver.Chrome(options=options)
 
 
 
@@ -51,10 +39,17 @@ class getProfiles():
     listed on https://www.crudemonitor.ca/
     """
     
-    def __init__(self):
-        self.browser = browser
-        self.options = options
+    def __init__(self, browser=None, URL=URL, base_path='.', delay=3):
+        self.browser = browser if browser is not None else make_browser()
         self.URL = URL
+        self.base_path = base_path
+        # seconds to wait after going back to the home page
+        self.delay = delay
+        for profile_name in PROFILE_TABLES:
+            dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+
         # load the webpage 
         self.browser.execute_script("window.open('%s', '_self');" % self.URL)
 
@@ -65,8 +60,29 @@ class getProfiles():
         sections = self.browser.execute_script("return document.getElementsByClassName('card home-card');")
         self.num_sections = len(sections)
 
+        # hashes of the tables scraped by the previous crawl
+        self.manifest = CrawlManifest(os.path.join(self.base_path, 'crawl_manifest.json'))
+        self.changed_oils = []
+        self.crawled_oils = []
+        self.errors = {}
+
     
-    def get_all_profiles(self) -> None:
+    @timed_function('crawl')
+    def get_all_profiles(self) -> list:
+        """
+        Oils whose page could not be parsed are recorded in `self.errors`
+        instead of stopping the crawl, the others are kept in `self.crawled_oils`.
+
+        Returns
+        -------
+        The list of oil names with at least one table that changed since the 
+        last crawl. Unchanged tables are not written again. 
+        """
+        start = time.perf_counter()
+        self.manifest.changed_oils = set()
+        self.errors = {}
+        self.crawled_oils = []
+        pages = 1 # the home page
         for i in range(0, self.num_sections):
             oil_links = self.browser.execute_script("return document.getElementsByClassName('card home-card')[%d].\
                                               getElementsByTagName('li');" % i)
@@ -77,172 +93,57 @@ class getProfiles():
                 link = self.browser.execute_script("return document.getElementsByClassName('card home-card')[%d].\
                                               getElementsByTagName('li')[%d].getElementsByTagName('a')[0];" %(i,j))
                 self.browser.execute_script("arguments[0].click();", link)  #clicking the links of each oil 
-                
-                # distillation profile 
-                self.distillation_profile(oil_name)
-                # basic profile 
-                self.basic_profile(oil_name)
-                # lightends profile 
-                self.lightends_profile(oil_name)
-                # btex profile
-                self.btex_profile(oil_name)
+                pages += 1
+
+                # distillation, basic, lightends and btex profiles
+                try:
+                    self.get_profiles(oil_name)
+                    self.crawled_oils.append(oil_name)
+                except ValueError as e:
+                    self.errors[oil_name] = str(e)
+                    print('could not parse the page of %s: %s' % (oil_name, e))
 
                 # reload the webpage 
-                self.browser.execute_script("window.open('%s', '_self');" % URL)
-                time.sleep(3)
-        
-        #convert .txt files into csv files 
-        self.to_csv(profile_name='distillation')
-        self.to_csv(profile_name='basic')
-        self.to_csv(profile_name='lightends')
-        self.to_csv(profile_name='btex')
-    
-    
-    def distillation_profile(self, oil_name) -> None :
+                self.browser.execute_script("window.open('%s', '_self');" % self.URL)
+                time.sleep(self.delay)
+
+        self.manifest.save()
+        self.changed_oils = sorted(self.manifest.changed_oils)
+
+        elapsed = time.perf_counter() - start
+        self.stats = {'pages': pages, 'seconds': elapsed, 'pages_per_second': pages / elapsed}
+        print('crawled %d pages in %.1fs (%.2f pages/s), %d oils changed' % (pages, elapsed, pages / elapsed, len(self.changed_oils)))
+        return self.changed_oils
+
+
+    def get_profiles(self, oil_name) -> list:
         """
+        Parse the profile tables of the open oil page in one pass over its
+        source and write the ones that changed since the last crawl straight
+        to <base_path>/<profile>_data/<oil_name>.csv. Every table is checked
+        first (see PageParser.extract_valid_tables), a ValueError leaves all
+        the files of the oil untouched. The files keep the cells as the site
+        shows them ('---' and 'ND' for missing values), the layout DataCleaner reads.
+
         Returns
         -------
-        None 
-        This function will perform web scraping for distillation profiles for all 
-        crude oils listed on https://www.crudemonitor.ca/. The results will be saved as 
-        .txt files in the ./distillation_data/ directory. 
+        The list of profile names that were written.
         """
-        # get the distillation profile table using xpath
-        distill_profile = self.browser.find_elements(By.XPATH, "//table[@id='HTSD']/tbody[1]")
-        
-        if len(distill_profile) >= 1:
-            # write the data into a .txt file 
-            file_path = './distillation_data/{}.txt'.format(oil_name)
-            with open(file_path, 'w') as f:
-                content = distill_profile[0].text
-                f.write(content)
-        
-        
-    def basic_profile(self, oil_name) -> None:
-        # get the distillation profile table using xpath
-        bas_profile = self.browser.find_elements(By.XPATH, "//table[@id='basic-analysis']/tbody[1]")
-        
-        if len(bas_profile) >= 1:
-            # write the data into a .txt file 
-            file_path = './basic_data/{}.txt'.format(oil_name)
-            with open(file_path, 'w') as f:
-                content = bas_profile[0].text
-                content_items = content.split('\n')
-                for line in content_items :
-                    if ")" in line:
-                        loc = re.search("\)", line).span()[0]
-                        header = line[:loc+1]
-                        data = line[loc+1:]
-                        header = header.replace(' ','')
-                        new_line = header + data + '\n'
-                        f.write(new_line)
-                    elif len(line.strip()):
-                        f.write(line)
-    
-    
-    
-    def lightends_profile(self, oil_name) -> None:
-        # get the distillation profile table using xpath
-        le_profile = self.browser.find_elements(By.XPATH, "//table[@id='light-ends']/tbody[1]")
-        
-        if len(le_profile) >= 1:
-            # write the data into a .txt file 
-            file_path = './lightends_data/{}.txt'.format(oil_name)
-            with open(file_path, 'w') as f:
-                content = le_profile[0].text
-                content_items = content.split('\n')
-                for line in content_items :
-                    if ")" in line:
-                        loc = re.search("\)", line).span()[0]
-                        header = line[:loc+1]
-                        data = line[loc+1:]
-                        header = header.replace(' ','')
-                        new_line = header + data + '\n'
-                        f.write(new_line)
-                    elif len(line.strip()):
-                        f.write(line)
-
-
-
-    def btex_profile(self, oil_name) -> None:
-        # get the distillation profile table using xpath
-        bt_profile = self.browser.find_elements(By.XPATH, "//table[@id='BTEX']/tbody[1]")
-        
-        if len(bt_profile) >= 1:
-            # write the data into a .txt file 
-            file_path = './btex_data/{}.txt'.format(oil_name)
-            with open(file_path, 'w') as f:
-                content = bt_profile[0].text
-                content_items = content.split('\n')
-                for line in content_items :
-                    if ")" in line:
-                        loc = re.search("\)", line).span()[0]
-                        header = line[:loc+1]
-                        data = line[loc+1:]
-                        header = header.replace(' ','')
-                        new_line = header + data + '\n'
-                        f.write(new_line)
-                    elif len(line.strip()):
-                        f.write(line)
-    
-    
-    def to_csv(self, profile_name='distillation'):
-        """
-        convert all .txt files inside the given data directory into .csv files. 
-        The original .txt files will be deleted.
+        tables = extract_valid_tables(self.browser.page_source)
+
+        written = []
+        for profile_name, rows in tables.items():
+            # skip the table if it did not change since the last crawl
+            digest = self.manifest.table_changed(oil_name, profile_name, rows)
+            if digest is not None:
+                dir_path = os.path.join(self.base_path, '{}_data'.format(profile_name))
+                write_profile_csv(dir_path, oil_name, profile_name, rows)
+                # only a written table counts as crawled, a failed write is retried next time
+                self.manifest.record_table(oil_name, profile_name, digest)
+                written.append(profile_name)
+        return written
 
-        INPUT:
-        ------
-        profile_name: optional. By default "distillation" can take values in 
-        ['distillation', 'basic', 'lightends', 'btex'].
-        """
-        assert profile_name in ['distillation', 'basic', 'lightends', 'btex']
-        
-        dir_path = './{}_data'.format(profile_name)
-
-        # specifying header for each profile 
-        if profile_name == 'distillation':
-            header = ['percentage', 'recent_C', '5_year_C', 'recent_F', '5_year_F']
-        if profile_name == 'basic':
-            header = ['property', 'most_recent', 'six_month', 'one_year', 'five_year']
-        if profile_name == 'lightends':
-            header = ['property', 'most_recent', 'six_month', 'one_year', 'five_year']
-        if profile_name == 'btex':
-            header = ['property', 'most_recent', 'six_month', 'one_year', 'five_year']
-        
-        for file in os.listdir(dir_path):
-            if file.endswith('.txt'):
-                file_path = os.path.join(dir_path, file)
-                file_name = os.path.splitext(file)[0]
-                df = pd.read_csv(file_path, sep='\s+', header=None)
-                csv_path = os.path.join(dir_path, '%s.csv'% file_name)
-                df.to_csv(csv_path, header = header, index=False)
-                os.remove(file_path)
 
-    
-    # def normailize_txt(self, file_path) -> None:
-    #     """
-    #     This function is used to normalize .txt files
-    #     e.g. get rid of irregular spaces such as "BC Light (BCL)" -> "BCLight(BCL)"
-    #     Those spaces will make rows to take different length, thus impossible to be 
-    #     converted into .csv files.
-    #     """
-
-    #     with open(file_path, 'r+') as f:
-    #         content = f.read()
-    #         content_items = content.split('\n')
-    #         for line in content_items :
-    #             if ")" in line:
-    #                 loc = re.search("\)", line).span()[0]
-    #                 header = line[:loc+1]
-    #                 data = line[loc+1:]
-    #                 header = header.replace(' ','')
-    #                 new_line = header + data + '\n'
-    #                 f.write(new_line)
-    #             elif len(line.strip()):
-    #                 f.write(line)
-    
-    
     def close_browser(self):
         self.browser.close()
 
@@ -0,0 +1,129 @@
+"""
+Production serving of the web app without the Flask development server.
+
+* threaded: one process, a thread per request.
+* prefork: the listening socket is opened once, then `workers` processes are
+  forked and each serves it with its own threads. Every worker loads the model
+  artifact itself, once, after the fork. A worker that dies is replaced;
+  workers dying right after they start are replaced after a growing delay,
+  and serving stops after `max_quick_exits` of them in a row (e.g. when
+  there is no model artifact to load).
+
+Both run on werkzeug's WSGI server, which ships with Flask.
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+
+class quietRequestHandler(WSGIRequestHandler):
+    # requests are not logged line by line, the app logs what it needs
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+
+def listen(host, port, backlog=128) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_threaded(app, host='127.0.0.1', port=5000, fd=None, on_start=None) -> None:
+    """
+    Serve `app` with a thread per request, on `host`:`port` or on the already
+    listening socket `fd`. `on_start` is called before the first request.
+    """
+    server = make_server(host, port, app, threaded=True, request_handler=quietRequestHandler, fd=fd)
+    if on_start is not None:
+        on_start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _spawn(app, sock, host, port, on_start) -> tuple:
+    pid = os.fork()
+    if pid == 0:
+        # the worker: default signal handling, serve until killed
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        status = 0
+        try:
+            serve_threaded(app, host, port, fd=sock.fileno(), on_start=on_start)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+    return pid, time.monotonic()
+
+
+def serve_prefork(app, host='127.0.0.1', port=5000, workers=2, on_start=None,
+                  quick_exit=5.0, max_quick_exits=5, backoff=0.1, max_backoff=30.0) -> None:
+    """
+    Serve `app` with `workers` processes sharing one listening socket, each
+    with a thread per request. `on_start` is called in every worker after the
+    fork, e.g. to load the model. Stops all workers on SIGINT or SIGTERM.
+
+    A worker exiting within `quick_exit` seconds of its start is replaced
+    after `backoff` seconds, doubled on every such exit in a row up to
+    `max_backoff`. After `max_quick_exits` in a row, the other workers are
+    stopped and a RuntimeError is raised.
+    """
+    assert hasattr(os, 'fork'), 'prefork serving needs os.fork, use the threaded mode'
+    sock = listen(host, port)
+    children = dict(_spawn(app, sock, host, port, on_start) for _ in range(workers))
+    stopping = False
+    quick_exits = 0
+
+    def stop(signum=None, frame=None):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = children.pop(pid, None)
+            if stopping or started is None:
+                continue
+
+            if time.monotonic() - started < quick_exit:
+                quick_exits += 1
+            else:
+                quick_exits = 0
+            if quick_exits >= max_quick_exits:
+                stop()
+                for pid in list(children):
+                    os.waitpid(pid, 0)
+                raise RuntimeError('%d workers in a row exited right after starting, the last with status %d; '
+                                   'is there a model artifact to serve?' % (quick_exits, os.waitstatus_to_exitcode(status)))
+            delay = min(backoff * 2 ** (quick_exits - 1), max_backoff) if quick_exits else backoff
+            sys.stderr.write('worker %d exited, starting a new one in %.2fs\n' % (pid, delay))
+            time.sleep(delay)
+            if not stopping:
+                children.update([_spawn(app, sock, host, port, on_start)])
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        sock.close()
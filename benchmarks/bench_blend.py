@@ -0,0 +1,49 @@
+"""
+Latency of mixing one blend with mix_crude and with blendEngine, and
+throughput of mixing a batch of blends.
+
+    python benchmarks/bench_blend.py --oils 100 --batch 10000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from BlendEngine import blendEngine
+from CrudeBlendModel import mix_crude
+
+
+def run(n_oils, batch_size, n_components=4) -> dict:
+    rng = np.random.RandomState(0)
+    oils = ['Oil%d' % i for i in range(n_oils)]
+    feature_df = pd.DataFrame(rng.rand(n_oils, 20), index=oils)
+    engine = blendEngine(feature_df)
+
+    blends = [dict(zip(rng.choice(oils, n_components, replace=False), rng.rand(n_components) + 0.1))
+              for _ in range(batch_size)]
+    number = 2000
+
+    results = {
+        'mix_crude_us': timeit.timeit(lambda: mix_crude('Oil0', 1.0, 'Oil1', 2.0, feature_df), number=number) / number * 1e6,
+        'engine_mix_us': timeit.timeit(lambda: engine.mix({'Oil0': 1.0, 'Oil1': 2.0}), number=number) / number * 1e6,
+        'engine_mix_%d_oils_us' % n_components: timeit.timeit(lambda: engine.mix(blends[0]), number=number) / number * 1e6,
+    }
+    seconds = min(timeit.repeat(lambda: engine.mix_batch(blends), number=1, repeat=3))
+    results['batch_blends_per_second'] = batch_size / seconds
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oils', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=10000)
+    args = parser.parse_args()
+
+    for name, value in run(args.oils, args.batch).items():
+        print('%-28s %12.1f' % (name, value))
@@ -0,0 +1,60 @@
+"""
+Compare loading x and y data by parsing the per-oil .csv files with loading
+them from the consolidated .npz store, and with querying the assay store.
+
+    python benchmarks/bench_dataset_store.py --oils 50 500
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AssayStore import AssayStore
+from DataCleaner import CleanData
+from SyntheticData import write_crawl_data
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(n_oils, repeat=5) -> dict:
+    base_path = tempfile.mkdtemp()
+    try:
+        write_crawl_data(base_path, n_oils)
+        store_path = os.path.join(base_path, 'dataset.npz')
+        CleanData(base_path).build_store(store_path)
+
+        csv_seconds = best_of(lambda: CleanData(base_path).get_x_y_data(), repeat)
+        store_seconds = best_of(lambda: CleanData(base_path, store_path).get_x_y_data(), repeat)
+        assays = AssayStore(os.path.join(base_path, 'assays'))
+        assays.append_crawl(base_path, crawl_date='2023-01-01')
+        assay_seconds = best_of(lambda: AssayStore(assays.root).x_y_data(), repeat)
+    finally:
+        shutil.rmtree(base_path)
+    return {'oils': n_oils, 'csv_seconds': csv_seconds, 'store_seconds': store_seconds,
+            'speedup': csv_seconds / store_seconds, 'assay_seconds': assay_seconds}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oils', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    print('%8s %12s %12s %8s %12s' % ('oils', 'csv (s)', 'store (s)', 'speedup', 'assays (s)'))
+    for n_oils in args.oils:
+        result = run(n_oils, args.repeat)
+        print('%(oils)8d %(csv_seconds)12.4f %(store_seconds)12.4f %(speedup)7.0fx %(assay_seconds)12.4f' % result)
@@ -0,0 +1,87 @@
+"""
+Cold start cost of the entry points: every module is imported in a fresh
+interpreter with `python -X importtime`, which reports the time spent in
+each imported module. Reports the total import time, the heaviest top level
+packages pulled in, and whether scikit-learn, plotting or the browser came
+along.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --modules main BlendPrediction --out imports.json
+"""
+
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the serving entry points first, then the offline ones
+MODULES = ['main', 'BlendPrediction', 'FastInference', 'PredictionCache', 'ModelRegistry',
+           'CrudeBlendModel', 'ModelTrainer', 'WebCrawler', 'HttpCrawler']
+
+# packages the serving path should not import
+HEAVY = ['sklearn', 'matplotlib', 'seaborn', 'selenium']
+
+
+def import_times(module) -> dict:
+    """
+    Microseconds spent importing each module (self time) when `module` is
+    imported in a new interpreter, and the total.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    self_us = {}
+    total_us = 0
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        self_us[name.strip()] = int(self_time)
+        if not name.startswith('  '):
+            total_us += int(cumulative)
+    return {'modules': self_us, 'total_us': total_us}
+
+
+def run(modules=MODULES, top=5, repeat=3) -> dict:
+    """
+    For every module, the best total import time in seconds out of `repeat`
+    runs, the `top` heaviest top level packages and the heavy packages imported.
+    """
+    results = {}
+    for module in modules:
+        runs = [import_times(module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['total_us'])
+        packages = collections.Counter()
+        for name, us in best['modules'].items():
+            packages[name.split('.')[0]] += us
+        results[module] = {
+            'seconds': best['total_us'] / 1e6,
+            'modules': len(best['modules']),
+            'heaviest': {name: us / 1e6 for name, us in packages.most_common(top)},
+            'heavy_packages': sorted(name for name in HEAVY if name in packages),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--top', type=int, default=5, help='heaviest packages listed per module')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default=None, help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run(args.modules, args.top, args.repeat)
+    print('%-16s %8s %8s  %-28s %s' % ('module', 'seconds', 'modules', 'heavy packages', 'heaviest'))
+    for module, result in results.items():
+        heaviest = ', '.join('%s %.2fs' % item for item in result['heaviest'].items())
+        print('%-16s %8.3f %8d  %-28s %s' % (module, result['seconds'], result['modules'],
+                                            ' '.join(result['heavy_packages']) or '-', heaviest))
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,70 @@
+"""
+Per row latency of Pipeline.predict and of its compiledModel, for every
+estimator family of the search, on a model like the one served.
+
+    python benchmarks/bench_inference.py --oils 100 --features 30
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Lasso, LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+
+from CrudeBlendModel import make_pipeline
+from FastInference import compiledModel
+
+
+ESTIMATORS = {
+    'Lasso': Lasso(alpha=1.0),
+    'LinearRegression': LinearRegression(),
+    'KNeighborsRegressor': KNeighborsRegressor(n_neighbors=5, weights='distance'),
+    'RandomForestRegressor': RandomForestRegressor(n_estimators=200, random_state=0),
+}
+
+
+def run(n_oils, n_features, batch_size=1000, number=200) -> pd.DataFrame:
+    rng = np.random.RandomState(0)
+    x_data = pd.DataFrame(rng.rand(n_oils, n_features), columns=['f%d' % i for i in range(n_features)])
+    Y_data = np.sort(rng.rand(n_oils, 12) * 600, axis=1)
+    row = x_data.iloc[:1]
+    batch = pd.DataFrame(rng.rand(batch_size, n_features), columns=x_data.columns)
+
+    results = {}
+    for name, estimator in ESTIMATORS.items():
+        pipeline = make_pipeline().set_params(model__estimator=estimator, reduce_dim__n_components=10)
+        pipeline.fit(x_data, Y_data)
+        compiled = compiledModel(pipeline)
+        array = row.to_numpy()
+
+        error = np.abs(compiled.predict(batch) - pipeline.predict(batch)).max()
+        pipeline_us = timeit.timeit(lambda: pipeline.predict(row), number=number) / number * 1e6
+        compiled_us = timeit.timeit(lambda: compiled.predict(array), number=number) / number * 1e6
+        pipeline_batch = min(timeit.repeat(lambda: pipeline.predict(batch), number=1, repeat=3))
+        compiled_batch = min(timeit.repeat(lambda: compiled.predict(batch), number=1, repeat=3))
+        results[name] = {
+            'pipeline_row_us': pipeline_us,
+            'compiled_row_us': compiled_us,
+            'row_speedup': pipeline_us / compiled_us,
+            'pipeline_batch_us_per_row': pipeline_batch / batch_size * 1e6,
+            'compiled_batch_us_per_row': compiled_batch / batch_size * 1e6,
+            'max_abs_difference': error,
+        }
+    return pd.DataFrame(results).T
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oils', type=int, default=100)
+    parser.add_argument('--features', type=int, default=30)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(run(args.oils, args.features, args.batch).to_string(float_format='%.3g'))
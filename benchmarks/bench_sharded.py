@@ -0,0 +1,60 @@
+"""
+Scaling of a pair sweep with the number of worker processes of
+ShardedRunner, compared with a single process blendSweep.
+
+    python benchmarks/bench_sharded.py --oils 100 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from BlendEngine import blendEngine
+from BlendSweep import blendSweep
+from CrudeBlendModel import available_cores, make_pipeline
+from FastInference import compiledModel
+from ShardedRunner import shardedSweep
+
+
+def consume(sweep) -> float:
+    start = time.perf_counter()
+    for _ in sweep.chunks():
+        pass
+    return time.perf_counter() - start
+
+
+def run(n_oils, workers, chunk_size) -> pd.DataFrame:
+    rng = np.random.RandomState(0)
+    x_data = pd.DataFrame(rng.rand(n_oils, 25) + 1, index=['Oil%d' % i for i in range(n_oils)])
+    pipeline = make_pipeline().set_params(model__estimator=RandomForestRegressor(100, random_state=0),
+                                          reduce_dim__n_components=10)
+    model = compiledModel(pipeline.fit(x_data, rng.rand(n_oils, 12) * 600), max_rows=chunk_size)
+    engine = blendEngine(x_data, rules={})
+
+    single = blendSweep(engine, model, chunk_size=chunk_size)
+    baseline = consume(single)
+    results = {'single process': {'workers': 1, 'seconds': baseline, 'blends_per_second': len(single) / baseline, 'speedup': 1.0}}
+    for n_workers in workers:
+        with shardedSweep(engine, model, chunk_size=chunk_size, n_workers=n_workers) as sweep:
+            seconds = consume(sweep)
+        results['sharded %d' % n_workers] = {'workers': n_workers, 'seconds': seconds,
+                                             'blends_per_second': len(sweep) / seconds, 'speedup': baseline / seconds}
+    return pd.DataFrame(results).T
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oils', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk', type=int, default=5000)
+    args = parser.parse_args()
+
+    print('%d cores available' % available_cores())
+    print(run(args.oils, args.workers, args.chunk).to_string(float_format='%.2f'))
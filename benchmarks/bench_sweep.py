@@ -0,0 +1,56 @@
+"""
+Throughput and peak Python memory of a pair sweep, for sweeps of growing
+size: the peak should not grow with the number of blends.
+
+    python benchmarks/bench_sweep.py --oils 50 100 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from BlendEngine import blendEngine
+from BlendSweep import blendSweep
+from CrudeBlendModel import make_pipeline
+from FastInference import compiledModel
+
+
+def run(n_oils, chunk_size, csv=False) -> dict:
+    rng = np.random.RandomState(0)
+    x_data = pd.DataFrame(rng.rand(n_oils, 25) + 1, index=['Oil%d' % i for i in range(n_oils)])
+    pipeline = make_pipeline().set_params(model__estimator=RandomForestRegressor(50, max_depth=10, random_state=0),
+                                          reduce_dim__n_components=10)
+    model = compiledModel(pipeline.fit(x_data, rng.rand(n_oils, 12) * 600), max_rows=chunk_size)
+    sweep = blendSweep(blendEngine(x_data, rules={}), model, chunk_size=chunk_size)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tracemalloc.start()
+        start = time.perf_counter()
+        if csv:
+            sweep.write_csv(os.path.join(tmp_dir, 'sweep.csv'), progress=None)
+        else:
+            sweep.write_columns(os.path.join(tmp_dir, 'sweep'), progress=None)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'blends': len(sweep), 'seconds': seconds, 'blends_per_second': len(sweep) / seconds,
+            'peak_mb': peak / 2 ** 20}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oils', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--chunk', type=int, default=20000)
+    parser.add_argument('--csv', action='store_true', help='write a CSV file instead of .npy columns')
+    args = parser.parse_args()
+
+    print(pd.DataFrame({n_oils: run(n_oils, args.chunk, args.csv) for n_oils in args.oils}).T.to_string(float_format='%.1f'))
@@ -0,0 +1,161 @@
+"""
+Load test of the web app: latency percentiles and requests per second of
+/output (form) and /api/blend (JSON), with concurrent keep-alive clients.
+
+Without --url, a model artifact is made from synthetic data and the app is
+started in a subprocess with the given serving mode:
+
+    python benchmarks/load_test.py --serve-mode prefork --workers 4 --clients 16
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --oils "Oil A" "Oil B"
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_registry(dir_path, n_oils=80) -> list:
+    from sklearn.ensemble import RandomForestRegressor
+    from CrudeBlendModel import make_pipeline
+    from ModelRegistry import ModelRegistry
+
+    rng = np.random.RandomState(0)
+    oils = ['Oil%d' % i for i in range(n_oils)]
+    x_data = pd.DataFrame(rng.rand(n_oils, 25) + 1, index=oils, columns=['f%d' % i for i in range(25)])
+    Y_data = pd.DataFrame(np.sort(rng.rand(n_oils, 12) * 600, axis=1), index=oils,
+                          columns=[5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99])
+    model = make_pipeline().set_params(model__estimator=RandomForestRegressor(100, random_state=0),
+                                       reduce_dim__n_components=10).fit(x_data, Y_data)
+    ModelRegistry(dir_path).save(model, x_data, Y_data, 10.0)
+    return oils
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(host, port, timeout=60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request('GET', '/status')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('the app did not start within %ss' % timeout)
+
+
+def requests_for(endpoint, oils, rng):
+    # a few popular blends at common ratios, like the real traffic
+    pairs = [(oils[i], oils[j]) for i, j in rng.randint(0, len(oils), (20, 2)) if i != j]
+    ratios = [(50, 50), (70, 30), (30, 70), (80, 20)]
+    while True:
+        (first, second), (vol_1, vol_2) = pairs[rng.randint(len(pairs))], ratios[rng.randint(len(ratios))]
+        if endpoint == '/output':
+            body = urllib.parse.urlencode({'oil_1_select': first, 'oil_1_vol': vol_1,
+                                           'oil_2_select': second, 'oil_2_vol': vol_2})
+            yield body, 'application/x-www-form-urlencoded'
+        else:
+            yield json.dumps({'recipe': {first: vol_1, second: vol_2}}), 'application/json'
+
+
+def run_clients(host, port, endpoint, oils, clients, seconds) -> dict:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(seed):
+        rng = np.random.RandomState(seed)
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        local = []
+        for body, content_type in requests_for(endpoint, oils, rng):
+            if time.monotonic() > deadline:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', endpoint, body, {'Content-Type': content_type})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {'requests': len(latencies), 'errors': errors[0], 'rps': len(latencies) / elapsed,
+            'p50_ms': np.percentile(latencies, 50) if len(latencies) else np.nan,
+            'p99_ms': np.percentile(latencies, 99) if len(latencies) else np.nan}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='load test a running app instead of starting one')
+    parser.add_argument('--oils', nargs='+', default=None, help='oils to blend, needed with --url')
+    parser.add_argument('--serve-mode', default='threaded', choices=['threaded', 'prefork'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of the test of each endpoint')
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.url is None:
+            oils = make_registry(tmp_dir)
+            host, port = '127.0.0.1', free_port()
+            server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), 'serve', '--registry', tmp_dir,
+                                       '--serve-mode', args.serve_mode, '--workers', str(args.workers),
+                                       '--port', str(port)], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=ROOT)
+        else:
+            assert args.oils, 'give the oils to blend with --oils'
+            url = urllib.parse.urlparse(args.url)
+            host, port, oils = url.hostname, url.port or 80, args.oils
+        try:
+            wait_ready(host, port)
+            results = {endpoint: run_clients(host, port, endpoint, oils, args.clients, args.seconds)
+                       for endpoint in ['/output', '/api/blend']}
+        finally:
+            if server is not None:
+                server.terminate()
+                stdout = server.communicate(timeout=30)[0]
+                if stdout:
+                    print('the app wrote %d bytes to stdout' % len(stdout))
+
+    mode = args.url or '%s, %d workers' % (args.serve_mode, args.workers if args.serve_mode == 'prefork' else 1)
+    print('%s, %d clients' % (mode, args.clients))
+    print(pd.DataFrame(results).T.to_string(float_format='%.2f'))
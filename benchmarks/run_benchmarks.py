@@ -0,0 +1,258 @@
+"""
+Benchmark suite of the whole pipeline, on fixture and synthetic data only,
+so it needs no network and gives the same workload on every machine:
+
+* import: cold start of the web app and of the training module, see bench_import.
+* crawl: fetchProfiles and getProfiles (on a CrawlReplay.replayBrowser) over the
+  fixture pages, served from a local server.
+* clean: CleanData.get_x_y_data on synthetic crawls of 1x, 10x and 100x the oils.
+* train: a GridSearchCV fit per estimator family of the search.
+* predict: mix_crude + Pipeline.predict for one blend, predict_blends for a batch,
+  and the 3 nearest analogs (AnalogIndex) of one mixed blend and of the batch.
+* web: the /output handler through the Flask test client.
+
+The results are written as JSON, with the commit and library versions, so
+runs of two commits can be compared:
+
+    python benchmarks/run_benchmarks.py --out before.json
+    python benchmarks/run_benchmarks.py --out after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import GridSearchCV
+
+from AnalogIndex import analogIndex
+from BlendEngine import blendEngine
+from CrudeBlendModel import make_pipeline, mix_crude, parameters, predict_blends
+from DataCleaner import CleanData, fill_missing
+from SyntheticData import write_crawl_data
+
+
+FIXTURE_DIR = os.path.join(ROOT, 'fixtures', 'crudemonitor')
+STAGES = ['import', 'crawl', 'clean', 'train', 'predict', 'web']
+
+
+
+def measure(func, repeat=5, number=1) -> dict:
+    """
+    Seconds per call of `func`: the best and the median of `repeat` runs of
+    `number` calls each.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {'best': min(timings), 'median': float(np.median(timings)), 'repeat': repeat, 'number': number}
+
+
+def synthetic_dataset(base_path, n_oils):
+    write_crawl_data(base_path, n_oils)
+    return fill_missing(*CleanData(base_path).get_x_y_data())
+
+
+def bench_crawl(repeat) -> dict:
+    from CrawlReplay import replayBrowser, replayServer
+    from HttpCrawler import fetchProfiles
+    from WebCrawler import getProfiles
+
+    def crawl(make_crawler):
+        base_path = tempfile.mkdtemp()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                make_crawler(base_path).get_all_profiles()
+        finally:
+            shutil.rmtree(base_path)
+
+    with replayServer(FIXTURE_DIR) as server:
+        http = measure(lambda: crawl(lambda base_path: fetchProfiles(server.URL, base_path=base_path, min_interval=0)), repeat)
+        selenium = measure(lambda: crawl(lambda base_path: getProfiles(replayBrowser(), server.URL, base_path=base_path, delay=0)), repeat)
+    return {'fixture_site': http, 'selenium_replay': selenium}
+
+
+def bench_clean(n_oils, scales, repeat) -> dict:
+    results = {}
+    for scale in scales:
+        base_path = tempfile.mkdtemp()
+        try:
+            write_crawl_data(base_path, n_oils * scale)
+            result = measure(lambda: CleanData(base_path).get_x_y_data(), repeat)
+            results['%dx' % scale] = dict(result, oils=n_oils * scale)
+        finally:
+            shutil.rmtree(base_path)
+    return results
+
+
+def small_grid(grid) -> dict:
+    # the first two values of every hyperparameter, the estimator itself is kept
+    return {name: values if name == 'model__estimator' else values[:2] for name, values in grid.items()}
+
+
+def bench_train(x_data, Y_data, full_grid, n_jobs) -> dict:
+    results = {}
+    for grid in parameters:
+        grid = grid if full_grid else small_grid(grid)
+        family = type(grid['model__estimator'][0]).__name__
+        search = GridSearchCV(make_pipeline(), param_grid=[grid], cv=5, n_jobs=n_jobs)
+        result = measure(lambda: search.fit(x_data, Y_data), repeat=1)
+        results[family] = dict(result, candidates=len(search.cv_results_['params']))
+    return results
+
+
+def bench_predict(x_data, Y_data, batch_size, repeat) -> dict:
+    pipeline = make_pipeline().set_params(reduce_dim__n_components=10).fit(x_data, Y_data)
+    engine = blendEngine(x_data)
+    rng = np.random.RandomState(0)
+    oils = list(x_data.index)
+    first, second = oils[0], oils[1]
+    recipes = [dict(zip(rng.choice(oils, 3, replace=False), rng.rand(3) + 0.1)) for _ in range(batch_size)]
+
+    def single():
+        mixed = mix_crude(first, 30, second, 70, x_data)
+        return pipeline.predict(mixed.to_frame().T)
+
+    batch = measure(lambda: predict_blends(recipes, engine, pipeline), repeat)
+    index = analogIndex(x_data, Y_data)
+    mixed = engine.mix_batch(recipes)
+    analogs = measure(lambda: index.query(mixed, k=3), repeat)
+    return {'single': measure(single, repeat, number=20),
+            'batch': dict(batch, blends=batch_size, per_blend=batch['best'] / batch_size),
+            'analogs_single': measure(lambda: index.query(mixed[:1], k=3), repeat, number=20),
+            'analogs_batch': dict(analogs, blends=batch_size, per_blend=analogs['best'] / batch_size)}
+
+
+def bench_web(x_data, Y_data, n_requests, repeat) -> dict:
+    import main
+    from ModelRegistry import ModelRegistry
+
+    registry_dir = tempfile.mkdtemp()
+    try:
+        model = make_pipeline().set_params(reduce_dim__n_components=10).fit(x_data, Y_data)
+        ModelRegistry(registry_dir).save(model, x_data, Y_data, 10.0)
+        main.load_state(registry_dir)
+        client = main.app.test_client()
+        oils = list(x_data.index)
+        forms = [{'oil_1_select': oils[i % len(oils)], 'oil_1_vol': str(1 + i),
+                  'oil_2_select': oils[(i + 1) % len(oils)], 'oil_2_vol': '10'} for i in range(n_requests)]
+
+        def post(form):
+            response = client.post('/output', data=form)
+            assert response.status_code == 200, response.status_code
+
+        # every request of the first run misses the prediction cache, the next ones all hit it
+        uncached = measure(lambda: [post(form) for form in forms], repeat=1)
+        cached = measure(lambda: [post(form) for form in forms], repeat)
+        return {'output_uncached': dict(uncached, best=uncached['best'] / n_requests,
+                                        median=uncached['median'] / n_requests, requests=n_requests),
+                'output_cached': dict(cached, best=cached['best'] / n_requests,
+                                      median=cached['median'] / n_requests, requests=n_requests)}
+    finally:
+        shutil.rmtree(registry_dir)
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sklearn': sklearn.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def run(stages=STAGES, n_oils=20, scales=(1, 10, 100), full_grid=False, n_jobs=1, batch_size=1000,
+        n_requests=50, repeat=5) -> dict:
+    """
+    Run the benchmarks of `stages`. All timings are in seconds per call.
+    """
+    warnings.simplefilter('ignore')
+    results = {}
+    if 'import' in stages:
+        from bench_import import run as import_times
+        results['import'] = {module: dict(result, best=result['seconds'])
+                             for module, result in import_times(['main', 'CrudeBlendModel'], repeat=repeat).items()}
+    if 'crawl' in stages:
+        results['crawl'] = bench_crawl(repeat)
+    if 'clean' in stages:
+        results['clean'] = bench_clean(n_oils, scales, repeat)
+
+    if {'train', 'predict', 'web'} & set(stages):
+        base_path = tempfile.mkdtemp()
+        try:
+            # the search needs enough oils for 5 folds of 20 components
+            x_data, Y_data = synthetic_dataset(base_path, max(n_oils, 50))
+        finally:
+            shutil.rmtree(base_path)
+        if 'train' in stages:
+            results['train'] = bench_train(x_data, Y_data, full_grid, n_jobs)
+        if 'predict' in stages:
+            results['predict'] = bench_predict(x_data, Y_data, batch_size, repeat)
+        if 'web' in stages:
+            results['web'] = bench_web(x_data, Y_data, n_requests, repeat)
+    return {'environment': environment(), 'results': results}
+
+
+def compare(results, baseline) -> list:
+    """
+    (stage, benchmark, baseline seconds, seconds, ratio) of every benchmark
+    found in both runs, ratio above 1 means slower than the baseline.
+    """
+    rows = []
+    for stage, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            before = baseline.get(stage, {}).get(name)
+            if before is not None:
+                rows.append((stage, name, before['best'], result['best'], result['best'] / before['best']))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--oils', type=int, default=20, help='oils of the 1x clean benchmark')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--full-grid', action='store_true', help='fit the whole grid of every family, not two values per hyperparameter')
+    parser.add_argument('--jobs', type=int, default=1, help='GridSearchCV workers')
+    parser.add_argument('--batch', type=int, default=1000, help='blends of the batch prediction')
+    parser.add_argument('--requests', type=int, default=50, help='/output requests per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default='benchmarks.json', help='JSON file of the results')
+    parser.add_argument('--compare', default=None, help='JSON file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    report = run(args.stages, args.oils, args.scales, args.full_grid, args.jobs, args.batch, args.requests, args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for stage, benchmarks in report['results'].items():
+        for name, result in benchmarks.items():
+            print('%-8s %-24s %12.6fs' % (stage, name, result['best']))
+    print('written to %s' % args.out)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\ncompared with %s (commit %s)' % (args.compare, baseline['environment']['commit']))
+        for stage, name, before, after, ratio in compare(report['results'], baseline['results']):
+            print('%-8s %-24s %12.6fs %12.6fs %7.2fx' % (stage, name, before, after, ratio))
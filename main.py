@@ -1,57 +1,212 @@
-from flask import Flask, render_template, request
-import pandas as pd 
-import numpy as np 
-from flask_wtf import FlaskForm
-from wtforms import SelectField, FloatField, validators, DecimalField
-from DataCleaner import CleanData
-from CrudeBlendModel import mix_crude, Model
-from WebCrawler import getProfiles
+"""
+Web interface of the blended crude distillation profile predictor.
 
-import random
-
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression, Lasso
-from sklearn.naive_bayes import MultinomialNB 
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.decomposition import PCA
-from sklearn.neural_network import MLPRegressor
-from sklearn.impute import SimpleImputer 
-from sklearn.metrics import make_scorer, r2_score, mean_squared_error, auc, mean_absolute_error, accuracy_score
-from sklearn.pipeline import Pipeline
-from sklearn.base import BaseEstimator
+Crawling, cleaning and training are offline commands that write artifacts
+to disk, the web app only loads the latest model artifact of the registry and
+switches to a newly trained one without a restart:
 
+    python main.py crawl     # scrape crudemonitor.ca into the *_data directories
+    python main.py clean     # build the dataset artifact from the scraped files
+    python main.py train     # fit the model, save and promote a model artifact
+    python main.py serve     # start the web app (default), see --serve-mode
+    python main.py all       # all of the above, in order
+    python main.py promote --version <version>   # serve an older artifact again
+    python main.py sweep --out sweep.csv         # predict every oil pair at 1% steps
 
-# get data from web
-oil_profiles = getProfiles()
-oil_profiles.get_all_profiles()
+Every request is timed stage by stage and logged, the timings are served on
+/metrics, see Metrics.
 
+Crawls, cleanings, retrains and sweeps can also be submitted to /api/jobs
+while the app runs: `serve` starts a background worker (see --job-workers)
+that runs them one at a time in its own processes, see JobQueue.
+"""
 
-# Load Data 
-crude_data = CleanData()
-x_data , Y_data = crude_data.get_x_y_data()
+import argparse
+import json
+import math
+import os
+import random
+import time
 
-# normalize x_data 
-random.seed(10)
-impX = SimpleImputer(missing_values=np.nan, strategy='mean')
-scaler = StandardScaler()
-x_data = x_data.apply(lambda row: row.replace(np.nan, row.mean()), axis=1)
-Y_data = Y_data.apply(lambda row: row.replace(np.nan, max(row)), axis=1)
-x_train, x_test, Y_train, Y_test = train_test_split(x_data, Y_data, test_size=0.2)
-all_oils = Y_data.index.values
+import pandas as pd
+from flask import Flask, Response, render_template, request, jsonify
 
-# fit the data
-Model.fit(x_train, Y_train)
-predictions = Model.predict(x_test)
-error = round(mean_absolute_error(Y_test, predictions), 2)
+from BlendEngine import blendEngine
+from BlendOptimizer import blendOptimizer
+from FastInference import compiledModel
+from JobQueue import jobQueue, report_progress, start_workers
+from Metrics import instrument, timed
+from ModelRegistry import ARTIFACT_DIR, ASSAY_DIR, DATASET_PATH, JOBS_PATH, REGISTRY_DIR, ModelRegistry, liveModel
+from PredictionCache import predictionCache
 
 
 app = Flask(__name__)
+instrument(app)
 app.config['SECRET_KEY'] = 'secret'
 
 report_pct = [5,10,20,30,40,50,60,70,80,90,95,99]
 
+# number of crude oils offered on the input form
+max_components = 8
+
+# model artifact used by the web app, see load_state
+live = None
+
+# queue of the background jobs, see get_jobs
+jobs = None
+
+# the parameters a client may give to each kind of job, with their types. The
+# files the jobs read and write are chosen here, see job_params
+job_types = {
+    'crawl': {'http': bool},
+    'clean': {'from_assays': bool, 'since': str, 'until': str, 'average': bool},
+    'train': {'strategy': str, 'n_jobs': int, 'curve': bool},
+    'sweep': {'step': float, 'n_workers': int, 'format': str},
+}
+
+# where the jobs read and write, set by serve
+job_paths = {'dataset': DATASET_PATH, 'assays': ASSAY_DIR, 'registry': REGISTRY_DIR,
+             'sweeps': os.path.join(ARTIFACT_DIR, 'sweeps')}
+
+# size and time to live (seconds) of the prediction cache of every artifact
+cache_size = 4096
+cache_ttl = 3600.0
+
+# longest search /api/optimize may run, in seconds
+max_time_budget = 30.0
+
+
+
+def crawl(http=False, assay_dir=ASSAY_DIR) -> int:
+    """
+    Scrape all profiles from crudemonitor.ca, with the Selenium crawler or
+    with the browser-free HTTP crawler, and append a snapshot of every oil
+    crawled to the assay store, see AssayStore. Returns the number of values
+    appended.
+    """
+    from AssayStore import AssayStore
+
+    if http:
+        from HttpCrawler import fetchProfiles
+        oil_profiles = fetchProfiles()
+    else:
+        from WebCrawler import getProfiles
+        oil_profiles = getProfiles()
+    oil_profiles.get_all_profiles()
+    # every oil, changed or not: a date window of the store holds full snapshots
+    rows = AssayStore(assay_dir).append_crawl('.', oils=oil_profiles.crawled_oils)
+    print('appended %d assay values to %s' % (rows, assay_dir))
+    return rows
+
+
+def clean(dataset_path=DATASET_PATH, assay_dir=None, since=None, until=None, average=False) -> str:
+    """
+    Clean the scraped files and save x_data and Y_data as the dataset artifact.
+    Missing values are kept, train fills them. With `assay_dir`, the dataset
+    is queried from the assay store instead: the latest values crawled
+    between `since` and `until`, or their average.
+    """
+    from ModelRegistry import save_dataset
+
+    if assay_dir is not None:
+        from AssayStore import AssayStore
+        x_data, Y_data = AssayStore(assay_dir).x_y_data(since, until, average)
+    else:
+        from DataCleaner import CleanData
+        x_data, Y_data = CleanData().get_x_y_data()
+    version = save_dataset(x_data, Y_data, dataset_path)
+    print('saved dataset %s to %s' % (version, dataset_path))
+    return version
+
+
+def train(dataset_path=DATASET_PATH, registry_dir=REGISTRY_DIR, strategy='grid', n_jobs=None, cache_dir=None,
+          curve=False) -> str:
+    """
+    Fit the model on the dataset artifact, save the model artifact to the
+    registry and promote it, so running web apps switch to it. See 
+    ModelTrainer.build_search for the search strategies. With `curve`, the
+    model predicts the parameterized boiling curve of CurveModel.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_absolute_error
+    from CurveModel import curveModel
+    from DataCleaner import fill_missing, fill_values
+    from ModelTrainer import fit_search
+    from ModelRegistry import load_dataset
+
+    report_progress(0.0, 'loading the dataset')
+    dataset = load_dataset(dataset_path)
+    values = fill_values(dataset['x_data'], dataset['Y_data'])
+    x_data, Y_data = fill_missing(dataset['x_data'], dataset['Y_data'], values)
+
+    random.seed(10)
+    x_train, x_test, Y_train, Y_test = train_test_split(x_data, Y_data, test_size=0.2)
+
+    # fit the data
+    report_progress(0.1, 'fitting')
+    if curve:
+        # missing temperatures are interpolated along each curve instead of filled
+        targets = curveModel().encode_targets(dataset['Y_data'].loc[Y_train.index])
+        Model, _ = fit_search(x_train, targets, strategy, cache_dir=cache_dir, n_jobs=n_jobs)
+        best = curveModel.from_fitted(Model.best_estimator_, percentages=report_pct)
+    else:
+        Model, _ = fit_search(x_train, Y_train, strategy, cache_dir=cache_dir, n_jobs=n_jobs)
+        best = Model.best_estimator_
+    predictions = best.predict(x_test)
+    error = round(mean_absolute_error(Y_test, predictions), 2)
+
+    report_progress(0.9, 'saving')
+    registry = ModelRegistry(registry_dir)
+    version = registry.save(best, x_data, Y_data, error, values, strategy=strategy,
+                            analogs=dataset['analogs'], curve=curve, dataset_version=dataset['version'])
+    print('saved and promoted model %s in %s, mean absolute error %s' % (version, registry_dir, error))
+    return version
+
+
+def prepare(artifact) -> None:
+    # what the routes need besides the artifact itself, built before it is swapped in
+    artifact['all_oils'] = artifact['Y_data'].index.values
+    artifact['engine'] = blendEngine(artifact['x_data'])
+    model = artifact['model']
+    # a curve model (see CurveModel) predicts its curve at any percentage
+    artifact['curve'] = hasattr(model, 'predict_curve')
+    if artifact['curve']:
+        artifact['predictor'] = model.with_regressor(compiledModel(model.regressor_))
+    else:
+        artifact['predictor'] = compiledModel(model)
+    # a new artifact starts with an empty cache, so no stale prediction is served
+    artifact['cache'] = predictionCache(cache_size, cache_ttl)
+    artifact['optimizer'] = blendOptimizer(artifact['engine'], artifact['predictor'], report_pct)
+    # artifacts trained before the analog index existed get one built from their data
+    if artifact.get('analogs') is None:
+        from AnalogIndex import analogIndex
+        artifact['analogs'] = analogIndex(artifact['x_data'], artifact['Y_data'])
+
+
+def load_state(registry_dir=REGISTRY_DIR, check_interval=5.0) -> liveModel:
+    """
+    Serve the latest model artifact of the registry. It is loaded on the first
+    request and replaced when a new artifact is promoted, see liveModel.
+    """
+    global live
+    live = liveModel(ModelRegistry(registry_dir), prepare, check_interval)
+    return live
+
+
+def get_state() -> dict:
+    # `flask run` imports this module without going through `serve`
+    if live is None:
+        load_state()
+    return live.current()
+
+
+def get_jobs() -> jobQueue:
+    global jobs
+    if jobs is None:
+        jobs = jobQueue(JOBS_PATH)
+    return jobs
+
+
 
 # class Form(FlaskForm):
 #     crude_oil_1 = SelectField('type 1', choices=all_oils)
@@ -63,32 +218,407 @@ report_pct = [5,10,20,30,40,50,60,70,80,90,95,99]
 @app.route('/')
 @app.route('/input')
 def index():
-    return render_template('index.html', 
-            data = x_data, all_oils=all_oils)
+    current = get_state()
+    return render_template('index.html',
+            data = current['x_data'], all_oils=current['all_oils'],
+            max_components=max_components)
 
 @app.route('/output', methods=['GET', 'POST'])
 def submit():
     # form = Form()
+    current = get_state()
     if request.method == 'POST':
-        req = request.form
-        oil_1 = req['oil_1_select']
-        oil_2 = req['oil_2_select']
-        vol_1 = req['oil_1_vol']
-        vol_2 = req['oil_2_vol']
-
-        if oil_1 == oil_2:
-            predictions = Y_data.loc[oil_1].values
+        try:
+            with timed('parse_form'):
+                req = request.form
+                # oil_<i>_select / oil_<i>_vol for every component filled in
+                blend = []
+                for i in range(1, max_components + 1):
+                    oil = req.get('oil_%d_select' % i)
+                    vol = req.get('oil_%d_vol' % i)
+                    if oil and vol:
+                        blend.append((oil, float(vol)))
+
+            predictions = current['cache'].predict([blend], current['engine'], current['predictor'], current['Y_data'])[0]
+        except (KeyError, ValueError):
+            return 'Invalid blend: choose known crude oils and positive volumes.', 400
+
+        results = dict(zip(report_pct, predictions))
+        with timed('render'):
+            return render_template('output.html', results=results, error=current['error'])
+
+@app.route('/api/blend', methods=['POST'])
+def predict_one():
+    """
+    The JSON equivalent of /output: the body is {"recipe": {"<oil>": <volume>, ...}}
+    and the response {"recipe": ..., "profile": {"<percentage>": <temperature>, ...},
+    "error": <mean absolute error of the model>, "version": <model version>}.
+    """
+    current = get_state()
+    with timed('parse_json'):
+        recipe = (request.get_json(silent=True) or {}).get('recipe')
+    if not isinstance(recipe, dict):
+        return jsonify({'error': 'expected {"recipe": {"<oil>": <volume>, ...}}'}), 400
+
+    try:
+        profile = current['cache'].predict([recipe], current['engine'], current['predictor'], current['Y_data'])[0]
+    except KeyError as e:
+        return jsonify({'error': 'unknown oil %s' % e}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'recipe': recipe, 'profile': dict(zip(report_pct, profile.tolist())),
+                    'error': current['error'], 'version': current['version']})
+
+@app.route('/api/blends', methods=['POST'])
+def predict_batch():
+    """
+    Predict many blends in one request. The body is 
+    {"recipes": [{"<oil>": <volume>, ...}, ...]} and the response streams one
+    json line per recipe: {"recipe": ..., "profile": {"<percentage>": <temperature>, ...}}.
+
+    When the served model is a curve model, the body may also list the
+    "percentages" to report, e.g. [15, 65], instead of the usual ones.
+    """
+    current = get_state()
+    with timed('parse_json'):
+        payload = request.get_json(silent=True) or {}
+    recipes = payload.get('recipes')
+    percentages = payload.get('percentages')
+    if not isinstance(recipes, list) or not all(isinstance(recipe, dict) for recipe in recipes):
+        return jsonify({'error': 'expected {"recipes": [{"<oil>": <volume>, ...}, ...]}'}), 400
+    if percentages is not None and not current['curve']:
+        return jsonify({'error': 'the served model only predicts the percentages %s' % report_pct}), 400
+
+    try:
+        if percentages is None:
+            predictions = current['cache'].predict(recipes, current['engine'], current['predictor'], current['Y_data'])
         else:
-            mixed_data = mix_crude(oil_1, float(vol_1),
-                                oil_2, float(vol_2), x_data)
-            predictions = Model.predict([mixed_data])[0]
-        
-        results = {}
-        for i in range(len(predictions)):
-            print(predictions)
-            results[report_pct[i]] = predictions[i]
-        return render_template('output.html', results=results, error=error)
+            mixed = current['engine'].mix_batch(recipes)
+            predictions = current['predictor'].predict_curve(mixed, percentages)
+    except KeyError as e:
+        return jsonify({'error': 'unknown oil %s' % e}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        for recipe, profile in zip(recipes, predictions.tolist()):
+            yield json.dumps({'recipe': recipe, 'profile': dict(zip(percentages or report_pct, profile))}) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/analogs', methods=['POST'])
+def analogs():
+    """
+    The known oils closest to blends or to new assays, with their measured
+    profiles, see AnalogIndex. The body is {"recipes": [{"<oil>": <volume>, ...}, ...]}
+    or {"assays": [{"<feature>": <value>, ...}, ...]}, missing features at the
+    dataset mean, and optionally "k", the number of oils per query (3 by default).
+    The response is {"analogs": [[{"oil": ..., "distance": ..., "profile": {...}}, ...], ...],
+    "version": <model version>}, one list per query.
+    """
+    current = get_state()
+    with timed('parse_json'):
+        payload = request.get_json(silent=True) or {}
+    queries = payload.get('recipes', payload.get('assays'))
+    k = payload.get('k', 3)
+    if not isinstance(queries, list) or not all(isinstance(query, dict) for query in queries):
+        return jsonify({'error': 'expected {"recipes": [{"<oil>": <volume>, ...}, ...]} '
+                                 'or {"assays": [{"<feature>": <value>, ...}, ...]}'}), 400
+    if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+        return jsonify({'error': 'k must be a positive integer'}), 400
+    if not queries:
+        return jsonify({'analogs': [], 'version': current['version']})
+
+    index = current['analogs']
+    try:
+        if 'recipes' in payload:
+            X = current['engine'].mix_batch(queries)
+            columns = list(current['engine'].columns)
+        else:
+            unknown = set().union(*queries) - set(index.columns)
+            if unknown:
+                return jsonify({'error': 'unknown features %s' % sorted(unknown)}), 400
+            X = [[query.get(column, float('nan')) for column in index.columns] for query in queries]
+            columns = index.columns
+        with timed('analogs'):
+            results = index.analogs(pd.DataFrame(X, columns=columns, dtype=float), k)
+    except KeyError as e:
+        return jsonify({'error': 'unknown oil %s' % e}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'analogs': results, 'version': current['version']})
+
+@app.route('/api/optimize', methods=['POST'])
+def optimize():
+    """
+    Find the cheapest blends of the available oils meeting a target curve or
+    temperature bounds, see BlendOptimizer. The body is
+    {"oils": [...], "target": {"<percentage>": <temperature>, ...},
+     "bounds": {"<percentage>": [<lowest or null>, <highest or null>], ...},
+     "prices": {"<oil>": <price>, ...}, "max_fractions": {"<oil>": <fraction>, ...},
+     "tolerance": <degrees>, "time_budget": <seconds>}, all optional but the oils
+    and one of target and bounds.
+    """
+    current = get_state()
+    payload = request.get_json(silent=True) or {}
+    oils = payload.get('oils')
+    if not isinstance(oils, list) or not oils:
+        return jsonify({'error': 'expected {"oils": [...], "target": {...} or "bounds": {...}}'}), 400
+
+    def percentages(values):
+        if not isinstance(values, (dict, type(None))):
+            raise ValueError('target and bounds must be objects keyed by percentage')
+        return {float(p) if '.' in p else int(p): value for p, value in (values or {}).items()}
+
+    def per_oil(name):
+        values = payload.get(name)
+        if not isinstance(values, (dict, type(None))):
+            raise ValueError('%s must be an object keyed by oil' % name)
+        return values
+
+    def non_negative(name, default):
+        value = float(payload.get(name, default))
+        if not math.isfinite(value) or value < 0:
+            raise ValueError('%s must be a finite non negative number' % name)
+        return value
+
+    try:
+        result = current['optimizer'].optimize(
+            oils, target=percentages(payload.get('target')), bounds=percentages(payload.get('bounds')),
+            prices=per_oil('prices'), max_fractions=per_oil('max_fractions'),
+            tolerance=non_negative('tolerance', 2.0),
+            time_budget=min(non_negative('time_budget', 5.0), max_time_budget))
+    except KeyError as e:
+        return jsonify({'error': 'unknown oil %s' % e}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e) or 'invalid request'}), 400
+    return jsonify(result)
+
+def job_params(kind, params) -> dict:
+    """
+    The arguments of the function run by a job of `kind`, from the `params` of
+    a request (see job_types) and the paths of `job_paths`. Raises a ValueError
+    on an unknown parameter or a value of the wrong type.
+    """
+    types = job_types[kind]
+    unknown = set(params) - set(types)
+    if unknown:
+        raise ValueError('unknown parameters %s, %s jobs take %s' % (sorted(unknown), kind, sorted(types)))
+    for name, value in params.items():
+        expected = (int, float) if types[name] is float else types[name]
+        # bool is an int in Python, never accept one for the other
+        if not isinstance(value, expected) or (isinstance(value, bool) and types[name] is not bool):
+            raise ValueError('%s must be a %s' % (name, types[name].__name__))
+
+    registry_dir = live.registry.root if live is not None else job_paths['registry']
+    if kind == 'crawl':
+        return dict(params, assay_dir=job_paths['assays'])
+    if kind == 'clean':
+        assay_dir = job_paths['assays'] if params.pop('from_assays', False) else None
+        return dict(params, dataset_path=job_paths['dataset'], assay_dir=assay_dir)
+    if kind == 'train':
+        if params.get('strategy', 'grid') not in ('grid', 'halving', 'random'):
+            raise ValueError('strategy must be one of grid, halving and random')
+        if params.get('n_jobs', 1) < 1:
+            raise ValueError('n_jobs must be positive')
+        return dict(params, dataset_path=job_paths['dataset'], registry_dir=registry_dir)
+
+    from BlendSweep import fraction_steps
+
+    fraction_steps(params.get('step', 0.01))
+    if params.get('n_workers', 1) < 1:
+        raise ValueError('n_workers must be positive')
+    extension = {'csv': '.csv', 'npy': ''}.get(params.pop('format', 'csv'))
+    if extension is None:
+        raise ValueError('format must be csv or npy')
+    name = 'sweep-%s-%s%s' % (time.strftime('%Y%m%d-%H%M%S'), os.urandom(3).hex(), extension)
+    return dict(params, registry_dir=registry_dir, out=os.path.join(job_paths['sweeps'], name))
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a background job. The body is {"kind": "<crawl, clean, train or sweep>",
+    "params": {...}}, e.g. {"kind": "sweep", "params": {"step": 0.05}}. The
+    parameters allowed for each kind are in job_types; the files the job reads
+    and writes are chosen by the server (a sweep writes under artifacts/sweeps,
+    its path is in the params of the job). The response is the queued job,
+    see /api/jobs/<id>.
+    """
+    with timed('parse_json'):
+        payload = request.get_json(silent=True) or {}
+    kind, params = payload.get('kind'), payload.get('params', {})
+    if kind not in job_types or not isinstance(params, dict):
+        return jsonify({'error': 'expected {"kind": <one of %s>, "params": {...}}' % sorted(job_types)}), 400
+    try:
+        params = job_params(kind, dict(params))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_jobs().get(get_jobs().submit(kind, **params))), 202
+
+@app.route('/api/jobs')
+def list_jobs():
+    # the last jobs, newest first, e.g. /api/jobs?status=running
+    return jsonify({'jobs': get_jobs().list(request.args.get('status'), request.args.get('limit', 50, type=int))})
+
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    """
+    The job: its kind and params, "status" (queued, running, done, failed or
+    cancelled), "progress" from 0 to 1 and "message", "result" or "error", and
+    once finished its "wall_seconds" and "cpu_seconds".
+    """
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'no job %d' % job_id}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if get_jobs().get(job_id) is None:
+        return jsonify({'error': 'no job %d' % job_id}), 404
+    return jsonify({'id': job_id, 'cancelled': get_jobs().cancel(job_id)})
+
+@app.route('/api/jobs/<int:job_id>/result')
+def job_result(job_id):
+    # the value returned by the job, once done (409 before, or when it failed or was cancelled)
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'no job %d' % job_id}), 404
+    if job['status'] != 'done':
+        return jsonify({'id': job_id, 'status': job['status'], 'error': job['error']}), 409
+    return jsonify({'id': job_id, 'result': job['result']})
+
+@app.route('/status')
+def status():
+    current = get_state()
+    return jsonify(dict(live.report, cache=current['cache'].stats()))
+
+
+def sweep(registry_dir=REGISTRY_DIR, out='sweep.csv', step=0.01, n_workers=1) -> int:
+    """
+    Predict every pair of oils of the served model at `step` volume steps and
+    write them to `out`: a CSV file, or a directory of .npy columns when `out`
+    does not end with .csv. With more than one worker, the chunks are 
+    predicted by a process pool. See BlendSweep and ShardedRunner.
+    """
+    from BlendSweep import blendSweep, print_progress
+    from ShardedRunner import shardedSweep
+
+    def progress(done, total, seconds):
+        print_progress(done, total, seconds)
+        report_progress(done / total, '%d/%d blends' % (done, total))
+
+    artifact = ModelRegistry(registry_dir).load()
+    prepare(artifact)
+    if n_workers == 1:
+        blends = blendSweep(artifact['engine'], artifact['predictor'], step=step, percentages=report_pct)
+    else:
+        blends = shardedSweep(artifact['engine'], artifact['predictor'], step=step, percentages=report_pct,
+                              n_workers=n_workers)
+    print('sweeping %d blends of model %s into %s' % (len(blends), artifact['version'], out))
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    try:
+        if out.endswith('.csv'):
+            return blends.write_csv(out, progress)
+        return blends.write_columns(out, progress)
+    finally:
+        if n_workers != 1:
+            blends.close()
+
+
+def warm_up() -> None:
+    # load the model before the first request, once per serving process
+    get_state()
+    app.logger.info('process %d loaded model %s in %ss', os.getpid(),
+                    live.report['artifact_version'], live.report['load_seconds'])
+
+
+def serve(registry_dir=REGISTRY_DIR, mode='threaded', workers=2, host='127.0.0.1', port=5000,
+          jobs_path=JOBS_PATH, job_workers=1, dataset_path=DATASET_PATH, assay_dir=ASSAY_DIR) -> None:
+    """
+    Serve the web app. `mode` is 'threaded' (one process, a thread per request),
+    'prefork' (`workers` processes, each loading the model once and serving
+    with threads) or 'debug' (the Flask development server). See WebServer.
+    `job_workers` background job workers run the jobs of the queue at
+    `jobs_path`, see JobQueue; they stop with the app. Jobs use `dataset_path`,
+    `assay_dir` and the registry served.
+    """
+    import atexit
+    import logging
+    from WebServer import serve_prefork, serve_threaded
+
+    global jobs
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(levelname)s %(message)s')
+    load_state(registry_dir)
+    jobs = jobQueue(jobs_path)
+    job_paths.update(dataset=dataset_path, assays=assay_dir, registry=registry_dir)
+    # with the debug reloader, only the process serving the app starts workers
+    if mode != 'debug' or os.environ.get('WERKZEUG_RUN_MAIN'):
+        job_processes = start_workers(jobs_path, job_workers)
+
+        @atexit.register
+        def stop_workers():
+            for process in job_processes:
+                process.terminate()
+    if mode == 'debug':
+        warm_up()
+        app.run(host=host, port=port, debug=True)
+    elif mode == 'prefork':
+        serve_prefork(app, host, port, workers, on_start=warm_up)
+    else:
+        serve_threaded(app, host, port, on_start=warm_up)
+
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    from BlendPrediction import available_cores
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='serve',
+                        choices=['crawl', 'clean', 'train', 'serve', 'all', 'promote', 'sweep'])
+    parser.add_argument('--http', action='store_true', help='crawl with the browser-free HTTP crawler')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='path of the dataset artifact')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='directory of the model artifacts')
+    parser.add_argument('--assays', default=ASSAY_DIR, help='directory of the assay store, see AssayStore')
+    parser.add_argument('--from-assays', action='store_true', help='clean: build the dataset from the assay store')
+    parser.add_argument('--since', default=None, help='clean --from-assays: first crawl date, e.g. 2023-01-01')
+    parser.add_argument('--until', default=None, help='clean --from-assays: last crawl date')
+    parser.add_argument('--average', action='store_true', help='clean --from-assays: average the crawls instead of the latest')
+    parser.add_argument('--version', default=None, help='model artifact version served by promote')
+    parser.add_argument('--search', default='grid', choices=['grid', 'halving', 'random'],
+                        help='hyperparameter search strategy used by train')
+    parser.add_argument('--jobs', type=int, default=None, help='training and sweep workers, by default one per available core')
+    parser.add_argument('--curve', action='store_true', help='train a monotonic boiling curve model, see CurveModel')
+    parser.add_argument('--cache-dir', default=None, help='keep the fitted scaler and PCA cache in this directory')
+    parser.add_argument('--out', default='sweep.csv', help='output of sweep, a .csv file or a directory of .npy columns')
+    parser.add_argument('--step', type=float, default=0.01, help='volume fraction step of sweep, dividing 1')
+    parser.add_argument('--serve-mode', default='threaded', choices=['threaded', 'prefork', 'debug'],
+                        help='threaded: one process, a thread per request; prefork: --workers processes with threads')
+    parser.add_argument('--workers', type=int, default=2, help='processes of the prefork mode')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--debug', action='store_true', help='run the Flask debug server, same as --serve-mode debug')
+    parser.add_argument('--jobs-db', default=JOBS_PATH, help='SQLite database of the background job queue')
+    parser.add_argument('--job-workers', type=int, default=1,
+                        help='background job workers started by serve, 0 to only queue the jobs')
+    parser.add_argument('--metrics', default=None,
+                        help='write the stage timings of the offline commands to this file, in the Prometheus text format')
+    args = parser.parse_args()
+
+    if args.command in ('crawl', 'all'):
+        crawl(http=args.http, assay_dir=args.assays)
+    if args.command in ('clean', 'all'):
+        clean(args.dataset, args.assays if args.from_assays else None, args.since, args.until, args.average)
+    if args.command in ('train', 'all'):
+        train(args.dataset, args.registry, args.search, args.jobs, args.cache_dir, args.curve)
+    if args.command == 'promote':
+        if args.version is None:
+            parser.error('promote needs --version, one of %s' % [meta['version'] for meta in ModelRegistry(args.registry).versions()])
+        ModelRegistry(args.registry).promote(args.version)
+    if args.command == 'sweep':
+        sweep(args.registry, args.out, args.step, args.jobs or available_cores())
+    if args.metrics is not None and args.command != 'serve':
+        import Metrics
+        Metrics.write(args.metrics)
+    if args.command in ('serve', 'all'):
+        serve(args.registry, 'debug' if args.debug else args.serve_mode, args.workers, args.host, args.port,
+              args.jobs_db, args.job_workers, args.dataset, args.assays)